@@ -0,0 +1 @@
+"""Pipeline train / backtest / ghi forecast cho Prophet Forecaster (xem common.py)."""
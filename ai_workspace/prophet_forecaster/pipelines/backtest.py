@@ -0,0 +1,203 @@
+"""
+Rolling-origin backtest song song → mart.model_backtest (leaderboard của /api/forecast/backtest).
+
+Mỗi fold = (model, series, cutoff): fit trên dữ liệu tới cutoff, dự báo max(horizon) tuần,
+chấm điểm cho từng horizon trên các tuần (cutoff, cutoff + horizon]. Các fold độc lập nên chạy
+trên ProcessPoolExecutor (mỗi worker 1 thread BLAS) → thời gian refresh leaderboard giảm theo số core.
+
+    cd ai_workspace/prophet_forecaster
+    python -m pipelines.backtest                                   # mọi series trong DB, 3 model
+    python -m pipelines.backtest --source csv --cutoffs 8 --step 2 # bộ dữ liệu notebook
+    python -m pipelines.backtest --models prophet_v1 --horizons 7 28 --workers 8 --dry-run
+
+Kết quả: 1 dòng / (model, horizon) cùng run_id; latency = thời gian fit + predict trung bình
+mỗi fold (giây). Chi tiết từng fold ghi ra models/backtests/<run_id>_folds.csv.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from .common import MODELS_DIR, connect, error_sums, load_series, make_prophet, pin_blas_threads
+from .features import build_feature_matrix, series_frame
+
+DEFAULT_HORIZONS_DAYS = (7, 14, 28)
+SEASON_WEEKS = 52
+
+
+def _empirical_interval(p50, residuals, steps):
+    """P10 / P90 quanh P50 từ quantile của residual in-sample, nở theo sqrt(số bước)."""
+    q10, q90 = np.quantile(residuals, [0.1, 0.9]) if residuals.size else (0.0, 0.0)
+    scale = np.sqrt(steps)
+    return p50 + q10 * scale, p50 + q90 * scale
+
+
+def forecast_prophet(train, future, features):
+    m = make_prophet(features)
+    m.fit(train[["ds", "y"] + features])
+    fc = m.predict(future[["ds"] + features])
+    return fc["yhat_lower"].to_numpy(), fc["yhat"].to_numpy(), fc["yhat_upper"].to_numpy()
+
+
+def forecast_seasonal_naive(train, future, features):
+    y = train["y"].to_numpy(dtype=float)
+    h = len(future)
+    if y.size <= SEASON_WEEKS:
+        return forecast_naive(train, future, features)
+    p50 = np.array([y[-SEASON_WEEKS + (i % SEASON_WEEKS)] for i in range(h)])
+    residuals = y[SEASON_WEEKS:] - y[:-SEASON_WEEKS]
+    p10, p90 = _empirical_interval(p50, residuals, np.ceil((np.arange(h) + 1) / SEASON_WEEKS))
+    return p10, p50, p90
+
+
+def forecast_naive(train, future, features):
+    y = train["y"].to_numpy(dtype=float)
+    h = len(future)
+    p50 = np.full(h, y[-1])
+    p10, p90 = _empirical_interval(p50, np.diff(y), np.arange(h) + 1)
+    return p10, p50, p90
+
+
+MODELS = {
+    "prophet_v1": forecast_prophet,
+    "seasonal_naive_v1": forecast_seasonal_naive,
+    "naive_v1": forecast_naive,
+}
+
+
+def rolling_cutoffs(ds, n_cutoffs, step_weeks, max_h_weeks, min_train_weeks):
+    """n_cutoffs origin cách nhau step_weeks, cutoff cuối để lại đủ max_h_weeks tuần để chấm điểm."""
+    last = len(ds) - max_h_weeks - 1
+    idx = [last - i * step_weeks for i in range(n_cutoffs)]
+    return [ds[i] for i in sorted(idx) if i >= min_train_weeks - 1]
+
+
+def run_fold(model_name, key, df, features, cutoff, horizons_weeks):
+    """1 fold trong worker process (df đã ghép ma trận feature); trả về tổng lỗi theo horizon + latency."""
+    t0 = time.perf_counter()
+    train = df[df["ds"] <= cutoff]
+    test = df[df["ds"] > cutoff].head(max(horizons_weeks))
+
+    p10, p50, p90 = MODELS[model_name](train, test, features)
+    latency = time.perf_counter() - t0
+
+    y = test["y"].to_numpy(dtype=float)
+    by_horizon = {h: error_sums(y[:h], p10[:h], p50[:h], p90[:h]) for h in horizons_weeks}
+    return {"model_name": model_name, "series": key, "cutoff": cutoff, "latency": latency,
+            "by_horizon": by_horizon}
+
+
+def aggregate(results, horizons_weeks):
+    """Gộp mọi fold của cùng (model, horizon): metric tính trên toàn bộ điểm, latency trung bình / fold."""
+    rows = []
+    for model_name in sorted({r["model_name"] for r in results}):
+        folds = [r for r in results if r["model_name"] == model_name]
+        latency = float(np.mean([r["latency"] for r in folds]))
+        for h in horizons_weeks:
+            sums = [r["by_horizon"][h] for r in folds]
+            n = sum(s["n"] for s in sums)
+            if n == 0:
+                continue
+            rows.append({
+                "model_name": model_name,
+                "horizon_days": h * 7,
+                "smape": sum(s["sum_smape"] for s in sums) / n,
+                "mae": sum(s["sum_abs_err"] for s in sums) / n,
+                "pinball_p90": sum(s["sum_pinball_p90"] for s in sums) / n,
+                "coverage": 100.0 * sum(s["n_covered"] for s in sums) / n,
+                "latency": latency,
+                "folds": len(folds),
+            })
+    return rows
+
+
+def write_leaderboard(rows, run_id, trained_at):
+    with connect() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO mart.model_backtest
+                    (model_name, horizon_days, smape, mae, pinball_p90, coverage, latency, run_id, trained_at)
+                VALUES %s;
+            """, [
+                (r["model_name"], r["horizon_days"], round(r["smape"], 4), round(r["mae"], 4),
+                 round(r["pinball_p90"], 4), round(r["coverage"], 2), round(r["latency"], 4), run_id, trained_at)
+                for r in rows
+            ])
+
+
+def write_fold_log(results, run_id):
+    out_dir = os.path.join(MODELS_DIR, "backtests")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{run_id}_folds.csv")
+    pd.DataFrame([
+        {"model_name": r["model_name"], "series": r["series"], "cutoff": r["cutoff"].date(),
+         "horizon_days": h * 7, "latency": round(r["latency"], 4), **s}
+        for r in results for h, s in r["by_horizon"].items()
+    ]).to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("db", "csv"), default="db")
+    parser.add_argument("--models", nargs="+", choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument("--horizons", nargs="+", type=int, default=list(DEFAULT_HORIZONS_DAYS),
+                        help="horizon (ngày, bội số của 7)")
+    parser.add_argument("--cutoffs", type=int, default=6, help="số origin mỗi series")
+    parser.add_argument("--step", type=int, default=4, help="khoảng cách giữa 2 origin (tuần)")
+    parser.add_argument("--min-train-weeks", type=int, default=104)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--dry-run", action="store_true", help="không ghi mart.model_backtest")
+    args = parser.parse_args()
+
+    if any(h % 7 for h in args.horizons):
+        parser.error("--horizons must be multiples of 7 days")
+    horizons_weeks = sorted({h // 7 for h in args.horizons})
+
+    run_id = f"run_{datetime.now():%Y_%m_%d_%H%M%S}"
+    series = load_series(args.source, min_weeks=args.min_train_weeks + max(horizons_weeks))
+    store = build_feature_matrix(args.source)
+    tasks = []
+    for s in series:
+        df = series_frame(s["frame"], store)
+        for cutoff in rolling_cutoffs(list(df["ds"]), args.cutoffs, args.step,
+                                      max(horizons_weeks), args.min_train_weeks):
+            for model_name in args.models:
+                tasks.append((model_name, s["key"], df, s["features"], cutoff, horizons_weeks))
+    print(f"--- Backtest {run_id}: {len(series)} series × {len(args.models)} models → {len(tasks)} folds, "
+          f"{args.workers} workers, features {store['version']} ({store['mode']}) ---")
+
+    t0 = time.perf_counter()
+    results, failed = [], 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=pin_blas_threads) as pool:
+        futures = {pool.submit(run_fold, *task): task for task in tasks}
+        for fut in as_completed(futures):
+            model_name, key, _, _, cutoff, _ = futures[fut]
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                failed += 1
+                print(f"⚠️ Fold failed ({model_name}, {key}, {cutoff.date()}): {e!r}")
+    wall = time.perf_counter() - t0
+
+    rows = aggregate(results, horizons_weeks)
+    fold_cpu = sum(r["latency"] for r in results)
+    print(f"Done in {wall:.1f}s wall, {fold_cpu:.1f}s summed fold time "
+          f"(speedup ×{fold_cpu / wall if wall else 0:.1f}), {failed} failed folds")
+    for r in rows:
+        print(f"  {r['model_name']:<20} h={r['horizon_days']:>3}d  sMAPE {r['smape']:6.2f}  MAE {r['mae']:9.2f}  "
+              f"P90 pinball {r['pinball_p90']:8.2f}  coverage {r['coverage']:5.1f}%  {r['latency']:.3f}s/fold")
+
+    print(f"Fold log: {write_fold_log(results, run_id)}")
+    if rows and not args.dry_run:
+        write_leaderboard(rows, run_id, datetime.now(timezone.utc))
+        print(f"✅ Wrote {len(rows)} rows to mart.model_backtest (run_id={run_id})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Phần dùng chung cho các pipeline Prophet (backtest / train / generate_forecasts):
+kết nối DB, nạp series, cấu hình Prophet giống SparkPlug_Prophet.ipynb (Section 5) và metric
+đánh giá. Tiền xử lý regressor (Section 3) nằm ở features.py.
+
+Chạy các pipeline từ thư mục ai_workspace/prophet_forecaster:
+    python -m pipelines.backtest --help
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+DATASET_CSV = os.path.join(DATA_DIR, "10_sparkplug_dataset_final.csv")
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": os.getenv("DB_PORT", "5432"),
+    "dbname": os.getenv("DB_NAME", "denso_forecast"),
+    "user": os.getenv("DB_USER", "denso"),
+    "password": os.getenv("DB_PASSWORD", "admin"),
+}
+
+FREQ = "W-MON"
+TARGETS = ["y", "y_oem", "y_aftermarket", "y_true"]
+
+# 14 regressor của feature.ts_features_weekly (cùng danh sách với drift engine của backend)
+DB_FEATURES = [
+    "pmi", "gdp_growth", "cpi", "gas_price", "gtrends_score",
+    "total_new_vehicle_sales", "new_ice_and_hybrid_sales", "bev_penetration_rate",
+    "total_ice_and_hybrid_on_road", "own_price_aftermarket", "comp_price_aftermarket",
+    "promo_depth", "weather_event_flag", "holiday_flag",
+]
+
+# Prophet mặc định interval_width = 0.8 → yhat_lower / yhat_upper chính là P10 / P90
+PROPHET_PARAMS = {
+    "yearly_seasonality": True,
+    "weekly_seasonality": False,   # dữ liệu đã là hàng tuần
+    "daily_seasonality": False,
+    "seasonality_mode": "multiplicative",
+    "changepoint_prior_scale": 0.5,
+    "interval_width": 0.8,
+}
+REGRESSOR_PRIOR_SCALE = 0.1
+
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS",
+)
+
+
+def connect():
+    return psycopg2.connect(**DB_CONFIG)
+
+
+def pin_blas_threads(n_threads=1):
+    """
+    Initializer cho worker của ProcessPoolExecutor: mỗi worker chỉ dùng n_threads thread
+    BLAS / OpenMP, tránh (số worker × số core) thread tranh nhau CPU.
+    Env var có tác dụng với thư viện nạp sau; threadpoolctl giới hạn cả pool đã khởi tạo (fork).
+    """
+    for var in BLAS_ENV_VARS:
+        os.environ[var] = str(n_threads)
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(n_threads)
+    quiet_stan_logs()
+
+
+def quiet_stan_logs():
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+
+
+# ---------------------------------------------------------------------------
+# Nạp dữ liệu
+# ---------------------------------------------------------------------------
+
+SERIES_SQL = """
+    SELECT s.product_key, s.market_key, p.sku, m.country, m.channel,
+           s.week_start AS ds, s.units_sold::float8 AS y
+    FROM fact.fact_sales_weekly s
+    JOIN dim.dim_product p ON p.product_key = s.product_key
+    JOIN dim.dim_market m ON m.market_key = s.market_key
+    WHERE s.units_sold IS NOT NULL
+    ORDER BY s.product_key, s.market_key, s.week_start;
+"""
+
+REGRESSORS_SQL = """
+    SELECT DISTINCT ON (week_start)
+           week_start AS ds, {columns}
+    FROM feature.ts_features_weekly
+    ORDER BY week_start, feature_key DESC;
+""".format(columns=", ".join(f"{c}::int::float8 AS {c}" if c.endswith("_flag") else f"{c}::float8 AS {c}"
+                             for c in DB_FEATURES))
+
+
+def series_key(sku, country, channel):
+    return f"{sku}|{country}|{channel}"
+
+
+def load_regressors(conn):
+    regressors = pd.read_sql_query(REGRESSORS_SQL, conn, parse_dates=["ds"])
+    return regressors
+
+
+def load_db_series(conn, min_weeks=52):
+    """
+    Mọi series (SKU × market) trong fact.fact_sales_weekly, ghép regressor theo tuần.
+    Trả về list dict {key, product_key, market_key, frame (ds, y, features...), features}.
+    """
+    sales = pd.read_sql_query(SERIES_SQL, conn, parse_dates=["ds"])
+    regressors = load_regressors(conn)
+
+    series = []
+    for (product_key, market_key), g in sales.groupby(["product_key", "market_key"], sort=True):
+        if len(g) < min_weeks:
+            continue
+        frame = g[["ds", "y"]].merge(regressors, on="ds", how="left")
+        first = g.iloc[0]
+        series.append({
+            "key": series_key(first["sku"], first["country"], first["channel"]),
+            "product_key": int(product_key),
+            "market_key": int(market_key),
+            "frame": frame.reset_index(drop=True),
+            "features": list(DB_FEATURES),
+        })
+    return series
+
+
+def load_csv_series(path=DATASET_CSV):
+    """Bộ dữ liệu tổng hợp của notebook (1 series spark plug, feature = mọi cột trừ target và ds)."""
+    df = pd.read_csv(path, parse_dates=["ds"]).sort_values("ds").reset_index(drop=True)
+    features = [c for c in df.columns if c not in TARGETS and c != "ds"]
+    return [{
+        "key": "sparkplug_total",
+        "product_key": None,
+        "market_key": None,
+        "frame": df[["ds", "y"] + features],
+        "features": features,
+    }]
+
+
+def load_series(source, min_weeks=52):
+    if source == "csv":
+        return load_csv_series()
+    with connect() as conn:
+        return load_db_series(conn, min_weeks)
+
+
+# ---------------------------------------------------------------------------
+# Model (giống notebook)
+# ---------------------------------------------------------------------------
+
+def make_prophet(features, **overrides):
+    from prophet import Prophet
+
+    m = Prophet(**{**PROPHET_PARAMS, **overrides})
+    for f in features:
+        m.add_regressor(f, prior_scale=REGRESSOR_PRIOR_SCALE)
+    return m
+
+
+# ---------------------------------------------------------------------------
+# Metric (cùng định nghĩa với mart.forecast_accuracy_weekly của backend)
+# ---------------------------------------------------------------------------
+
+def pinball(y, q, tau):
+    diff = y - q
+    return np.maximum(tau * diff, (tau - 1) * diff)
+
+
+def error_sums(y, p10, p50, p90):
+    """Tổng (chưa chia) để gộp nhiều fold: n, Σ sMAPE, Σ |e|, Σ pinball P90, số điểm nằm trong [P10, P90]."""
+    y, p10, p50, p90 = (np.asarray(v, dtype=float) for v in (y, p10, p50, p90))
+    denom = np.abs(y) + np.abs(p50)
+    smape = np.where(denom > 0, 200.0 * np.abs(y - p50) / np.where(denom > 0, denom, 1.0), 0.0)
+    return {
+        "n": int(y.size),
+        "sum_smape": float(smape.sum()),
+        "sum_abs_err": float(np.abs(y - p50).sum()),
+        "sum_pinball_p90": float(pinball(y, p90, 0.9).sum()),
+        "n_covered": int(((y >= p10) & (y <= p90)).sum()),
+    }
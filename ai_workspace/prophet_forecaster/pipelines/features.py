@@ -0,0 +1,217 @@
+"""
+Ma trận regressor đã tiền xử lý (SparkPlug_Prophet.ipynb Section 3: ffill/bfill, StandardScaler,
+shift(1) chống rò rỉ) — tính 1 lần cho mỗi nguồn dữ liệu, cache theo hash dữ liệu và dùng chung cho
+train_demand_forecast / backtest / generate_forecasts.
+
+    cd ai_workspace/prophet_forecaster
+    python -m pipelines.features                 # feature.ts_features_weekly
+    python -m pipelines.features --source csv    # 10_sparkplug_dataset_final.parquet (csv nếu thiếu)
+    python -m pipelines.features --refit         # fit lại scaler, tính lại toàn bộ
+
+Cache: models/features/<source>/<version>/ gồm matrix.parquet (ds + feature đã scale + lag),
+scaler.joblib và meta.json; models/features/<source>/LATEST trỏ tới version mới nhất.
+version = hash của dữ liệu raw. Khi chỉ có thêm tuần mới (các tuần cũ không đổi), version mới giữ
+scaler cũ và chỉ tính các dòng mới; dữ liệu cũ bị sửa → fit lại từ đầu.
+
+Scaler fit trên toàn bộ lịch sử, kể cả khi backtest: Prophet tự chuẩn hóa lại regressor
+(standardize="auto") theo dữ liệu train của từng fold nên không rò rỉ thống kê tương lai vào model.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from .common import DATA_DIR, DATASET_CSV, MODELS_DIR, TARGETS, connect, load_regressors
+
+FEATURES_DIR = os.path.join(MODELS_DIR, "features")
+DATASET_PARQUET = os.path.join(DATA_DIR, "10_sparkplug_dataset_final.parquet")
+KEEP_VERSIONS = 5
+
+
+# ---------------------------------------------------------------------------
+# Dữ liệu raw
+# ---------------------------------------------------------------------------
+
+def load_raw(source):
+    """Regressor raw theo tuần (ds + feature), không trùng ds, sắp theo ds. Trả về (raw, features)."""
+    if source == "csv":
+        if os.path.exists(DATASET_PARQUET):
+            df = pd.read_parquet(DATASET_PARQUET)
+            df["ds"] = pd.to_datetime(df["ds"])
+        else:
+            df = pd.read_csv(DATASET_CSV, parse_dates=["ds"])
+        features = [c for c in df.columns if c not in TARGETS and c != "ds"]
+    else:
+        with connect() as conn:
+            df = load_regressors(conn)
+        features = [c for c in df.columns if c != "ds"]
+    raw = df[["ds"] + features].drop_duplicates(subset=["ds"], keep="last").sort_values("ds")
+    return raw.reset_index(drop=True), features
+
+
+def data_hash(raw, features):
+    """Hash nội dung (tên cột + giá trị theo từng dòng, vector hóa bằng hash_pandas_object)."""
+    h = hashlib.sha1(",".join(features).encode())
+    h.update(pd.util.hash_pandas_object(raw[["ds"] + features], index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+# ---------------------------------------------------------------------------
+# Tiền xử lý vector hóa
+# ---------------------------------------------------------------------------
+
+def lag_features(raw, features, scaler, seed=None):
+    """
+    ffill/bfill → scaler.transform → shift(1) trên cả khối (tuần T dùng regressor của T−1).
+    seed: dòng raw đã fill của tuần ngay trước khối (khi nối thêm tuần mới) — dùng để ffill
+    và làm lag cho tuần đầu của khối. Không có seed thì tuần đầu là NaN.
+    Trả về (DataFrame ds + features, dòng raw đã fill cuối cùng).
+    """
+    filled = raw[features].astype(float)
+    if seed is not None:
+        filled = pd.concat([pd.DataFrame([seed], columns=features), filled], ignore_index=True)
+    filled = filled.ffill().bfill()
+
+    scaled = scaler.transform(filled)
+    lagged = np.vstack([np.full((1, len(features)), np.nan), scaled[:-1]])
+    if seed is not None:
+        lagged = lagged[1:]
+
+    out = pd.DataFrame(lagged, columns=features)
+    out.insert(0, "ds", raw["ds"].to_numpy())
+    return out, [float(v) for v in filled.iloc[-1]]
+
+
+def fit_scaler(raw, features):
+    scaler = StandardScaler()
+    scaler.fit(raw[features].astype(float).ffill().bfill())
+    return scaler
+
+
+# ---------------------------------------------------------------------------
+# Cache theo version
+# ---------------------------------------------------------------------------
+
+def _version_dir(source, version):
+    return os.path.join(FEATURES_DIR, source, version)
+
+
+def _load_version(source, version):
+    path = _version_dir(source, version) if version else None
+    if path is None or not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    matrix = pd.read_parquet(os.path.join(path, "matrix.parquet"))
+    matrix["ds"] = pd.to_datetime(matrix["ds"])
+    return {**meta, "last_ds": pd.Timestamp(meta["last_ds"]), "matrix": matrix,
+            "scaler": joblib.load(os.path.join(path, "scaler.joblib")), "path": path}
+
+
+def _latest_version(source):
+    path = os.path.join(FEATURES_DIR, source, "LATEST")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def _save_version(store):
+    path = _version_dir(store["source"], store["version"])
+    os.makedirs(path, exist_ok=True)
+    store["matrix"].to_parquet(os.path.join(path, "matrix.parquet"), index=False)
+    joblib.dump(store["scaler"], os.path.join(path, "scaler.joblib"))
+    meta = {k: store[k] for k in ("version", "source", "features", "scaler_version", "last_raw", "n_rows")}
+    meta["first_ds"] = store["matrix"]["ds"].min().date().isoformat()
+    meta["last_ds"] = store["last_ds"].date().isoformat()
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    with open(os.path.join(FEATURES_DIR, store["source"], "LATEST"), "w", encoding="utf-8") as f:
+        f.write(store["version"])
+    store["path"] = path
+
+
+def _prune(source, keep):
+    root = os.path.join(FEATURES_DIR, source)
+    versions = [d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d))]
+    versions.sort(key=lambda d: os.path.getmtime(os.path.join(root, d)), reverse=True)
+    for d in versions[keep:]:
+        shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+
+
+def build_feature_matrix(source="db", refit=False):
+    """
+    Ma trận feature của nguồn dữ liệu, dùng cache nếu có. Trả về dict
+    {version, source, features, matrix, scaler, scaler_version, last_raw, last_ds, n_rows, path, mode};
+    mode = hit | incremental | rebuild.
+    """
+    raw, features = load_raw(source)
+    version = data_hash(raw, features)
+
+    cached = None if refit else _load_version(source, version)
+    if cached is not None:
+        return {**cached, "mode": "hit"}
+
+    latest = None if refit else _load_version(source, _latest_version(source))
+    if (latest is not None and latest["features"] == features
+            and data_hash(raw[raw["ds"] <= latest["last_ds"]], features) == latest["version"]):
+        # Chỉ có thêm tuần mới: giữ scaler, tính lag cho các dòng mới rồi nối vào ma trận cũ
+        new_rows = raw[raw["ds"] > latest["last_ds"]]
+        lagged, last_raw = lag_features(new_rows, features, latest["scaler"], seed=latest["last_raw"])
+        matrix = pd.concat([latest["matrix"], lagged], ignore_index=True)
+        scaler, scaler_version, mode = latest["scaler"], latest["scaler_version"], "incremental"
+    else:
+        scaler = fit_scaler(raw, features)
+        matrix, last_raw = lag_features(raw, features, scaler)
+        scaler_version, mode = version, "rebuild"
+
+    store = {
+        "version": version,
+        "source": source,
+        "features": features,
+        "matrix": matrix,
+        "scaler": scaler,
+        "scaler_version": scaler_version,
+        "last_raw": last_raw,
+        "last_ds": raw["ds"].max(),
+        "n_rows": len(matrix),
+        "mode": mode,
+    }
+    _save_version(store)
+    _prune(source, KEEP_VERSIONS)
+    return store
+
+
+def series_frame(frame, store):
+    """
+    Frame train của 1 series: y (ffill/bfill) ghép với ma trận feature theo ds; bỏ tuần chưa có lag.
+    Thay cho việc tiền xử lý lại regressor của từng series.
+    """
+    df = frame[["ds", "y"]].drop_duplicates(subset=["ds"], keep="last").sort_values("ds")
+    df["y"] = df["y"].ffill().bfill()
+    df = df.merge(store["matrix"], on="ds", how="inner")
+    return df.dropna(subset=store["features"]).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("db", "csv"), default="db")
+    parser.add_argument("--refit", action="store_true", help="bỏ qua cache, fit lại scaler")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    store = build_feature_matrix(args.source, refit=args.refit)
+    print(f"✅ Feature matrix {store['version']} ({store['mode']}): {store['n_rows']} weeks × "
+          f"{len(store['features'])} features, last week {store['last_ds'].date()}, "
+          f"{(time.perf_counter() - t0) * 1000:.0f} ms → {store['path']}")
+
+
+if __name__ == "__main__":
+    main()
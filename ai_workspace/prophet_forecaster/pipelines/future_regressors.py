@@ -0,0 +1,215 @@
+"""
+Khung regressor tương lai (DataFrame 3 của Denso_Future_Dataframe.ipynb) cho generate_forecasts.
+
+Mỗi driver có 1 phương pháp rẻ nhất đủ dùng (DRIVER_METHODS):
+    prophet         — mùa vụ mạnh (total_new_vehicle_sales: Tết / tháng Ngâu)
+    linear          — xu hướng (bev_penetration_rate), hồi quy tuyến tính trên TREND_WEEKS tuần cuối
+    seasonal_naive  — lặp lại giá trị cùng tuần năm trước
+    hold            — giữ giá trị cuối (GDP, CPI, giá, logistics...; mặc định)
+    zero            — kế hoạch / giả định của notebook (không promo, không lễ, không stockout, thời tiết bình thường)
+    calendar        — year / week (ISO) / month / quarter tính từ ds
+Driver prophet (fit vài giây / driver) chạy song song trên ProcessPoolExecutor; linear / seasonal_naive
+chỉ tốn vài ms nên chạy ngay trong process chính. Sau đó tính 2 feature phái sinh giống notebook Section 6:
+    new_ice_and_hybrid_sales     = total_new_vehicle_sales × (1 − bev_penetration_rate)
+    total_ice_and_hybrid_on_road = on_road[t−1] × (1 − SCRAPPAGE_RATE_WEEKLY) + new_ice_and_hybrid_sales / 4.333
+
+    cd ai_workspace/prophet_forecaster
+    python -m pipelines.future_regressors                       # 14 regressor của DB → data/03_future_dataframe.parquet
+    python -m pipelines.future_regressors --source csv --csv    # bộ dữ liệu notebook, ghi thêm bản .csv
+    python -m pipelines.future_regressors --weeks 16 --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .common import DATA_DIR, FREQ, pin_blas_threads
+from .features import load_raw
+
+FORECAST_WEEKS = 16
+FUTURE_PARQUET = os.path.join(DATA_DIR, "03_future_dataframe.parquet")
+TREND_WEEKS = 52
+SEASON_WEEKS = 52
+SCRAPPAGE_RATE_WEEKLY = 0.001
+WEEKS_PER_MONTH = 4.333
+
+DRIVER_METHODS = {
+    "total_new_vehicle_sales": "prophet",
+    "bev_penetration_rate": "linear",
+    "gtrends_score": "seasonal_naive",
+    "promo_flag": "zero",
+    "promo_depth": "zero",
+    "holiday_flag": "zero",
+    "stockout_flag": "zero",
+    "weather_impact_score": "zero",
+    "weather_event_flag": "zero",
+    "year": "calendar",
+    "week": "calendar",
+    "month": "calendar",
+    "quarter": "calendar",
+}
+DERIVED = ("new_ice_and_hybrid_sales", "total_ice_and_hybrid_on_road")
+BOUNDS = {
+    "total_new_vehicle_sales": (0, None),
+    "bev_penetration_rate": (0, 1),
+    "gtrends_score": (0, None),
+}
+FIT_METHODS = ("prophet", "linear", "seasonal_naive")
+POOL_METHODS = ("prophet",)
+
+
+# ---------------------------------------------------------------------------
+# Phương pháp dự báo từng driver (chạy trong worker)
+# ---------------------------------------------------------------------------
+
+def forecast_prophet(ds, y, future_ds):
+    from prophet import Prophet
+
+    m = Prophet(seasonality_mode="multiplicative", yearly_seasonality=True,
+                weekly_seasonality=False, daily_seasonality=False)
+    m.fit(pd.DataFrame({"ds": ds, "y": y}))
+    return m.predict(pd.DataFrame({"ds": future_ds}))["yhat"].to_numpy()
+
+
+def forecast_linear(ds, y, future_ds):
+    tail = slice(-TREND_WEEKS, None)
+    x = (ds[tail] - ds[0]).days.to_numpy() / 7.0
+    slope, intercept = np.polyfit(x, y[tail], 1)
+    return intercept + slope * ((future_ds - ds[0]).days.to_numpy() / 7.0)
+
+
+def forecast_seasonal_naive(ds, y, future_ds):
+    if y.size < SEASON_WEEKS:
+        return np.full(len(future_ds), y[-1])
+    return np.array([y[-SEASON_WEEKS + (i % SEASON_WEEKS)] for i in range(len(future_ds))])
+
+
+FORECASTERS = {
+    "prophet": forecast_prophet,
+    "linear": forecast_linear,
+    "seasonal_naive": forecast_seasonal_naive,
+}
+
+
+def forecast_driver(name, method, ds, y, future_ds):
+    """1 driver (worker process với prophet, inline với phần còn lại); trả về (name, giá trị tương lai, giây)."""
+    t0 = time.perf_counter()
+    values = FORECASTERS[method](ds, y, future_ds)
+    lo, hi = BOUNDS.get(name, (None, None))
+    return name, np.clip(values, lo, hi), time.perf_counter() - t0
+
+
+# ---------------------------------------------------------------------------
+# Ghép khung tương lai
+# ---------------------------------------------------------------------------
+
+def calendar_column(name, future_ds):
+    iso = future_ds.isocalendar()
+    return {
+        "year": iso["year"].to_numpy(),
+        "week": iso["week"].to_numpy(),
+        "month": future_ds.month.to_numpy(),
+        "quarter": future_ds.quarter.to_numpy(),
+    }[name]
+
+
+def add_derived(future, history, features):
+    """
+    Notebook Section 6: doanh số xe ICE + hybrid mới và tổng xe ICE + hybrid lưu hành (đệ quy theo tuần).
+    Chỉ thêm các cột phái sinh có trong features; on_road cần new_ice_and_hybrid_sales nên luôn tính trước.
+    """
+    if "new_ice_and_hybrid_sales" in features or "total_ice_and_hybrid_on_road" in features:
+        future["new_ice_and_hybrid_sales"] = np.round(
+            future["total_new_vehicle_sales"] * (1 - future["bev_penetration_rate"])).astype(int)
+    if "total_ice_and_hybrid_on_road" in features:
+        on_road = np.empty(len(future))
+        current = float(history["total_ice_and_hybrid_on_road"].iloc[-1])
+        for i, new_sales in enumerate(future["new_ice_and_hybrid_sales"].to_numpy(dtype=float)):
+            current = current * (1 - SCRAPPAGE_RATE_WEEKLY) + new_sales / WEEKS_PER_MONTH
+            on_road[i] = current
+        future["total_ice_and_hybrid_on_road"] = np.round(on_road).astype(int)
+    return future
+
+
+def build_future_frame(source="db", weeks=FORECAST_WEEKS, workers=None):
+    """Trả về (DataFrame ds + feature theo đúng thứ tự cột lịch sử, timing từng driver)."""
+    raw, features = load_raw(source)
+    return future_frame(raw, features, weeks, workers)
+
+
+def future_frame(raw, features, weeks=FORECAST_WEEKS, workers=None):
+    """Như build_future_frame nhưng nhận sẵn regressor raw (ds + features, sắp theo ds)."""
+    history = raw.copy()
+    history[features] = history[features].ffill().bfill()
+    ds = pd.DatetimeIndex(history["ds"])
+    future_ds = pd.date_range(start=ds[-1] + pd.Timedelta(days=7), periods=weeks, freq=FREQ)
+
+    future = pd.DataFrame({"ds": future_ds})
+    last = history.iloc[-1]
+    for name in features:
+        method = DRIVER_METHODS.get(name, "hold")
+        if name in DERIVED or method in FIT_METHODS:
+            continue
+        if method == "zero":
+            future[name] = 0
+        elif method == "calendar":
+            future[name] = calendar_column(name, future_ds)
+        else:
+            future[name] = last[name]
+
+    timings = {}
+    tasks = [(name, DRIVER_METHODS[name]) for name in features
+             if name not in DERIVED and DRIVER_METHODS.get(name) in FIT_METHODS]
+    pooled = [(name, method) for name, method in tasks if method in POOL_METHODS]
+    results = [forecast_driver(name, method, ds, history[name].to_numpy(dtype=float), future_ds)
+               for name, method in tasks if method not in POOL_METHODS]
+    if pooled:
+        with ProcessPoolExecutor(max_workers=workers or len(pooled), initializer=pin_blas_threads) as pool:
+            futures = [pool.submit(forecast_driver, name, method, ds, history[name].to_numpy(dtype=float),
+                                   future_ds)
+                       for name, method in pooled]
+            results += [fut.result() for fut in as_completed(futures)]
+    for name, values, seconds in results:
+        future[name] = values
+        timings[name] = seconds
+    if "total_new_vehicle_sales" in future:
+        future["total_new_vehicle_sales"] = future["total_new_vehicle_sales"].astype(int)
+
+    future = add_derived(future, history, features)
+    future = future[["ds"] + features]
+    na_cols = future.columns[future.isna().any()].tolist()
+    if na_cols:
+        print(f"⚠️ NA in {na_cols}, filling with ffill/bfill")
+        future = future.ffill().bfill()
+    return future, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("db", "csv"), default="db")
+    parser.add_argument("--weeks", type=int, default=FORECAST_WEEKS)
+    parser.add_argument("--workers", type=int, help="mặc định: 1 worker / driver prophet")
+    parser.add_argument("--out", default=FUTURE_PARQUET)
+    parser.add_argument("--csv", action="store_true", help="ghi thêm bản .csv cạnh file parquet")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    future, timings = build_future_frame(args.source, args.weeks, args.workers)
+    wall = time.perf_counter() - t0
+    for name, seconds in sorted(timings.items()):
+        print(f"  {name:<32} {DRIVER_METHODS[name]:<15} {seconds:.2f}s")
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    future.to_parquet(args.out, index=False)
+    if args.csv:
+        future.to_csv(os.path.splitext(args.out)[0] + ".csv", index=False)
+    print(f"✅ {len(future)} weeks ({future['ds'].min().date()} → {future['ds'].max().date()}) × "
+          f"{future.shape[1] - 1} features in {wall:.1f}s "
+          f"({sum(timings.values()):.1f}s summed driver time) → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
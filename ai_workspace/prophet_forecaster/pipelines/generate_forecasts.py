@@ -0,0 +1,250 @@
+"""
+Sinh P10 / P50 / P90 cho mọi series đã train (models/prophet/<series>/) và ghi vào
+mart.demand_forecast_weekly bằng bulk writer:
+
+    COPY → bảng tạm forecast_stage → 1 INSERT ... ON CONFLICT ON CONSTRAINT uq_forecast DO UPDATE
+
+tất cả trong 1 transaction (trigger dashboard / accuracy của mart chỉ chạy 1 lần cho cả lô).
+Cột actual của dòng đã có được giữ nguyên.
+
+    cd ai_workspace/prophet_forecaster
+    python -m pipelines.generate_forecasts                              # mọi series có artifact
+    python -m pipelines.generate_forecasts --future data/03_future_dataframe.csv --workers 8
+                                        # mặc định: data/03_future_dataframe.parquet (future_regressors.py)
+    python -m pipelines.generate_forecasts --from-csv data/04_final_forecast_output.csv \\
+        --sku K20PR-U --country Vietnam --channel Dealer                # nạp output của notebook
+
+horizon_days = 7 × số tuần tính từ tuần cuối của model (meta last_ds, forecast origin = week_start − horizon_days);
+khung dự báo bắt đầu ngay sau tuần đó, các tuần đã có trong ma trận feature dùng regressor thật.
+Mỗi lần chạy hằng tuần là 1 origin mới: dòng của origin cũ được giữ lại (accuracy theo horizon), còn
+dashboard / fan chart / inventory / counterfactual đọc origin mới nhất (horizon ngắn nhất) mỗi tuần.
+"""
+import argparse
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .common import DATA_DIR, connect, pin_blas_threads
+from .features import build_feature_matrix, lag_features
+from .future_regressors import FUTURE_PARQUET
+from .train_demand_forecast import PROPHET_DIR, artifact_dir, load_meta
+
+DEFAULT_MODEL_NAME = "prophet_v1"
+LEGACY_FUTURE_CSV = os.path.join(DATA_DIR, "03_future_dataframe.csv")
+STAGE_COLUMNS = ("product_key", "market_key", "week_start", "horizon_days", "model_name", "p10", "p50", "p90")
+
+
+def read_frame(path):
+    """Khung regressor tương lai; chỉ đường dẫn mặc định mới được lùi về bản .csv cũ của notebook."""
+    if path.endswith(".parquet"):
+        if path == FUTURE_PARQUET and not os.path.exists(path) and os.path.exists(LEGACY_FUTURE_CSV):
+            print(f">>> [read_frame] {path} not found, using {LEGACY_FUTURE_CSV}")
+            return read_frame(LEGACY_FUTURE_CSV)
+        frame = pd.read_parquet(path)
+        frame["ds"] = pd.to_datetime(frame["ds"])
+        return frame
+    # 03_future_dataframe.csv dùng ngày dạng dd/mm/yyyy
+    return pd.read_csv(path, parse_dates=["ds"], dayfirst=True)
+
+
+def future_regressors(future, features, scaler, store, last_ds):
+    """
+    Regressor cho mọi tuần sau last_ds của model (meta), cùng tiền xử lý lúc train (features.lag_features):
+      - tuần đã có trong ma trận feature (last_ds, store["last_ds"]]: lấy từ store["matrix"], đổi sang
+        scaler của model (inverse_transform bằng scaler của store rồi transform lại);
+      - tuần sau store["last_ds"]: nối sau dòng raw cuối của store, ffill, scale bằng scaler của model,
+        shift(1). Driver thiếu trong khung tương lai giữ giá trị cuối cùng đã biết.
+    """
+    missing = sorted(set(features) - set(store["features"]))
+    if missing:
+        raise ValueError(f"features {missing} not in feature store {store['version']}, retrain the series")
+
+    gap = store["matrix"][store["matrix"]["ds"] > last_ds]
+    raw = pd.DataFrame(store["scaler"].inverse_transform(gap[store["features"]].to_numpy()),
+                       columns=store["features"])[features]
+    known = pd.DataFrame(scaler.transform(raw), columns=features)
+    known.insert(0, "ds", gap["ds"].to_numpy())
+
+    future = future[future["ds"] > store["last_ds"]].sort_values("ds").reset_index(drop=True)
+    last_raw = dict(zip(store["features"], store["last_raw"]))
+    ahead, _ = lag_features(future.reindex(columns=["ds"] + features), features, scaler,
+                            seed=[last_raw[f] for f in features])
+
+    frame = pd.concat([known, ahead], ignore_index=True)
+    return frame[frame["ds"] > last_ds].reset_index(drop=True)
+
+
+def predict_series(key, store, future, model_name):
+    """Chạy trong worker: nạp artifact, dự báo, trả về DataFrame theo STAGE_COLUMNS."""
+    from prophet.serialize import model_from_json
+
+    meta = load_meta(key)
+    out = artifact_dir(key)
+    with open(os.path.join(out, "model.json"), encoding="utf-8") as f:
+        model = model_from_json(f.read())
+    scaler = joblib.load(os.path.join(out, "scaler.joblib"))
+
+    features = meta["features"]
+    last_ds = pd.Timestamp(meta["last_ds"])
+    frame = future_regressors(future, features, scaler, store, last_ds)
+    fc = model.predict(frame[["ds"] + features])
+
+    steps = ((fc["ds"] - last_ds).dt.days // 7).astype(int)
+    return pd.DataFrame({
+        "product_key": meta["product_key"],
+        "market_key": meta["market_key"],
+        "week_start": fc["ds"].dt.date,
+        "horizon_days": steps * 7,
+        "model_name": model_name,
+        "p10": fc["yhat_lower"].clip(lower=0).round(4),
+        "p50": fc["yhat"].clip(lower=0).round(4),
+        "p90": fc["yhat_upper"].clip(lower=0).round(4),
+    })
+
+
+def write_forecasts(frame):
+    """
+    COPY cả lô vào bảng tạm rồi merge 1 lần theo uq_forecast; trả về (số dòng stage, số dòng ghi).
+    Dòng trùng key trong lô: giữ dòng cuối.
+    """
+    frame = frame.drop_duplicates(subset=["product_key", "market_key", "week_start", "horizon_days", "model_name"],
+                                  keep="last")
+    buf = io.StringIO()
+    frame.loc[:, list(STAGE_COLUMNS)].to_csv(buf, index=False, header=False)
+    buf.seek(0)
+
+    with connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE forecast_stage (
+                    product_key  INTEGER NOT NULL,
+                    market_key   INTEGER NOT NULL,
+                    week_start   DATE NOT NULL,
+                    horizon_days INTEGER NOT NULL,
+                    model_name   TEXT NOT NULL,
+                    p10          NUMERIC,
+                    p50          NUMERIC,
+                    p90          NUMERIC
+                ) ON COMMIT DROP;
+            """)
+            cur.copy_expert(f"COPY forecast_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+            cur.execute("""
+                INSERT INTO mart.demand_forecast_weekly AS df
+                    (product_key, market_key, week_start, horizon_days, model_name, p10, p50, p90)
+                SELECT product_key, market_key, week_start, horizon_days, model_name, p10, p50, p90
+                FROM forecast_stage
+                ON CONFLICT ON CONSTRAINT uq_forecast DO UPDATE
+                    SET p10 = EXCLUDED.p10,
+                        p50 = EXCLUDED.p50,
+                        p90 = EXCLUDED.p90,
+                        created_at = now()
+                    WHERE (df.p10, df.p50, df.p90) IS DISTINCT FROM (EXCLUDED.p10, EXCLUDED.p50, EXCLUDED.p90);
+            """)
+            written = cur.rowcount
+    return len(frame), written
+
+
+def resolve_series_keys(sku, country, channel):
+    """(product_key, market_key) cho --from-csv."""
+    with connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT p.product_key, m.market_key
+                FROM dim.dim_product p
+                JOIN dim.dim_market m ON m.country = %s AND m.channel = %s
+                WHERE p.sku = %s;
+            """, (country, channel, sku))
+            row = cur.fetchone()
+    if row is None:
+        raise SystemExit(f"Unknown series {sku} / {country} / {channel}")
+    return row
+
+
+def frame_from_notebook_csv(path, product_key, market_key, model_name):
+    """04_final_forecast_output.csv (ds, yhat, yhat_lower, yhat_upper) → STAGE_COLUMNS."""
+    out = pd.read_csv(path, parse_dates=["ds"]).sort_values("ds").reset_index(drop=True)
+    return pd.DataFrame({
+        "product_key": product_key,
+        "market_key": market_key,
+        "week_start": out["ds"].dt.date,
+        "horizon_days": (np.arange(len(out)) + 1) * 7,
+        "model_name": model_name,
+        "p10": out["yhat_lower"].clip(lower=0).round(4),
+        "p50": out["yhat"].clip(lower=0).round(4),
+        "p90": out["yhat_upper"].clip(lower=0).round(4),
+    })
+
+
+def trained_series_keys():
+    """Key của mọi series có artifact; bỏ series csv của notebook (không có key trong mart)."""
+    if not os.path.isdir(PROPHET_DIR):
+        return []
+    keys = []
+    for name in sorted(os.listdir(PROPHET_DIR)):
+        meta_path = os.path.join(PROPHET_DIR, name, "meta.json")
+        if not os.path.exists(meta_path):
+            continue
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["product_key"] is not None:
+            keys.append(meta["key"])
+    return keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--future", default=FUTURE_PARQUET, help="khung regressor tương lai (.csv / .parquet)")
+    parser.add_argument("--model-name", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--from-csv", help="nạp output notebook thay vì dự báo từ artifact")
+    parser.add_argument("--sku")
+    parser.add_argument("--country")
+    parser.add_argument("--channel")
+    parser.add_argument("--dry-run", action="store_true", help="chỉ dự báo, không ghi DB")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.from_csv:
+        if not (args.sku and args.country and args.channel):
+            parser.error("--from-csv requires --sku, --country and --channel")
+        product_key, market_key = resolve_series_keys(args.sku, args.country, args.channel)
+        frame = frame_from_notebook_csv(args.from_csv, product_key, market_key, args.model_name)
+    else:
+        keys = trained_series_keys()
+        future = read_frame(args.future)
+        store = build_feature_matrix("db")
+        # Worker chỉ cần các tuần sau last_ds sớm nhất của model (series train từ version feature cũ hơn)
+        oldest = min((pd.Timestamp(load_meta(k)["last_ds"]) for k in keys), default=store["last_ds"])
+        store = {**{k: store[k] for k in ("version", "features", "scaler", "last_raw", "last_ds")},
+                 "matrix": store["matrix"][store["matrix"]["ds"] > oldest]}
+        print(f"--- Forecasting {len(keys)} series with {args.workers} workers (features {store['version']}) ---")
+
+        frames = []
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=pin_blas_threads) as pool:
+            futures = {pool.submit(predict_series, k, store, future, args.model_name): k for k in keys}
+            for fut in as_completed(futures):
+                try:
+                    frames.append(fut.result())
+                except Exception as e:
+                    print(f"  ❌ {futures[fut]}: {e!r}")
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=STAGE_COLUMNS)
+    t_predict = time.perf_counter()
+
+    print(f"Prepared {len(frame)} forecast rows in {t_predict - t0:.1f}s")
+    if args.dry_run or frame.empty:
+        return
+
+    staged, written = write_forecasts(frame)
+    elapsed = time.perf_counter() - t_predict
+    print(f"✅ Merged {staged} rows ({written} inserted/updated) into mart.demand_forecast_weekly "
+          f"in {elapsed:.2f}s → {staged / elapsed if elapsed else 0:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Train Prophet cho từng series (SKU × market) trong fact.fact_sales_weekly, song song trên process pool.
+
+Mỗi series là 1 bài toán độc lập (tiền xử lý + model giống SparkPlug_Prophet.ipynb) nên được
+fan-out sang ProcessPoolExecutor; mỗi worker chỉ dùng 1 thread BLAS (pin_blas_threads) để
+N worker không tranh nhau core → thời gian retrain hằng đêm tăng theo số series / số core.
+
+    cd ai_workspace/prophet_forecaster
+    python -m pipelines.train_demand_forecast                    # mọi series trong DB
+    python -m pipelines.train_demand_forecast --sku K20PR-U --workers 4
+    python -m pipelines.train_demand_forecast --source csv       # bộ dữ liệu notebook
+
+Artifact mỗi series: models/prophet/<series>/ gồm model.json (prophet.serialize),
+scaler.joblib, params.json (k, m, delta, beta, sigma_obs của lần fit) và meta.json
+(feature, tuần cuối, thời gian fit, số vòng lặp, run_id).
+Thời gian từng series: models/prophet/runs/<run_id>.csv.
+
+Warm start: nếu series đã có params.json cùng danh sách feature, Stan (L-BFGS) khởi tạo từ nghiệm
+lần trước thay vì từ đầu — retrain hằng tuần thường chỉ thêm 1 điểm dữ liệu nên hội tụ sau vài vòng.
+--cold để bỏ qua.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .common import MODELS_DIR, PROPHET_PARAMS, load_series, make_prophet, pin_blas_threads
+from .features import build_feature_matrix, series_frame
+
+PROPHET_DIR = os.path.join(MODELS_DIR, "prophet")
+STAN_PARAMS = ("k", "m", "delta", "beta", "sigma_obs")
+N_CHANGEPOINTS = PROPHET_PARAMS.get("n_changepoints", 25)  # mặc định của Prophet
+
+
+def artifact_dir(key):
+    return os.path.join(PROPHET_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", key))
+
+
+def load_meta(key):
+    path = os.path.join(artifact_dir(key), "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def stan_init(model):
+    """Nghiệm MAP của model đã fit → dict init cho model.fit(..., init=...) (scalar: k, m, sigma_obs)."""
+    return {
+        name: float(model.params[name][0][0]) if name in ("k", "m", "sigma_obs")
+        else [float(v) for v in np.ravel(model.params[name][0])]
+        for name in STAN_PARAMS
+    }
+
+
+def load_init(key, features, n_changepoints):
+    """
+    params.json của lần fit trước nếu còn dùng được làm điểm khởi tạo:
+    cùng danh sách feature và cùng số changepoint (kích thước delta); ngược lại None → cold start.
+    """
+    meta = load_meta(key)
+    path = os.path.join(artifact_dir(key), "params.json")
+    if meta is None or meta.get("features") != features or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        init = json.load(f)
+    if set(init) != set(STAN_PARAMS) or len(init["delta"]) != n_changepoints:
+        return None
+    return init
+
+
+def fit_iterations(model):
+    """Số vòng lặp optimizer của lần fit vừa rồi (cmdstanpy, fit với save_iterations=True); None nếu không có."""
+    try:
+        return int(model.stan_backend.stan_fit.optimized_iterations_np.shape[0])
+    except Exception:
+        return None
+
+
+def save_artifacts(series, model, scaler, meta):
+    from prophet.serialize import model_to_json
+
+    out = artifact_dir(series["key"])
+    os.makedirs(out, exist_ok=True)
+    with open(os.path.join(out, "model.json"), "w", encoding="utf-8") as f:
+        f.write(model_to_json(model))
+    with open(os.path.join(out, "params.json"), "w", encoding="utf-8") as f:
+        json.dump(stan_init(model), f)
+    joblib.dump(scaler, os.path.join(out, "scaler.joblib"))
+    with open(os.path.join(out, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, default=str)
+    return out
+
+
+def fit_prophet(df, features, init=None):
+    """Fit (warm start nếu có init); nếu Stan lỗi với điểm khởi tạo cũ thì fit lại từ đầu."""
+    model = make_prophet(features)
+    kwargs = {"save_iterations": True}
+    if init is not None:
+        try:
+            return model.fit(df[["ds", "y"] + features], init=init, **kwargs), True
+        except Exception:
+            model = make_prophet(features)
+    return model.fit(df[["ds", "y"] + features], **kwargs), False
+
+
+def train_series(series, run_id, store, warm=True):
+    """
+    Chạy trong worker: ghép y với ma trận feature (features.py), fit (warm start từ params.json nếu có),
+    ghi artifact; trả về dòng timing.
+    """
+    t0 = time.perf_counter()
+    df, scaler = series_frame(series["frame"], store), store["scaler"]
+    previous = load_meta(series["key"]) if warm else None
+    init = load_init(series["key"], series["features"], N_CHANGEPOINTS) if warm else None
+    t_prep = time.perf_counter()
+
+    model, warm_started = fit_prophet(df, series["features"], init)
+    t_fit = time.perf_counter()
+    iterations = fit_iterations(model)
+
+    meta = {
+        "key": series["key"],
+        "product_key": series["product_key"],
+        "market_key": series["market_key"],
+        "features": series["features"],
+        "n_obs": len(df),
+        "first_ds": df["ds"].min().date().isoformat(),
+        "last_ds": df["ds"].max().date().isoformat(),
+        "feature_version": store["version"],
+        "run_id": run_id,
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "fit_seconds": round(t_fit - t_prep, 4),
+        "iterations": iterations,
+        "warm_start": warm_started,
+        "warm_start_from": previous["run_id"] if warm_started else None,
+    }
+    path = save_artifacts(series, model, scaler, meta)
+    t_end = time.perf_counter()
+
+    return {
+        "series": series["key"],
+        "n_obs": len(df),
+        "prep_seconds": round(t_prep - t0, 4),
+        "fit_seconds": round(t_fit - t_prep, 4),
+        "iterations": iterations,
+        "warm_start": warm_started,
+        "save_seconds": round(t_end - t_fit, 4),
+        "total_seconds": round(t_end - t0, 4),
+        "artifact": path,
+        "status": "ok",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("db", "csv"), default="db")
+    parser.add_argument("--sku", nargs="+", help="chỉ train các SKU này")
+    parser.add_argument("--min-weeks", type=int, default=52, help="bỏ series ngắn hơn")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cold", action="store_true", help="không warm start từ params.json của lần trước")
+    args = parser.parse_args()
+
+    run_id = f"train_{datetime.now():%Y_%m_%d_%H%M%S}"
+    series = load_series(args.source, min_weeks=args.min_weeks)
+    if args.sku:
+        series = [s for s in series if s["key"].split("|")[0] in set(args.sku)]
+    store = build_feature_matrix(args.source)
+    print(f"--- Training {len(series)} series with {args.workers} workers (run_id={run_id}, "
+          f"features {store['version']} {store['mode']}) ---")
+
+    t0 = time.perf_counter()
+    timings = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=pin_blas_threads) as pool:
+        futures = {pool.submit(train_series, s, run_id, store, not args.cold): s["key"] for s in series}
+        for fut in as_completed(futures):
+            key = futures[fut]
+            try:
+                row = fut.result()
+                print(f"  ✅ {key:<40} {row['n_obs']:>4} weeks  fit {row['fit_seconds']:.2f}s  "
+                      f"{row['iterations'] or '?'} iter ({'warm' if row['warm_start'] else 'cold'})")
+            except Exception as e:
+                row = {"series": key, "status": f"failed: {e!r}"}
+                print(f"  ❌ {key}: {e!r}")
+            timings.append(row)
+    wall = time.perf_counter() - t0
+
+    os.makedirs(os.path.join(PROPHET_DIR, "runs"), exist_ok=True)
+    timing_path = os.path.join(PROPHET_DIR, "runs", f"{run_id}.csv")
+    pd.DataFrame(timings).to_csv(timing_path, index=False)
+
+    ok = [t for t in timings if t.get("status") == "ok"]
+    fit_total = sum(t["total_seconds"] for t in ok)
+    print(f"Done: {len(ok)}/{len(series)} series in {wall:.1f}s wall "
+          f"({fit_total:.1f}s summed, speedup ×{fit_total / wall if wall else 0:.1f})")
+    for label, group in (("warm", [t for t in ok if t["warm_start"]]), ("cold", [t for t in ok if not t["warm_start"]])):
+        if group:
+            iters = [t["iterations"] for t in group if t["iterations"] is not None]
+            print(f"  {label}: {len(group)} series, mean fit {np.mean([t['fit_seconds'] for t in group]):.2f}s"
+                  + (f", mean {np.mean(iters):.0f} iter" if iters else ""))
+    print(f"Timings: {timing_path}")
+
+
+if __name__ == "__main__":
+    main()
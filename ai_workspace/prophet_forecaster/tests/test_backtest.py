@@ -0,0 +1,72 @@
+"""
+Rolling-origin backtest: vị trí cutoff, gộp tổng lỗi theo (model, horizon), baseline naive (không cần DB / Prophet).
+
+    cd ai_workspace/prophet_forecaster
+    python -m pytest -q tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipelines.backtest import aggregate, forecast_naive, forecast_seasonal_naive, rolling_cutoffs, run_fold
+from pipelines.common import FREQ, error_sums
+
+
+def test_rolling_cutoffs_leave_room_for_the_longest_horizon():
+    ds = pd.date_range("2022-01-03", periods=100, freq=FREQ)
+    cutoffs = rolling_cutoffs(ds, n_cutoffs=4, step_weeks=2, max_h_weeks=4, min_train_weeks=52)
+
+    assert cutoffs == sorted(cutoffs) and len(cutoffs) == 4
+    assert cutoffs[-1] == ds[100 - 4 - 1]
+    assert all((b - a).days == 14 for a, b in zip(cutoffs, cutoffs[1:]))
+    assert (ds > cutoffs[-1]).sum() == 4
+
+
+def test_rolling_cutoffs_drop_origins_with_short_training():
+    ds = pd.date_range("2022-01-03", periods=60, freq=FREQ)
+    cutoffs = rolling_cutoffs(ds, n_cutoffs=10, step_weeks=2, max_h_weeks=4, min_train_weeks=52)
+    assert cutoffs == [ds[51], ds[53], ds[55]]
+
+
+def test_error_sums():
+    sums = error_sums([10, 0, 20], p10=[5, 0, 25], p50=[8, 0, 30], p90=[12, 1, 35])
+    assert sums["n"] == 3
+    assert sums["sum_abs_err"] == pytest.approx(12.0)
+    assert sums["sum_smape"] == pytest.approx(200 * 2 / 18 + 0 + 200 * 10 / 50)
+    assert sums["n_covered"] == 2
+    assert sums["sum_pinball_p90"] == pytest.approx(0.1 * 2 + 0.1 * 1 + 0.1 * 15)
+
+
+def test_aggregate_pools_points_across_folds():
+    def fold(model, latency, n, smape):
+        return {"model_name": model, "latency": latency, "by_horizon": {
+            1: {"n": n, "sum_smape": smape * n, "sum_abs_err": 2.0 * n, "sum_pinball_p90": n, "n_covered": n},
+            4: {"n": 0, "sum_smape": 0, "sum_abs_err": 0, "sum_pinball_p90": 0, "n_covered": 0},
+        }}
+
+    rows = aggregate([fold("a", 1.0, 1, 10.0), fold("a", 3.0, 3, 20.0), fold("b", 2.0, 2, 5.0)], [1, 4])
+
+    assert [(r["model_name"], r["horizon_days"]) for r in rows] == [("a", 7), ("b", 7)]  # horizon không có điểm: bỏ
+    a = rows[0]
+    assert a["smape"] == pytest.approx((10.0 + 60.0) / 4)  # theo điểm, không phải trung bình theo fold
+    assert a["latency"] == pytest.approx(2.0) and a["folds"] == 2 and a["coverage"] == 100.0
+
+
+def test_seasonal_naive_repeats_last_season():
+    y = np.arange(60, dtype=float)
+    train = pd.DataFrame({"y": y})
+    p10, p50, p90 = forecast_seasonal_naive(train, pd.DataFrame(index=range(3)), [])
+    assert p50.tolist() == [8.0, 9.0, 10.0]
+    # residual mùa vụ của chuỗi tăng đều = 52 → khoảng lệch hẳn lên trên P50
+    assert p10.tolist() == p90.tolist() == [60.0, 61.0, 62.0]
+
+
+def test_run_fold_scores_each_horizon_on_its_own_prefix():
+    ds = pd.date_range("2022-01-03", periods=10, freq=FREQ)
+    df = pd.DataFrame({"ds": ds, "y": [5.0] * 8 + [5.0, 9.0]})
+    result = run_fold("naive_v1", "s", df, [], ds[7], [1, 2])
+
+    assert result["by_horizon"][1]["sum_abs_err"] == 0.0
+    assert result["by_horizon"][2]["sum_abs_err"] == 4.0
+    p10, p50, _ = forecast_naive(df[df["ds"] <= ds[7]], df.tail(2), [])
+    assert p50.tolist() == [5.0, 5.0] and (p10 <= p50).all()
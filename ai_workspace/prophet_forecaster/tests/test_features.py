@@ -0,0 +1,113 @@
+"""
+Feature store (features.py): hash dữ liệu, lag có seed, cache hit / incremental / rebuild, và khung regressor
+của generate_forecasts bắt đầu từ tuần cuối của model (không cần DB / Prophet).
+
+    cd ai_workspace/prophet_forecaster
+    python -m pytest -q tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipelines import features as fx
+from pipelines.common import FREQ
+from pipelines.generate_forecasts import future_regressors
+
+FEATURES = ["pmi", "cpi", "promo_depth"]
+
+
+def _raw(weeks, start="2023-01-02", seed=0):
+    rng = np.random.default_rng(seed)
+    raw = pd.DataFrame({"ds": pd.date_range(start, periods=weeks, freq=FREQ)})
+    for i, name in enumerate(FEATURES):
+        raw[name] = rng.normal(loc=10 * (i + 1), size=weeks)
+    return raw
+
+
+@pytest.fixture
+def store_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(fx, "FEATURES_DIR", str(tmp_path))
+    current = {}
+    monkeypatch.setattr(fx, "load_raw", lambda source: (current["raw"].copy(), list(FEATURES)))
+    return current
+
+
+def test_data_hash_tracks_content():
+    raw = _raw(10)
+    assert fx.data_hash(raw, FEATURES) == fx.data_hash(raw.copy(), FEATURES)
+    changed = raw.copy()
+    changed.loc[3, "cpi"] += 1e-9
+    assert fx.data_hash(changed, FEATURES) != fx.data_hash(raw, FEATURES)
+    assert fx.data_hash(raw, FEATURES[::-1]) != fx.data_hash(raw, FEATURES)
+
+
+def test_lag_features_with_seed_matches_full_recompute():
+    raw = _raw(20)
+    raw.loc[15, "pmi"] = np.nan  # ffill qua ranh giới khối
+    scaler = fx.fit_scaler(raw, FEATURES)
+
+    full, last_full = fx.lag_features(raw, FEATURES, scaler)
+    head, seed = fx.lag_features(raw.iloc[:15], FEATURES, scaler)
+    tail, last_tail = fx.lag_features(raw.iloc[15:].reset_index(drop=True), FEATURES, scaler, seed=seed)
+
+    assert full.iloc[0][FEATURES].isna().all()  # tuần đầu không có lag
+    pd.testing.assert_frame_equal(pd.concat([head, tail], ignore_index=True), full)
+    assert last_tail == last_full
+
+
+def test_build_feature_matrix_hit_incremental_rebuild(store_dir):
+    store_dir["raw"] = _raw(30)
+    first = fx.build_feature_matrix("csv")
+    assert first["mode"] == "rebuild" and first["n_rows"] == 30
+
+    assert fx.build_feature_matrix("csv")["mode"] == "hit"
+
+    # chỉ thêm tuần mới → giữ scaler, ma trận = tính lại toàn bộ với scaler cũ
+    store_dir["raw"] = pd.concat([store_dir["raw"], _raw(4, start="2023-07-31", seed=1)], ignore_index=True)
+    grown = fx.build_feature_matrix("csv")
+    assert grown["mode"] == "incremental" and grown["scaler_version"] == first["version"]
+    expected, _ = fx.lag_features(store_dir["raw"], FEATURES, first["scaler"])
+    pd.testing.assert_frame_equal(grown["matrix"].reset_index(drop=True), expected, check_dtype=False)
+
+    # sửa dữ liệu cũ → fit lại từ đầu
+    store_dir["raw"].loc[5, "pmi"] += 1.0
+    rebuilt = fx.build_feature_matrix("csv")
+    assert rebuilt["mode"] == "rebuild" and rebuilt["scaler_version"] == rebuilt["version"]
+
+
+def test_series_frame_joins_on_ds_and_drops_unlagged_week(store_dir):
+    store_dir["raw"] = _raw(10)
+    store = fx.build_feature_matrix("csv")
+    frame = pd.DataFrame({"ds": store["matrix"]["ds"], "y": [1.0, np.nan] + [2.0] * 8})
+    df = fx.series_frame(frame, store)
+    assert len(df) == 9 and df["ds"].iloc[0] == store["matrix"]["ds"].iloc[1]
+    assert df["y"].iloc[0] == 1.0  # y ffill trước khi bỏ tuần chưa có lag
+
+
+def test_future_regressors_start_after_model_last_ds():
+    raw = _raw(30)
+    future = _raw(4, start="2023-07-31", seed=1)
+    store_scaler = fx.fit_scaler(raw, FEATURES)
+    matrix, last_raw = fx.lag_features(raw, FEATURES, store_scaler)
+    store = {"version": "v2", "features": FEATURES, "matrix": matrix, "scaler": store_scaler,
+             "last_raw": last_raw, "last_ds": raw["ds"].max()}
+
+    # model train trên version cũ (20 tuần, scaler khác): khung phải bắt đầu ngay sau tuần 20
+    model_scaler = fx.fit_scaler(raw.iloc[:20], FEATURES)
+    model_last_ds = raw["ds"].iloc[19]
+    frame = future_regressors(future, FEATURES, model_scaler, store, model_last_ds)
+
+    expected, _ = fx.lag_features(pd.concat([raw, future], ignore_index=True), FEATURES, model_scaler)
+    expected = expected[expected["ds"] > model_last_ds].reset_index(drop=True)
+    assert frame["ds"].iloc[0] == model_last_ds + pd.Timedelta(days=7) and len(frame) == 14
+    pd.testing.assert_frame_equal(frame, expected, check_dtype=False)
+
+
+def test_future_regressors_refuse_unknown_features():
+    raw = _raw(10)
+    scaler = fx.fit_scaler(raw, FEATURES)
+    matrix, last_raw = fx.lag_features(raw, FEATURES, scaler)
+    store = {"version": "v1", "features": FEATURES[:2], "matrix": matrix, "scaler": scaler,
+             "last_raw": last_raw[:2], "last_ds": raw["ds"].max()}
+    with pytest.raises(ValueError, match="retrain"):
+        future_regressors(raw, FEATURES, scaler, store, raw["ds"].iloc[5])
@@ -0,0 +1,65 @@
+"""
+Khung regressor tương lai (future_regressors.future_frame) trên dữ liệu nhỏ tự sinh (không cần DB / Prophet).
+
+    cd ai_workspace/prophet_forecaster
+    python -m pytest -q tests
+"""
+import numpy as np
+import pandas as pd
+
+from pipelines import future_regressors as fr
+from pipelines.common import DB_FEATURES, FREQ
+
+
+def _raw(weeks=60):
+    rng = np.random.default_rng(3)
+    raw = pd.DataFrame({"ds": pd.date_range("2023-01-02", periods=weeks, freq=FREQ)})
+    for name in DB_FEATURES:
+        raw[name] = rng.uniform(1, 10, size=weeks)
+    raw["total_new_vehicle_sales"] = rng.integers(20_000, 30_000, size=weeks)
+    raw["bev_penetration_rate"] = np.linspace(0.05, 0.10, weeks)
+    raw["total_ice_and_hybrid_on_road"] = 4_000_000
+    return raw
+
+
+def test_future_frame_has_every_feature(monkeypatch):
+    # total_new_vehicle_sales → linear để không cần Prophet (và không mở process pool)
+    monkeypatch.setitem(fr.DRIVER_METHODS, "total_new_vehicle_sales", "linear")
+    raw = _raw()
+    future, timings = fr.future_frame(raw, DB_FEATURES, weeks=8)
+
+    assert list(future.columns) == ["ds"] + DB_FEATURES
+    assert len(future) == 8 and not future.isna().any().any()
+    assert future["ds"].iloc[0] == raw["ds"].iloc[-1] + pd.Timedelta(days=7)
+    assert set(timings) == {"total_new_vehicle_sales", "bev_penetration_rate", "gtrends_score"}
+    assert future["bev_penetration_rate"].between(0, 1).all()
+
+
+def test_add_derived_only_for_requested_features():
+    history = pd.DataFrame({"total_ice_and_hybrid_on_road": [1_000_000]})
+    future = pd.DataFrame({"total_new_vehicle_sales": [1000, 1000], "bev_penetration_rate": [0.1, 0.2]})
+
+    out = fr.add_derived(future.copy(), history, ["new_ice_and_hybrid_sales", "total_ice_and_hybrid_on_road"])
+    assert out["new_ice_and_hybrid_sales"].tolist() == [900, 800]
+    expected = 1_000_000 * (1 - fr.SCRAPPAGE_RATE_WEEKLY) + 900 / fr.WEEKS_PER_MONTH
+    assert out["total_ice_and_hybrid_on_road"].iloc[0] == round(expected)
+    expected = expected * (1 - fr.SCRAPPAGE_RATE_WEEKLY) + 800 / fr.WEEKS_PER_MONTH
+    assert out["total_ice_and_hybrid_on_road"].iloc[1] == round(expected)
+
+    untouched = fr.add_derived(future.copy(), history, ["total_new_vehicle_sales"])
+    assert list(untouched.columns) == list(future.columns)
+
+
+def test_cheap_driver_methods():
+    ds = pd.date_range("2023-01-02", periods=60, freq=FREQ)
+    future_ds = pd.date_range(ds[-1] + pd.Timedelta(days=7), periods=3, freq=FREQ)
+
+    trend = fr.forecast_linear(ds, 2.0 * np.arange(60) + 1, future_ds)
+    np.testing.assert_allclose(trend, [121.0, 123.0, 125.0])
+
+    season = fr.forecast_seasonal_naive(ds, np.arange(60, dtype=float), future_ds)
+    assert season.tolist() == [8.0, 9.0, 10.0]
+
+    name, values, _ = fr.forecast_driver("bev_penetration_rate", "linear", ds, np.linspace(0.5, 0.99, 60),
+                                         pd.date_range(future_ds[0], periods=20, freq=FREQ))
+    assert name == "bev_penetration_rate" and values.max() == 1.0  # BOUNDS
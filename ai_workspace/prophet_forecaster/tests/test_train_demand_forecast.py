@@ -0,0 +1,49 @@
+"""
+Fan-out của pipeline train: tách series (SKU × market) từ fact_sales_weekly và thư mục artifact
+(không cần DB / Prophet: pd.read_sql_query được thay bằng dữ liệu tự sinh).
+
+    cd ai_workspace/prophet_forecaster
+    python -m pytest -q tests
+"""
+import os
+
+import pandas as pd
+
+from pipelines import common
+from pipelines.common import DB_FEATURES, FREQ
+from pipelines.train_demand_forecast import artifact_dir, load_meta
+
+
+def _fake_read_sql(sales, regressors):
+    def read_sql_query(sql, conn, parse_dates=None):
+        return sales if sql == common.SERIES_SQL else regressors
+    return read_sql_query
+
+
+def test_load_db_series_splits_and_filters(monkeypatch):
+    ds = pd.date_range("2024-01-01", periods=6, freq=FREQ)
+    sales = pd.concat([
+        pd.DataFrame({"product_key": 1, "market_key": 10, "sku": "K20PR-U", "country": "Vietnam",
+                      "channel": "Dealer", "ds": ds, "y": range(6)}),
+        pd.DataFrame({"product_key": 2, "market_key": 10, "sku": "SC20HR11", "country": "Vietnam",
+                      "channel": "Dealer", "ds": ds[:3], "y": range(3)}),
+    ], ignore_index=True)
+    regressors = pd.DataFrame({"ds": ds[1:], **{f: 1.0 for f in DB_FEATURES}})
+    monkeypatch.setattr(common.pd, "read_sql_query", _fake_read_sql(sales, regressors))
+
+    series = common.load_db_series(conn=None, min_weeks=4)
+
+    assert [s["key"] for s in series] == ["K20PR-U|Vietnam|Dealer"]  # series 3 tuần bị bỏ
+    s = series[0]
+    assert (s["product_key"], s["market_key"]) == (1, 10)
+    assert list(s["frame"].columns) == ["ds", "y"] + DB_FEATURES
+    assert len(s["frame"]) == 6 and s["frame"][DB_FEATURES[0]].isna().sum() == 1  # tuần thiếu regressor giữ lại
+
+
+def test_artifact_dir_is_filesystem_safe():
+    assert os.path.basename(artifact_dir("K20PR-U|Việt Nam|Dealer/OEM")) == "K20PR-U_Vi_t_Nam_Dealer_OEM"
+
+
+def test_load_meta_missing_is_none(monkeypatch, tmp_path):
+    monkeypatch.setattr("pipelines.train_demand_forecast.PROPHET_DIR", str(tmp_path))
+    assert load_meta("K20PR-U|Vietnam|Dealer") is None
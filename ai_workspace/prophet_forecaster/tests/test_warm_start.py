@@ -0,0 +1,73 @@
+"""
+Warm start: nghiệm Stan của lần fit trước → init, và các điều kiện bỏ init (cold start).
+
+    cd ai_workspace/prophet_forecaster
+    python -m pytest -q tests
+"""
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from pipelines import train_demand_forecast as tdf
+
+KEY = "K20PR-U|Vietnam|Dealer"
+FEATURES = ["pmi", "cpi"]
+
+
+def _fitted(n_changepoints=tdf.N_CHANGEPOINTS, n_features=len(FEATURES)):
+    # model.params của Prophet: mỗi tham số có shape (1, ...) (1 nghiệm MAP)
+    return SimpleNamespace(params={
+        "k": np.array([[0.3]]),
+        "m": np.array([[0.1]]),
+        "delta": np.arange(n_changepoints, dtype=float).reshape(1, -1) / 100,
+        "beta": np.ones((1, n_features)),
+        "sigma_obs": np.array([[0.05]]),
+    })
+
+
+@pytest.fixture
+def artifacts(monkeypatch, tmp_path):
+    monkeypatch.setattr(tdf, "PROPHET_DIR", str(tmp_path))
+
+    def write(init, features=FEATURES):
+        out = tdf.artifact_dir(KEY)
+        os.makedirs(out, exist_ok=True)
+        with open(os.path.join(out, "params.json"), "w", encoding="utf-8") as f:
+            json.dump(init, f)
+        with open(os.path.join(out, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"key": KEY, "features": features}, f)
+    return write
+
+
+def test_stan_init_shapes():
+    init = tdf.stan_init(_fitted())
+    assert set(init) == set(tdf.STAN_PARAMS)
+    assert init["k"] == 0.3 and init["m"] == 0.1 and init["sigma_obs"] == 0.05
+    assert len(init["delta"]) == tdf.N_CHANGEPOINTS and init["beta"] == [1.0, 1.0]
+    json.dumps(init)  # ghi được ra params.json
+
+
+def test_load_init_round_trip(artifacts):
+    artifacts(tdf.stan_init(_fitted()))
+    init = tdf.load_init(KEY, FEATURES, tdf.N_CHANGEPOINTS)
+    assert init is not None and init["beta"] == [1.0, 1.0]
+
+
+@pytest.mark.parametrize("features, n_changepoints", [
+    (["pmi"], tdf.N_CHANGEPOINTS),           # đổi danh sách feature
+    (FEATURES, tdf.N_CHANGEPOINTS + 5),      # đổi số changepoint (kích thước delta)
+])
+def test_load_init_rejects_incompatible(artifacts, features, n_changepoints):
+    artifacts(tdf.stan_init(_fitted()))
+    assert tdf.load_init(KEY, features, n_changepoints) is None
+
+
+def test_load_init_rejects_missing_params(artifacts):
+    init = tdf.stan_init(_fitted())
+    del init["sigma_obs"]
+    artifacts(init)
+    assert tdf.load_init(KEY, FEATURES, tdf.N_CHANGEPOINTS) is None
+    assert tdf.load_init("unknown|series|x", FEATURES, tdf.N_CHANGEPOINTS) is None
@@ -0,0 +1,55 @@
+"""
+Benchmark mô phỏng Monte Carlo tồn kho (services/inventory_service.py), không cần DB.
+
+    cd backend
+    python bench_inventory_sim.py                 # mặc định: 50 series × 2000 paths × 13 tuần
+    python bench_inventory_sim.py --series 200 --paths 5000 --weeks 26
+
+In ra thời gian draw + simulate (median của các lần lặp) và ms / series,
+dùng để đặt ngân sách latency cho /api/inventory/simulate.
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from denso_app.services.inventory_service import compute_policies, draw_demand, simulate_inventory
+
+
+def synthetic_forecast(n_series, weeks, rng):
+    p50 = rng.uniform(50, 400, size=(n_series, 1)) * rng.uniform(0.8, 1.2, size=(n_series, weeks))
+    spread = rng.uniform(0.15, 0.4, size=(n_series, 1))
+    return p50 * (1 - spread), p50, p50 * (1 + spread)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=50)
+    parser.add_argument("--paths", type=int, default=2000)
+    parser.add_argument("--weeks", type=int, default=13)
+    parser.add_argument("--lead-time", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    p10, p50, p90 = synthetic_forecast(args.series, args.weeks, rng)
+    policy = compute_policies(p10, p50, p90, 0.95, args.lead_time, 7, 0, 0, 24)
+
+    timings = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        demand = draw_demand(p10, p50, p90, args.paths, rng)
+        sim = simulate_inventory(demand, policy["base_stock"], policy["base_stock"], 0,
+                                 args.lead_time, 7, 24, 1.0)
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    median_ms = statistics.median(timings)
+    print(f"{args.series} series × {args.paths} paths × {args.weeks} weeks, {args.repeat} runs")
+    print(f"  median {median_ms:.1f} ms  (min {min(timings):.1f}, max {max(timings):.1f})")
+    print(f"  {median_ms / args.series:.3f} ms / series")
+    print(f"  mean fill rate {sim['fill_rate'].mean():.4f}, mean stockout prob {sim['stockout_prob'].mean():.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
+import atexit
+
 from flask import Flask
 
 from .config import Config
+from .db import close_pool
 from .api import register_blueprints
 
 
@@ -16,4 +19,5 @@ def create_app() -> Flask:
     )
     app.config.from_object(Config)
     register_blueprints(app)
+    atexit.register(close_pool)
     return app
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request
 
 from ..core.constants import ROLES
+from ..wire import compress_body, negotiate_encoding
 
 
 def register_blueprints(app):
@@ -22,9 +23,40 @@ def register_blueprints(app):
     # Tất cả API đều sẽ có prefix "/api" khi register ở dưới.
     api_bp = Blueprint("api", __name__)
 
+    @api_bp.after_request
+    def add_conditional_get(response):
+        """
+        Strong ETag (sha1 của body, hoặc ETag có sẵn từ response cache) cho GET 200;
+        request có If-None-Match trùng → 304 không body. Body lớn được nén theo Accept-Encoding.
+        """
+        if (
+            request.method != "GET"
+            or response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+        ):
+            return response
+
+        if "ETag" not in response.headers:
+            response.add_etag()
+        response.headers.setdefault("Cache-Control", "private, no-cache")
+
+        # Nén gzip/br sau response cache (cache giữ body gốc); ETag riêng cho từng encoding
+        encoding = negotiate_encoding(request, response)
+        if encoding:
+            etag, _ = response.get_etag()
+            response.set_etag(f"{etag}-{encoding}")
+            response.vary.add("Accept-Encoding")
+            if not request.if_none_match.contains(f"{etag}-{encoding}"):
+                response.set_data(compress_body(response.get_data(), encoding))
+                response.headers["Content-Encoding"] = encoding
+
+        return response.make_conditional(request)
+
     # Import các module API theo domain
     from . import (
         dashboard,
+        alerts,
         forecast,
         scenario,
         campaign,
@@ -37,6 +69,7 @@ def register_blueprints(app):
 
     # ============= A. DASHBOARD APIs =============
     dashboard.register(api_bp)
+    alerts.register(api_bp)
 
     # ============= B. FORECAST APIs ==============
     forecast.register(api_bp)
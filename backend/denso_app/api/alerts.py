@@ -0,0 +1,36 @@
+from flask import request, jsonify
+
+from ..services.alert_service import DEFAULT_PAGE_SIZE, fetch_alert_page
+
+
+def _csv_arg(name):
+    raw = request.args.get(name)
+    return [v.strip() for v in raw.split(",") if v.strip()] if raw else None
+
+
+def register(bp):
+    @bp.get("/alerts")
+    def api_alerts():
+        """
+        Alert feed phân trang theo cursor:
+        /api/alerts?limit=20&level=high,med&type=stockout_risk&cursor=<next_cursor>
+        """
+        try:
+            limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({"ok": False, "message": "limit must be an integer"}), 400
+
+        try:
+            items, next_cursor = fetch_alert_page(
+                limit=limit,
+                cursor=request.args.get("cursor"),
+                levels=_csv_arg("level"),
+                types=_csv_arg("type"),
+            )
+        except ValueError as e:
+            return jsonify({"ok": False, "message": str(e)}), 400
+        except Exception as e:
+            print(">>> [api_alerts] DB error:", repr(e))
+            return jsonify({"ok": False, "message": "DB error when loading alerts"}), 500
+
+        return jsonify({"alerts": items, "next_cursor": next_cursor})
@@ -1,88 +1,81 @@
-import json
 import random
 from datetime import datetime, timedelta
 
-from flask import jsonify
+from flask import jsonify, request
 
-from ..db import query_one
+from ..services.campaign_service import (
+    DEFAULT_RESAMPLES,
+    MAX_RESAMPLES,
+    analyze_campaign,
+    block_bootstrap_lift,
+    campaign_summary,
+    fetch_campaigns,
+)
+
+
+def _bootstrap_args(args):
+    """resamples / block từ query string; ValueError nếu ngoài giới hạn."""
+    resamples = int(args.get("resamples", DEFAULT_RESAMPLES))
+    block = int(args["block"]) if args.get("block") else None
+    if not 100 <= resamples <= MAX_RESAMPLES:
+        raise ValueError(f"resamples must be between 100 and {MAX_RESAMPLES}")
+    if block is not None and block < 1:
+        raise ValueError("block must be >= 1")
+    return resamples, block
 
 
 def register(bp):
     @bp.get("/campaign/impact")
     def api_campaign():
         """
-        Campaign impact.
+        Campaign impact: campaign mới nhất (hoặc ?campaign_id=), lift / CI 95% / p-value
+        tính từ chuỗi observed vs counterfactual bằng block bootstrap (services/campaign_service.py).
+        ?resamples=5000&block= (mặc định block ~ n^(1/3)).
         """
         try:
-            row = query_one("""
-                SELECT name, sku, start_date, end_date,
-                       abs_lift, rel_lift, p_value, roi,
-                       observed_ts, counterfactual_ts, reasons
-                FROM mart.campaign_impact
-                ORDER BY start_date DESC
-                LIMIT 1;
-            """)
-
-            if not row:
+            resamples, block = _bootstrap_args(request.args)
+            campaign_id = int(request.args["campaign_id"]) if request.args.get("campaign_id") else None
+        except ValueError as e:
+            return jsonify({"ok": False, "message": f"Invalid input: {e}"}), 400
+
+        try:
+            rows = fetch_campaigns(campaign_id, limit=1)
+            if not rows:
+                if campaign_id is not None:
+                    return jsonify({"ok": False, "message": f"Campaign {campaign_id} not found"}), 404
                 raise RuntimeError("No rows in mart.campaign_impact")
+            row = rows[0]
 
-            obs_raw = row["observed_ts"]
-            cf_raw = row["counterfactual_ts"]
-            reasons_raw = row["reasons"]
-
-            if isinstance(obs_raw, str):
-                try:
-                    observed = json.loads(obs_raw)
-                except Exception:
-                    observed = None
-            else:
-                observed = obs_raw
-
-            if isinstance(cf_raw, str):
-                try:
-                    counterfactual = json.loads(cf_raw)
-                except Exception:
-                    counterfactual = None
-            else:
-                counterfactual = cf_raw
-
-            if isinstance(reasons_raw, str):
-                try:
-                    reasons = json.loads(reasons_raw)
-                except Exception:
-                    reasons = []
-            else:
-                reasons = reasons_raw or []
-
-            n_points = 7
-            if not (isinstance(observed, list) and isinstance(counterfactual, list) and
-                    len(observed) == len(counterfactual) and
-                    all(isinstance(x, (int, float)) for x in observed if x is not None) and
-                    all(isinstance(x, (int, float)) for x in counterfactual if x is not None)):
-                days = [(row["start_date"] + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(n_points)]
-                observed = [random.randint(95, 165) for _ in days]
+            observed, counterfactual = row["observed_ts"], row["counterfactual_ts"]
+            analysis = analyze_campaign(row, resamples, block)
+            if analysis is None:
+                print(">>> [api_campaign] invalid observed/counterfactual series, fallback random")
+                observed = [random.randint(95, 165) for _ in range(7)]
                 counterfactual = [max(65, v - random.randint(8, 25)) for v in observed]
-            else:
-                n_points = len(observed)
-                days = [(row["start_date"] + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(n_points)]
+                analysis = block_bootstrap_lift(observed, counterfactual, resamples, block)
+            days = [(row["start_date"] + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(len(observed))]
 
-            abs_lift = float(row["abs_lift"]) if row["abs_lift"] is not None else (sum(observed) - sum(counterfactual))
-            rel_lift = float(row["rel_lift"]) if row["rel_lift"] is not None else abs_lift / max(1, sum(counterfactual))
-            p_value = float(row["p_value"]) if row["p_value"] is not None else random.uniform(0.001, 0.05)
+            rel_lift = analysis["rel_lift"] or 0.0
             roi = float(row["roi"]) if row["roi"] is not None else random.uniform(1.2, 3.8)
 
             return jsonify({
+                "campaign_id": row["campaign_id"],
                 "days": days,
                 "observed": observed,
                 "counterfactual": counterfactual,
                 "cards": {
-                    "abs_lift": abs_lift,
+                    "abs_lift": round(analysis["abs_lift"], 2),
                     "rel_lift": round(rel_lift * 100, 2),
-                    "ci_95": [round(abs_lift * 0.88), round(abs_lift * 1.12)],
-                    "p_value": round(p_value, 4),
+                    "ci_95": [round(v, 2) for v in analysis["ci_95"]],
+                    "p_value": round(analysis["p_value"], 4),
                     "roi": round(roi, 2)
                 },
-                "reasons": reasons or [
+                "bootstrap": {
+                    "resamples": analysis["resamples"],
+                    "block": analysis["block"],
+                    "n_points": analysis["n_points"],
+                },
+                "reasons": row["reasons"] or [
                     "Deep retailer discount",
                     "Strong digital marketing",
                     "Bundle with free inspection"
@@ -99,18 +92,17 @@ def register(bp):
             observed = [random.randint(95, 165) for _ in days]
             counterfactual = [max(65, v - random.randint(8, 25)) for v in observed]
 
-            abs_lift = sum(observed) - sum(counterfactual)
-            rel_lift = abs_lift / max(1, sum(counterfactual))
+            analysis = block_bootstrap_lift(observed, counterfactual, resamples, block)
 
             return jsonify({
                 "days": days,
                 "observed": observed,
                 "counterfactual": counterfactual,
                 "cards": {
-                    "abs_lift": abs_lift,
-                    "rel_lift": round(rel_lift * 100, 2),
-                    "ci_95": [round(abs_lift * 0.88), round(abs_lift * 1.12)],
-                    "p_value": round(random.uniform(0.001, 0.05), 4),
+                    "abs_lift": round(analysis["abs_lift"], 2),
+                    "rel_lift": round(analysis["rel_lift"] * 100, 2),
+                    "ci_95": [round(v, 2) for v in analysis["ci_95"]],
+                    "p_value": round(analysis["p_value"], 4),
                     "roi": round(random.uniform(1.2, 3.8), 2)
                 },
                 "reasons": [
@@ -120,3 +112,23 @@ def register(bp):
                     "Positive weather conditions"
                 ]
             })
+
+    @bp.get("/campaigns")
+    def api_campaigns():
+        """
+        Danh sách campaign + phân tích lift / CI / p-value cho tất cả trong 1 lượt
+        (1 query, mỗi campaign 1 lần bootstrap vector hoá; kết quả cache theo campaign).
+        """
+        try:
+            resamples, block = _bootstrap_args(request.args)
+        except ValueError as e:
+            return jsonify({"ok": False, "message": f"Invalid input: {e}"}), 400
+
+        try:
+            rows = fetch_campaigns()
+        except Exception as e:
+            print(">>> [api_campaigns] DB error:", repr(e))
+            return jsonify({"ok": False, "message": "Cannot load campaigns"}), 500
+
+        items = [campaign_summary(r, analyze_campaign(r, resamples, block)) for r in rows]
+        return jsonify({"items": items, "resamples": resamples})
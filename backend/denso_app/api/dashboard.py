@@ -1,10 +1,129 @@
 import random
+import time
 from datetime import datetime, timedelta
 
 from flask import request, jsonify
 
-from ..db import query_all, query_one
+from ..db import query_one
 from ..core.constants import DENSO_SKUS, CHANNELS
+from ..services.alert_service import shape_alert_page
+from ..wire import columnar_response, parse_format
+
+DASHBOARD_ALERT_LIMIT = 10
+
+
+# Toàn bộ 6 dataset của dashboard trong 1 câu SQL (1 connection, 1 round trip).
+# risky / by_category / coverage đọc từ mart.dash_* (tổng hợp sẵn, xem schema.sql mục 8).
+# Mỗi section là 1 scalar subquery trả về JSON; các cột clock_timestamp() xen giữa
+# được evaluate theo thứ tự target list nên hiệu giữa chúng ~ thời gian của từng section.
+DASHBOARD_SQL = """
+    SELECT
+        clock_timestamp() AS t_start,
+
+        (SELECT row_to_json(k)
+         FROM (
+             SELECT revenue_p50::float8    AS revenue_p50,
+                    revenue_p10::float8    AS revenue_p10,
+                    revenue_p90::float8    AS revenue_p90,
+                    mape_last_week::float8 AS mape_last_week,
+                    coverage_28d::float8   AS coverage_28d
+             FROM mart.kpi_summary
+             ORDER BY kpi_date DESC
+             LIMIT 1
+         ) k) AS kpi,
+        clock_timestamp() AS t_kpi,
+
+        (SELECT json_agg(r.sku ORDER BY r.rank)
+         FROM (
+             SELECT rank, sku
+             FROM mart.dash_risky_sku
+             ORDER BY rank
+             LIMIT 5
+         ) r) AS risky,
+        clock_timestamp() AS t_risky,
+
+        (SELECT json_build_object(
+                    'labels', json_agg(to_char(f.week_start, 'YYYY-MM-DD') ORDER BY f.week_start, f.forecast_key),
+                    'p10',    json_agg(f.p10::float8 ORDER BY f.week_start, f.forecast_key),
+                    'p50',    json_agg(f.p50::float8 ORDER BY f.week_start, f.forecast_key),
+                    'p90',    json_agg(f.p90::float8 ORDER BY f.week_start, f.forecast_key),
+                    'actual', json_agg(f.actual::float8 ORDER BY f.week_start, f.forecast_key)
+                )
+         FROM (
+             -- 1 điểm / tuần: forecast origin mới nhất (horizon ngắn nhất)
+             SELECT DISTINCT ON (df.week_start)
+                    df.forecast_key, df.week_start, df.p10, df.p50, df.p90, df.actual
+             FROM mart.demand_forecast_weekly df
+             JOIN dim.dim_product p ON p.product_key = df.product_key
+             JOIN dim.dim_market m ON m.market_key = df.market_key
+             WHERE p.sku = %(sku)s
+               AND m.country = %(country)s
+               AND m.channel = %(channel)s
+             ORDER BY df.week_start, df.horizon_days, df.forecast_key DESC
+         ) f) AS fan,
+        clock_timestamp() AS t_fan,
+
+        (SELECT json_agg(json_build_array(to_char(c.week_start, 'YYYY-MM-DD'), c.family, c.p50::float8)
+                         ORDER BY c.week_start, c.family)
+         FROM mart.dash_category_weekly c
+         WHERE c.country = %(country)s
+           AND c.channel = %(channel)s) AS by_category,
+        clock_timestamp() AS t_by_category,
+
+        (SELECT json_agg(row_to_json(a) ORDER BY a.created_at DESC, a.alert_id DESC)
+         FROM (
+             SELECT alert_id, created_at, level, type, message, link
+             FROM mart.alerts_log
+             ORDER BY created_at DESC, alert_id DESC
+             LIMIT %(alert_limit)s + 1
+         ) a) AS alerts,
+        clock_timestamp() AS t_alerts,
+
+        (SELECT json_agg(json_build_array(g.channel, g.period, g.coverage_pct::float8)
+                         ORDER BY g.period ASC, g.channel ASC)
+         FROM mart.dash_coverage_grid g) AS coverage,
+        clock_timestamp() AS t_coverage,
+
+        (SELECT json_build_object(
+                    'horizons', json_agg(e.horizon_days ORDER BY e.horizon_days),
+                    'errors',   json_agg(e.mape::float8 ORDER BY e.horizon_days)
+                )
+         FROM mart.error_horizon e) AS error_horizon,
+        clock_timestamp() AS t_error_horizon;
+"""
+
+DASHBOARD_SECTIONS = ["kpi", "risky", "fan", "by_category", "alerts", "coverage", "error_horizon"]
+
+
+def _server_timing(row, db_ms, assemble_ms):
+    """Header Server-Timing: tổng round trip + thời gian từng section phía Postgres."""
+    parts = [f"db;dur={db_ms:.2f}"]
+    prev = row["t_start"]
+    for section in DASHBOARD_SECTIONS:
+        stamp = row[f"t_{section}"]
+        parts.append(f"{section};dur={(stamp - prev).total_seconds() * 1000:.2f}")
+        prev = stamp
+    parts.append(f"assemble;dur={assemble_ms:.2f}")
+    return ", ".join(parts)
+
+
+def _dashboard_response(fmt, payload, table=None):
+    """
+    format=json → payload như cũ; format cột → các chuỗi thời gian thành bảng
+    (fan, by_category, error_horizon), kpi / alerts / coverage nằm trong meta.
+    """
+    if fmt == "json":
+        return jsonify(payload)
+
+    fan = dict(payload["fan"])
+    by_category = fan.pop("by_category")
+    n = len(fan["labels"])
+    # mock có thể có actual ngắn hơn labels → pad None cho đủ độ dài bảng
+    fan = {k: list(v) + [None] * (n - len(v)) for k, v in fan.items()}
+
+    tables = {"fan": fan, "by_category": by_category, "error_horizon": payload["error_horizon"]}
+    meta = {k: v for k, v in payload.items() if k not in tables}
+    return columnar_response(fmt, tables, meta, table)
 
 
 def register(bp):
@@ -14,7 +133,15 @@ def register(bp):
         Dashboard API:
         - Có thể filter theo sku / country / channel / mode từ query string.
         - Nếu thiếu / sai → rơi về default (K20PR-U, Vietnam, Dealer).
+        - 6 dataset được lấy trong 1 câu SQL; thời gian từng phần trả về ở header Server-Timing.
+        - ?format=columnar|f32|arrow (xem wire.py); arrow chọn bảng bằng ?table=.
         """
+        try:
+            fmt = parse_format(request.args)
+        except ValueError as e:
+            return jsonify({"ok": False, "message": str(e)}), 400
+        table = request.args.get("table")
+
         existing_sku_codes = [s["code"] for s in DENSO_SKUS]
 
         # ===== 0. Đọc query params từ frontend A =====
@@ -34,106 +161,52 @@ def register(bp):
             main_sku = "K20PR-U"  # default nếu không có gì
 
         try:
-            # ===== 1. KPI summary từ mart.kpi_summary (giữ y nguyên) =====
-            kpi_row = query_one("""
-                SELECT kpi_date,
-                       revenue_p50,
-                       revenue_p10,
-                       revenue_p90,
-                       mape_last_week,
-                       coverage_28d
-                FROM mart.kpi_summary
-                ORDER BY kpi_date DESC
-                LIMIT 1;
-            """)
-
+            t0 = time.perf_counter()
+            row = query_one(DASHBOARD_SQL, {
+                "sku": main_sku,
+                "country": country,
+                "channel": channel,
+                "alert_limit": DASHBOARD_ALERT_LIMIT,
+            })
+            t1 = time.perf_counter()
+
+            # ===== 1. KPI summary từ mart.kpi_summary =====
+            kpi_row = row["kpi"]
             if kpi_row:
                 kpi = {
-                    "revenue_p50": float(kpi_row["revenue_p50"]),
+                    "revenue_p50": kpi_row["revenue_p50"],
                     "range_p10_p90": [
-                        float(kpi_row["revenue_p10"]),
-                        float(kpi_row["revenue_p90"]),
+                        kpi_row["revenue_p10"],
+                        kpi_row["revenue_p90"],
                     ],
-                    "mape_last_week": float(kpi_row["mape_last_week"]),
-                    "coverage_28d": float(kpi_row["coverage_28d"]),
+                    "mape_last_week": kpi_row["mape_last_week"],
+                    "coverage_28d": kpi_row["coverage_28d"],
                     "risky_skus": [],
                 }
             else:
                 raise RuntimeError("No rows in mart.kpi_summary")
 
-            # ===== 2. Risky SKUs (giữ y nguyên) =====
-            risky_rows = query_all("""
-                SELECT p.sku,
-                       c.channel,
-                       c.period,
-                       c.coverage_pct
-                FROM mart.coverage_by_sku c
-                JOIN dim.dim_product p ON p.product_key = c.product_key
-                ORDER BY c.coverage_pct ASC
-                LIMIT 5;
-            """)
-
-            if risky_rows:
-                kpi["risky_skus"] = [row["sku"] for row in risky_rows]
+            # ===== 2. Risky SKUs =====
+            if row["risky"]:
+                kpi["risky_skus"] = row["risky"]
             else:
                 kpi["risky_skus"] = random.sample(
                     existing_sku_codes, min(5, len(existing_sku_codes))
                 )
 
             # ===== 3. Fan chart cho SKU được chọn =====
-            main_rows = query_all("""
-                SELECT df.week_start,
-                       df.p10,
-                       df.p50,
-                       df.p90,
-                       df.actual
-                FROM mart.demand_forecast_weekly df
-                JOIN dim.dim_product p ON p.product_key = df.product_key
-                JOIN dim.dim_market m ON m.market_key = df.market_key
-                WHERE p.sku = %s
-                  AND m.country = %s
-                  AND m.channel = %s
-                ORDER BY df.week_start;
-            """, (main_sku, country, channel))
-
-            if not main_rows:
+            fan = row["fan"]
+            if not fan or not fan["labels"]:
                 raise RuntimeError(
                     f"No rows in mart.demand_forecast_weekly for {main_sku} {country} {channel}"
                 )
 
-            labels = [row["week_start"].strftime("%Y-%m-%d") for row in main_rows]
-            fan = {
-                "labels": labels,
-                "p10": [float(row["p10"]) for row in main_rows],
-                "p50": [float(row["p50"]) for row in main_rows],
-                "p90": [float(row["p90"]) for row in main_rows],
-                "actual": [
-                    float(row["actual"]) if row["actual"] is not None else None
-                    for row in main_rows
-                ],
-            }
-
             # ===== 3b. Category breakdown: tổng theo family trên cùng country/channel =====
-            cat_rows = query_all("""
-                SELECT df.week_start,
-                       p.family,
-                       SUM(df.p50) AS p50
-                FROM mart.demand_forecast_weekly df
-                JOIN dim.dim_product p ON p.product_key = df.product_key
-                JOIN dim.dim_market m ON m.market_key = df.market_key
-                WHERE m.country = %s
-                  AND m.channel = %s
-                GROUP BY df.week_start, p.family
-                ORDER BY df.week_start, p.family;
-            """, (country, channel))
-
+            cat_rows = row["by_category"]
             if cat_rows:
-                week_keys = sorted({r["week_start"].strftime("%Y-%m-%d") for r in cat_rows})
-                families = sorted({r["family"] for r in cat_rows})
-                value_map = {
-                    (r["week_start"].strftime("%Y-%m-%d"), r["family"]): float(r["p50"])
-                    for r in cat_rows
-                }
+                week_keys = sorted({week for week, _, _ in cat_rows})
+                families = sorted({fam for _, fam, _ in cat_rows})
+                value_map = {(week, fam): p50 for week, fam, p50 in cat_rows}
 
                 by_category = {"labels": week_keys}
                 for fam in families:
@@ -145,26 +218,12 @@ def register(bp):
             else:
                 # nếu không có cat_rows thì giữ logic cũ cho by_category hoặc bỏ qua
                 fan["by_category"] = {
-                    "labels": labels,
-                    "Ignition": [float(r["p50"]) for r in main_rows],
+                    "labels": fan["labels"],
+                    "Ignition": fan["p50"],
                 }
 
-            # ===== 4. Alerts (giữ nguyên) =====
-            alert_rows = query_all("""
-                SELECT level, type, message, link
-                FROM mart.alerts_log
-                ORDER BY created_at DESC;
-            """)
-
-            alerts = [
-                {
-                    "level": row["level"],
-                    "type": row["type"],
-                    "msg": row["message"],
-                    "link": row["link"],
-                }
-                for row in alert_rows
-            ] if alert_rows else []
+            # ===== 4. Alerts: chỉ trang mới nhất, trang sau lấy qua /api/alerts?cursor=... =====
+            alerts, alerts_next_cursor = shape_alert_page(row["alerts"] or [], DASHBOARD_ALERT_LIMIT)
 
             if not alerts:
                 alerts = [
@@ -176,25 +235,13 @@ def register(bp):
                     }
                 ]
 
-            # ===== 5. Coverage heatmap (giữ nguyên) =====
-            coverage_rows = query_all("""
-                SELECT p.sku,
-                       c.channel,
-                       c.period,
-                       c.coverage_pct
-                FROM mart.coverage_by_sku c
-                JOIN dim.dim_product p ON p.product_key = c.product_key
-                ORDER BY c.period ASC, c.channel ASC;
-            """)
-
+            # ===== 5. Coverage heatmap =====
+            coverage_rows = row["coverage"]
             if coverage_rows:
-                weeks = sorted({row["period"] for row in coverage_rows})
-                channels = sorted({row["channel"] for row in coverage_rows})
+                weeks = sorted({period for _, period, _ in coverage_rows})
+                channels = sorted({ch for ch, _, _ in coverage_rows})
 
-                cov_map = {
-                    (row["channel"], row["period"]): float(row["coverage_pct"])
-                    for row in coverage_rows
-                }
+                cov_map = {(ch, period): pct for ch, period, pct in coverage_rows}
 
                 grid = []
                 for ch in channels:
@@ -209,32 +256,28 @@ def register(bp):
                     "grid": grid,
                 }
             else:
-                raise RuntimeError("No rows in mart.coverage_by_sku")
-
-            # ===== 6. Error by horizon (giữ nguyên) =====
-            err_rows = query_all("""
-                SELECT horizon_days, mape
-                FROM mart.error_horizon
-                ORDER BY horizon_days;
-            """)
-
-            if err_rows:
-                error_hz = {
-                    "horizons": [int(row["horizon_days"]) for row in err_rows],
-                    "errors": [float(row["mape"]) for row in err_rows],
-                }
-            else:
+                raise RuntimeError("No rows in mart.dash_coverage_grid")
+
+            # ===== 6. Error by horizon =====
+            error_hz = row["error_horizon"]
+            if not error_hz or not error_hz["horizons"]:
                 raise RuntimeError("No rows in mart.error_horizon")
 
-            return jsonify(
+            resp = _dashboard_response(
+                fmt,
                 {
                     "kpi": kpi,
                     "fan": fan,
                     "alerts": alerts,
+                    "alerts_next_cursor": alerts_next_cursor,
                     "coverage": coverage,
                     "error_horizon": error_hz,
-                }
+                },
+                table,
             )
+            t2 = time.perf_counter()
+            resp.headers["Server-Timing"] = _server_timing(row, (t1 - t0) * 1000, (t2 - t1) * 1000)
+            return resp
 
         except Exception as e:
             print(
@@ -317,12 +360,14 @@ def register(bp):
                 "errors": [round(random.uniform(5.2, 22.8), 1) for _ in range(4)],
             }
 
-            return jsonify(
+            return _dashboard_response(
+                fmt,
                 {
                     "kpi": kpi,
                     "fan": fan,
                     "alerts": alerts,
                     "coverage": coverage,
                     "error_horizon": error_hz,
-                }
+                },
+                table,
             )
@@ -1,16 +1,140 @@
+import csv
+import io
+import json
 import random
 from datetime import datetime, timedelta
 
-from flask import jsonify
+from flask import Response, current_app, jsonify, request, stream_with_context
 
-from ..db import query_all
+from ..cache import cached_response, skip_cache
+from ..db import query_all, query_columns, stream_query
+from ..wire import columnar_response, parse_format
+
+# Cùng các field với format json nhưng tính sẵn trong SQL, trả về theo cột
+EXOG_COLUMNS_SQL = """
+    SELECT to_char(week_start, 'YYYY-MM-DD')          AS ds,
+           pmi::float8                                AS pmi,
+           gdp_growth::float8                         AS gdp_growth,
+           cpi::float8                                AS cpi,
+           gas_price::float8                          AS gas_price,
+           gtrends_score::float8                      AS gtrends_score,
+           total_new_vehicle_sales::float8            AS total_new_vehicle_sales,
+           new_ice_and_hybrid_sales::float8           AS new_ice_and_hybrid_sales,
+           bev_penetration_rate::float8               AS bev_penetration_rate,
+           total_ice_and_hybrid_on_road::float8       AS total_ice_and_hybrid_on_road,
+           own_price_aftermarket::float8              AS own_price_aftermarket,
+           comp_price_aftermarket::float8             AS comp_price_aftermarket,
+           promo_depth::float8                        AS promo_depth,
+           weather_event_flag                         AS weather_event_flag,
+           holiday_flag                               AS holiday_flag,
+           COALESCE(ROUND((own_price_aftermarket / NULLIF(comp_price_aftermarket, 0))::numeric, 3),
+                    1.0)::float8                      AS price_idx,
+           CASE WHEN weather_event_flag THEN 'stormy' ELSE 'sunny' END AS weather,
+           TRUNC(gtrends_score)::int                  AS search,
+           comp_price_aftermarket::float8             AS competitor_price
+    FROM feature.ts_features_weekly
+"""
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _parse_date(args, name):
+    raw = args.get(name)
+    return datetime.strptime(raw, "%Y-%m-%d").date() if raw else None
+
+
+def _ndjson_chunk(names, rows):
+    return "".join(json.dumps(dict(zip(names, r))) + "\n" for r in rows)
+
+
+def _csv_chunk(rows, header=None):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return buf.getvalue()
 
 
 def register(bp):
+    @bp.get("/data/exogenous/export")
+    def api_exog_export():
+        """
+        Export streaming feature.ts_features_weekly (cùng các cột với format columnar):
+        /api/data/exogenous/export?format=ndjson|csv&since=YYYY-MM-DD&until=YYYY-MM-DD
+        Đọc bằng server-side cursor theo batch, ghi ra từng chunk → bộ nhớ phẳng.
+        """
+        fmt = (request.args.get("format") or "ndjson").lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"ok": False, "message": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+        try:
+            since = _parse_date(request.args, "since")
+            until = _parse_date(request.args, "until")
+        except ValueError as e:
+            return jsonify({"ok": False, "message": f"Invalid date: {e}"}), 400
+
+        clauses, params = [], []
+        if since:
+            clauses.append("week_start >= %s")
+            params.append(since)
+        if until:
+            clauses.append("week_start <= %s")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"{EXOG_COLUMNS_SQL} {where} ORDER BY week_start, feature_key;"
+
+        batches = stream_query(sql, params, current_app.config["EXPORT_BATCH_ROWS"])
+        try:
+            # lấy batch đầu trước khi trả response → lỗi DB vẫn thành HTTP 500
+            first = next(batches, None)
+        except Exception as e:
+            print(">>> [api_exog_export] DB error:", repr(e))
+            return jsonify({"ok": False, "message": "DB error when exporting features"}), 500
+
+        def generate():
+            if first is None:
+                return
+            try:
+                names, rows = first
+                if fmt == "csv":
+                    yield _csv_chunk(rows, header=names)
+                    for _, rows in batches:
+                        yield _csv_chunk(rows)
+                else:
+                    yield _ndjson_chunk(names, rows)
+                    for names, rows in batches:
+                        yield _ndjson_chunk(names, rows)
+            finally:
+                # client ngắt giữa chừng → đóng cursor, trả connection về pool ngay
+                batches.close()
+
+        resp = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+        resp.headers["Content-Disposition"] = f"attachment; filename=ts_features_weekly.{fmt}"
+        return resp
+
     @bp.get("/data/exogenous")
+    @cached_response("data_exogenous")
     def api_exog():
-        """Lấy dữ liệu từ feature.ts_features_weekly, map sang format cũ."""
+        """
+        Lấy dữ liệu từ feature.ts_features_weekly, map sang format cũ.
+        ?format=columnar|f32|arrow → bảng "rows" theo cột (xem wire.py).
+        """
         try:
+            fmt = parse_format(request.args)
+        except ValueError as e:
+            return jsonify({"ok": False, "message": str(e)}), 400
+
+        try:
+            if fmt != "json":
+                columns = query_columns(EXOG_COLUMNS_SQL + " ORDER BY week_start;")
+                if not columns["ds"]:
+                    raise RuntimeError("No rows in feature.ts_features_weekly")
+                return columnar_response(fmt, {"rows": columns})
+
             rows = query_all("""
                 SELECT week_start,
                        pmi, gdp_growth, cpi,
@@ -62,6 +186,7 @@ def register(bp):
 
         except Exception as e:
             print(">>> [api_exog] DB error, fallback random:", repr(e))
+            skip_cache()
             rows = []
             base_date = datetime.today() - timedelta(days=30)
 
@@ -89,4 +214,6 @@ def register(bp):
                     "competitor_price": round(random.uniform(0.85, 1.15), 2)
                 })
 
+            if fmt != "json":
+                return columnar_response(fmt, {"rows": {k: [r[k] for r in rows] for k in rows[0]}})
             return jsonify({"rows": rows})
@@ -3,8 +3,34 @@ from datetime import datetime, timedelta
 
 from flask import request, jsonify
 
-from ..db import query_all, query_one
+from ..cache import cached_response, skip_cache
+from ..db import query_all
 from ..core.constants import DENSO_SKUS
+from ..services.forecast_service import (
+    fetch_forecast_bundles,
+    fetch_forecast_columns,
+    fetch_products,
+    parse_fan_filters,
+    sku_object,
+)
+from ..wire import columnar_response, parse_format
+
+MAX_BATCH_SKUS = 200
+SERIES_TABLES = ("fan", "components")
+
+
+def _respond(fmt, data, table=None):
+    """Payload forecast/sku dạng dict (nhánh mock) → json hoặc format cột của wire.py."""
+    if fmt == "json":
+        return jsonify(data)
+
+    tables = {}
+    for name in SERIES_TABLES:
+        n = len(data[name]["labels"])
+        # mock có thể có actual ngắn hơn labels → pad None cho đủ độ dài bảng
+        tables[name] = {k: list(v) + [None] * (n - len(v)) for k, v in data[name].items()}
+    meta = {k: v for k, v in data.items() if k not in SERIES_TABLES}
+    return columnar_response(fmt, tables, meta, table)
 
 
 def register(bp):
@@ -12,56 +38,50 @@ def register(bp):
     def api_forecast_sku():
         """
         Chi tiết forecast cho từng SKU.
+        Fan chart filter được: country, channel, model, horizon, start, end, weeks.
+        ?format=columnar|f32|arrow → fan/components dạng cột lấy thẳng từ DB
+        (arrow: chọn bảng bằng ?table=fan|components), phần còn lại nằm trong meta.
         """
         sku_code = request.args.get("sku", DENSO_SKUS[0]["code"])
+        table = request.args.get("table")
+
+        try:
+            filters = parse_fan_filters(request.args)
+        except ValueError as e:
+            return jsonify({"ok": False, "message": f"Invalid filter: {e}"}), 400
+
+        try:
+            fmt = parse_format(request.args)
+        except ValueError as e:
+            return jsonify({"ok": False, "message": str(e)}), 400
 
         try:
             # ---- 0. Product info từ dim_product ----
-            prod_row = query_one("""
-                SELECT product_key, sku, name, family, category, type, channel
-                FROM dim.dim_product
-                WHERE sku = %s;
-            """, (sku_code,))
-
-            if not prod_row:
-                # fallback: dùng struct từ DENSO_SKUS list
-                sku_obj = next((s for s in DENSO_SKUS if s["code"] == sku_code), DENSO_SKUS[0])
+            products = fetch_products(skus=[sku_code])
+
+            if not products:
                 raise RuntimeError("SKU not found in dim_product, using fallback")
 
-            sku_obj = {
-                "code": prod_row["sku"],
-                "name": prod_row["name"],
-                "family": prod_row["family"],
-                "category": prod_row["category"],
-                "type": prod_row["type"],
-                "channel": prod_row["channel"],
-            }
+            if fmt != "json":
+                tables = fetch_forecast_columns(products[0], filters)
+                if tables["fan"]["labels"] and tables["components"]["labels"]:
+                    bundles, regressors = fetch_forecast_bundles(products, filters, include_series=False)
+                    bundle = bundles[products[0]["product_key"]]
+                    meta = {
+                        "sku": sku_object(products[0]),
+                        "regressors": regressors or [],
+                        "shap_global": bundle["shap_global"] or [],
+                        "shap_local": bundle["shap_local"],
+                    }
+                    return columnar_response(fmt, tables, meta, table)
+                # thiếu fan/components → đi tiếp nhánh dưới để dùng fallback như format json
 
-            # ---- 1. Fan chart: mart.demand_forecast_weekly ----
-            fan_rows = query_all("""
-                SELECT df.week_start,
-                       df.p10,
-                       df.p50,
-                       df.p90,
-                       df.actual,
-                       m.country,
-                       m.channel
-                FROM mart.demand_forecast_weekly df
-                JOIN dim.dim_market m ON m.market_key = df.market_key
-                WHERE df.product_key = %s
-                ORDER BY df.week_start;
-            """, (prod_row["product_key"],))
-
-            if fan_rows:
-                labels = [row["week_start"].strftime("%Y-%m-%d") for row in fan_rows]
-                fan = {
-                    "labels": labels,
-                    "p10": [float(row["p10"]) for row in fan_rows],
-                    "p50": [float(row["p50"]) for row in fan_rows],
-                    "p90": [float(row["p90"]) for row in fan_rows],
-                    "actual": [float(row["actual"]) if row["actual"] is not None else None for row in fan_rows]
-                }
-            else:
+            # ---- 1..5. Fan chart, Prophet components, regressors, SHAP global/local ----
+            bundles, regressors = fetch_forecast_bundles(products, filters)
+            bundle = bundles[products[0]["product_key"]]
+
+            fan = bundle["fan"]
+            if not fan:
                 # nếu chưa có forecast trong DB cho SKU này → mock
                 days = [(datetime.today() - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(56)][::-1]
                 fan = {
@@ -72,24 +92,8 @@ def register(bp):
                     "actual": [random.randint(75, 160) for _ in range(28)]
                 }
 
-            # ---- 2. Prophet components ----
-            comp_rows = query_all("""
-                SELECT week_start, trend, weekly, yearly, holidays
-                FROM mart.prophet_components
-                WHERE product_key = %s
-                ORDER BY week_start;
-            """, (prod_row["product_key"],))
-
-            if comp_rows:
-                comp_labels = [r["week_start"].strftime("%Y-%m-%d") for r in comp_rows]
-                components = {
-                    "labels": comp_labels,
-                    "trend": [float(r["trend"]) for r in comp_rows],
-                    "weekly": [float(r["weekly"]) for r in comp_rows],
-                    "yearly": [float(r["yearly"]) for r in comp_rows],
-                    "holidays": [float(r["holidays"]) for r in comp_rows],
-                }
-            else:
+            components = bundle["components"]
+            if not components:
                 # fallback: synthetic components từ fan labels
                 labels = fan["labels"]
                 components = {
@@ -100,73 +104,27 @@ def register(bp):
                     "holidays": [0 for _ in labels],
                 }
 
-            # ---- 3. Regressor status ----
-            reg_rows = query_all("""
-                SELECT feature, status, last_update
-                FROM mart.regressor_status
-                ORDER BY feature;
-            """)
-
-            regressors = [
-                {
-                    "name": r["feature"],
-                    "status": r["status"]
-                } for r in reg_rows
-            ] if reg_rows else [
+            regressors = regressors or [
                 {"name": "pmi", "status": "ok"},
                 {"name": "gdp_growth", "status": "ok"},
                 {"name": "cpi", "status": "warning"},
             ]
 
-            # ---- 4. SHAP global ----
-            shap_g_rows = query_all("""
-                SELECT feature, importance
-                FROM mart.shap_global
-                WHERE product_key = %s
-                ORDER BY importance DESC;
-            """, (prod_row["product_key"],))
-
-            shap_global = [
-                {"feature": r["feature"], "importance": float(r["importance"])}
-                for r in shap_g_rows
-            ] if shap_g_rows else [
+            shap_global = bundle["shap_global"] or [
                 {"feature": "price_idx", "importance": 0.32},
                 {"feature": "promo_depth", "importance": 0.27},
             ]
 
-            # ---- 5. SHAP local ----
-            shap_l_rows = query_all("""
-                SELECT explanation_date, feature, impact
-                FROM mart.shap_local
-                WHERE product_key = %s
-                ORDER BY explanation_date DESC;
-            """, (prod_row["product_key"],))
-
-            if shap_l_rows:
-                latest_date = shap_l_rows[0]["explanation_date"].strftime("%Y-%m-%d")
-                items = [
-                    {
-                        "feature": r["feature"],
-                        "value": None,
-                        "impact": float(r["impact"])
-                    }
-                    for r in shap_l_rows if r["explanation_date"] == shap_l_rows[0]["explanation_date"]
+            shap_local = bundle["shap_local"] or {
+                "date": (datetime.today() - timedelta(days=3)).strftime("%Y-%m-%d"),
+                "items": [
+                    {"feature": "promo_depth", "value": 0.35, "impact": 0.18},
+                    {"feature": "holiday_flag", "value": 1, "impact": 0.12},
                 ]
-                shap_local = {
-                    "date": latest_date,
-                    "items": items
-                }
-            else:
-                shap_local = {
-                    "date": (datetime.today() - timedelta(days=3)).strftime("%Y-%m-%d"),
-                    "items": [
-                        {"feature": "promo_depth", "value": 0.35, "impact": 0.18},
-                        {"feature": "holiday_flag", "value": 1, "impact": 0.12},
-                    ]
-                }
+            }
 
             data = {
-                "sku": sku_obj,
+                "sku": bundle["sku"],
                 "fan": fan,
                 "components": components,
                 "regressors": regressors,
@@ -174,7 +132,7 @@ def register(bp):
                 "shap_local": shap_local
             }
 
-            return jsonify(data)
+            return _respond(fmt, data, table)
 
         except Exception as e:
             print(">>> [api_forecast_sku] error, falling back to mock:", repr(e))
@@ -222,17 +180,59 @@ def register(bp):
                     ]
                 }
             }
-            return jsonify(data)
+            return _respond(fmt, data, table)
+
+    @bp.get("/forecast/batch")
+    def api_forecast_batch():
+        """
+        Forecast bundle cho nhiều SKU trong 1 request:
+        /api/forecast/batch?skus=K20PR-U,IK20  hoặc  /api/forecast/batch?family=Spark Plug
+        (nhận cùng filter fan chart như /forecast/sku). Số query cố định, không tăng theo số SKU.
+        """
+        skus = [s.strip() for s in request.args.get("skus", "").split(",") if s.strip()]
+        family = request.args.get("family")
+
+        if not skus and not family:
+            return jsonify({"ok": False, "message": "skus or family is required"}), 400
+        if len(skus) > MAX_BATCH_SKUS:
+            return jsonify({"ok": False, "message": f"At most {MAX_BATCH_SKUS} skus per request"}), 400
+
+        try:
+            filters = parse_fan_filters(request.args)
+        except ValueError as e:
+            return jsonify({"ok": False, "message": f"Invalid filter: {e}"}), 400
+
+        try:
+            products = fetch_products(skus=skus, family=family)
+            bundles, regressors = fetch_forecast_bundles(products, filters)
+
+            found = {p["sku"] for p in products}
+            return jsonify({
+                "items": [bundles[p["product_key"]] for p in products],
+                "regressors": regressors or [],
+                "missing": [s for s in skus if s not in found],
+            })
+
+        except Exception as e:
+            print(">>> [api_forecast_batch] DB error:", repr(e))
+            return jsonify({"ok": False, "message": "DB error when loading forecasts"}), 500
 
     @bp.get("/forecast/backtest")
+    @cached_response("forecast_backtest")
     def api_backtest():
         """
-        Leaderboard backtest.
+        Leaderboard backtest: lần chạy mới nhất của mỗi (model, horizon)
+        (pipelines/backtest.py ghi thêm dòng mỗi lần chạy, cùng run_id).
         """
         try:
             rows = query_all("""
                 SELECT model_name, horizon_days, smape, mae, pinball_p90, coverage, latency
-                FROM mart.model_backtest
+                FROM (
+                    SELECT DISTINCT ON (model_name, horizon_days)
+                           model_name, horizon_days, smape, mae, pinball_p90, coverage, latency
+                    FROM mart.model_backtest
+                    ORDER BY model_name, horizon_days, trained_at DESC NULLS LAST, backtest_id DESC
+                ) latest
                 ORDER BY horizon_days, smape;
             """)
 
@@ -254,6 +254,7 @@ def register(bp):
 
         except Exception as e:
             print(">>> [api_backtest] DB error, fallback to random:", repr(e))
+            skip_cache()
             models = ["Prophet_1.3", "LGBM_1.0", "XGBoost"]
             leaderboard = []
 
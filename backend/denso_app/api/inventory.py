@@ -1,33 +1,309 @@
+import time
+from datetime import date
+
+import numpy as np
 from flask import request, jsonify
 
+from ..services.forecast_service import fetch_products
+from ..services.inventory_service import (
+    DEFAULT_LEAD_TIME_DAYS,
+    DEFAULT_MOQ,
+    DEFAULT_REVIEW_DAYS,
+    DEFAULT_SERVICE_LEVEL,
+    compute_policies,
+    draw_demand,
+    fetch_demand_matrix,
+    persist_policies,
+    protection_weeks_needed,
+    simulate_inventory,
+)
+
+DEFAULT_SIM_PATHS = 2000
+MAX_SIM_PATHS = 20000
+DEFAULT_SIM_WEEKS = 13
+MAX_SIM_WEEKS = 52
+# trần số ô của ma trận sample path (series × paths × weeks) để request chạy inline được
+MAX_SIM_CELLS = 10_000_000
+
+# Tham số chính sách theo từng series, lấy từ body (global) hoặc positions[] (override)
+POLICY_INPUTS = {
+    "service_level": ("service_level", DEFAULT_SERVICE_LEVEL),
+    "lead_time_days": ("lead_time", DEFAULT_LEAD_TIME_DAYS),
+    "review_days": ("review_days", DEFAULT_REVIEW_DAYS),
+    "on_hand": ("on_hand", 0),
+    "on_order": ("on_order", 0),
+    "moq": ("moq", DEFAULT_MOQ),
+}
+
+
+def _policy_inputs(body, series):
+    """Mảng (N,) cho từng tham số; positions[] = [{sku, country, channel, on_hand, ...}] ghi đè theo series."""
+    overrides = {
+        (p.get("sku"), p.get("country"), p.get("channel")): p
+        for p in body.get("positions") or []
+    }
+    inputs = {}
+    for name, (field, default) in POLICY_INPUTS.items():
+        global_value = float(body.get(field, default))
+        inputs[name] = np.array([
+            float(overrides.get((s["sku"], s["country"], s["channel"]), {}).get(field, global_value))
+            for s in series
+        ])
+    return inputs
+
+
+def _policy_item(s, inputs, result, i):
+    return {
+        "sku": s["sku"],
+        "country": s["country"],
+        "channel": s["channel"],
+        "service_level": float(inputs["service_level"][i]),
+        "lead_time": int(inputs["lead_time_days"][i]),
+        "review_days": int(inputs["review_days"][i]),
+        "demand_lt_mean": round(float(result["demand_lt_mean"][i]), 2),
+        "demand_lt_std": round(float(result["demand_lt_std"][i]), 2),
+        "z_score": round(float(result["z_score"][i]), 4),
+        "safety_stock": int(result["safety_stock"][i]),
+        "base_stock": int(result["base_stock"][i]),
+        "on_hand": float(inputs["on_hand"][i]),
+        "on_order": float(inputs["on_order"][i]),
+        "moq": int(inputs["moq"][i]),
+        "po_recommend": int(result["po_recommend"][i]),
+    }
+
+
+def _load_portfolio(body, tag, min_weeks=1):
+    """
+    Đọc phạm vi (skus / family / country / channel / model / as_of) từ body và
+    ma trận P10/P50/P90 đủ dài cho khoảng bảo vệ dài nhất (kể cả positions[]).
+    Trả về ((series, p10, p50, p90), None) hoặc (None, response lỗi).
+    """
+    skus = body.get("skus") or []
+    family = body.get("family")
+
+    try:
+        as_of = date.fromisoformat(body["as_of"]) if body.get("as_of") else None
+        product_keys = None
+        if skus or family:
+            product_keys = [p["product_key"] for p in fetch_products(skus=skus, family=family)]
+            if not product_keys:
+                return None, (jsonify({"ok": False, "message": "No matching SKU in dim_product"}), 404)
+
+        positions = body.get("positions") or []
+        lead_times = [body.get("lead_time", DEFAULT_LEAD_TIME_DAYS)] + [
+            p["lead_time"] for p in positions if "lead_time" in p
+        ]
+        review = [body.get("review_days", DEFAULT_REVIEW_DAYS)] + [
+            p["review_days"] for p in positions if "review_days" in p
+        ]
+        weeks = max(
+            protection_weeks_needed([float(v) for v in lead_times], [float(v) for v in review]),
+            min_weeks,
+        )
+    except (TypeError, ValueError) as e:
+        return None, (jsonify({"ok": False, "message": f"Invalid input: {e}"}), 400)
+    except Exception as e:
+        print(f">>> [{tag}] DB error:", repr(e))
+        return None, (jsonify({"ok": False, "message": "DB error when loading products"}), 500)
+
+    try:
+        matrices = fetch_demand_matrix(
+            weeks, product_keys,
+            country=body.get("country"), channel=body.get("channel"),
+            model=body.get("model"), as_of=as_of,
+        )
+    except Exception as e:
+        print(f">>> [{tag}] DB error:", repr(e))
+        return None, (jsonify({"ok": False, "message": "DB error when loading forecasts"}), 500)
+
+    return matrices, None
+
 
 def register(bp):
     @bp.post("/inventory/recommend")
     def api_inventory_rec():
         """
-        Inventory: tính on-the-fly, chưa cần bảng log trong DB.
+        Inventory cho 1 SKU × market (mặc định K20PR-U / Vietnam / Dealer):
+        nhu cầu P10/P50/P90 trong lead time + review lấy từ mart.demand_forecast_weekly,
+        z chính xác theo service level, làm tròn PO theo MOQ. Không có forecast → công thức cũ.
         """
         body = request.json or {}
-        service_level = float(body.get("service_level", 0.95))
-        lead_time = int(body.get("lead_time", 7))
+        service_level = float(body.get("service_level", DEFAULT_SERVICE_LEVEL))
+        lead_time = int(body.get("lead_time", DEFAULT_LEAD_TIME_DAYS))
+        review_days = int(body.get("review_days", DEFAULT_REVIEW_DAYS))
         on_hand = int(body.get("on_hand", 100))
         on_order = int(body.get("on_order", 40))
-        moq = int(body.get("moq", 24))
+        moq = int(body.get("moq", DEFAULT_MOQ))
+        sku_code = body.get("sku", "K20PR-U")
+        country = body.get("country", "Vietnam")
+        channel = body.get("channel", "Dealer")
+
+        if not 0 < service_level < 1:
+            return jsonify({"ok": False, "message": "service_level must be strictly between 0 and 1"}), 400
+
+        try:
+            weeks = protection_weeks_needed(lead_time, review_days)
+            products = fetch_products(skus=[sku_code])
+            if not products:
+                raise RuntimeError("SKU not found in dim_product")
+
+            series, p10, p50, p90 = fetch_demand_matrix(
+                weeks, [products[0]["product_key"]], country=country, channel=channel
+            )
+            if not series:
+                raise RuntimeError(f"No forecast for {sku_code} {country} {channel}")
+
+            result = compute_policies(p10, p50, p90, service_level, lead_time, review_days, on_hand, on_order, moq)
+            return jsonify({
+                "base_stock": int(result["base_stock"][0]),
+                "safety_stock": int(result["safety_stock"][0]),
+                "po_recommend": int(result["po_recommend"][0]),
+                "reason": (
+                    f"Demand over {lead_time}d lead time + {review_days}d review: "
+                    f"mean={result['demand_lt_mean'][0]:.1f}, std={result['demand_lt_std'][0]:.1f}, "
+                    f"z={result['z_score'][0]:.3f} (service level={service_level})"
+                ),
+            })
+
+        except Exception as e:
+            print(">>> [api_inventory_rec] DB error or missing forecast, fallback simple formula:", repr(e))
 
-        demand_p50 = 130
-        demand_p90 = 165
+            demand_p50 = 130
+            demand_p90 = 165
 
-        z_score = 1.96 if service_level >= 0.95 else (1.65 if service_level >= 0.90 else 1.28)
-        safety_stock = round((demand_p90 - demand_p50) * z_score * 0.12)
-        base_stock = demand_p50 + safety_stock
+            z_score = 1.96 if service_level >= 0.95 else (1.65 if service_level >= 0.90 else 1.28)
+            safety_stock = round((demand_p90 - demand_p50) * z_score * 0.12)
+            base_stock = demand_p50 + safety_stock
 
-        po_recommend = max(0, base_stock - on_hand - on_order)
-        if po_recommend > 0 and (po_recommend % moq) != 0:
-            po_recommend = ((po_recommend // moq) + 1) * moq
+            po_recommend = max(0, base_stock - on_hand - on_order)
+            if po_recommend > 0 and (po_recommend % moq) != 0:
+                po_recommend = ((po_recommend // moq) + 1) * moq
+
+            return jsonify({
+                "base_stock": base_stock,
+                "safety_stock": safety_stock,
+                "po_recommend": po_recommend,
+                "reason": f"Based on P50={demand_p50}, P90={demand_p90}, service level={service_level}, lead_time={lead_time}"
+            })
+
+    @bp.post("/inventory/policy")
+    def api_inventory_policy():
+        """
+        Optimizer chính sách tồn kho cho cả danh mục (mọi SKU × market có forecast), 1 lần tính vectorized:
+        {
+          "skus": [...] | "family": "Spark Plug"   (bỏ trống = tất cả),
+          "country": ..., "channel": ..., "model": ..., "as_of": "YYYY-MM-DD",
+          "service_level": 0.95, "lead_time": 14, "review_days": 7,
+          "on_hand": 0, "on_order": 0, "moq": 24,
+          "positions": [{"sku", "country", "channel", "on_hand", "on_order", "moq", "lead_time", ...}],
+          "persist": true                          (ghi vào mart.inventory_policy_log)
+        }
+        """
+        body = request.json or {}
+        loaded, error = _load_portfolio(body, "api_inventory_policy")
+        if error:
+            return error
+        series, p10, p50, p90 = loaded
+
+        if not series:
+            return jsonify({"run_id": None, "count": 0, "policies": [], "persisted": False})
+
+        try:
+            inputs = _policy_inputs(body, series)
+            result = compute_policies(p10, p50, p90, **inputs)
+        except (TypeError, ValueError) as e:
+            return jsonify({"ok": False, "message": f"Invalid input: {e}"}), 400
+
+        run_id = None
+        if body.get("persist", True):
+            try:
+                run_id = persist_policies(series, inputs, result)
+            except Exception as e:
+                print(">>> [api_inventory_policy] DB error when persisting:", repr(e))
+                return jsonify({"ok": False, "message": "DB error when saving inventory policies"}), 500
 
         return jsonify({
-            "base_stock": base_stock,
-            "safety_stock": safety_stock,
-            "po_recommend": po_recommend,
-            "reason": f"Based on P50={demand_p50}, P90={demand_p90}, service level={service_level}, lead_time={lead_time}"
+            "run_id": run_id,
+            "count": len(series),
+            "persisted": run_id is not None,
+            "policies": [_policy_item(s, inputs, result, i) for i, s in enumerate(series)],
+        })
+
+    @bp.post("/inventory/simulate")
+    def api_inventory_simulate():
+        """
+        Mô phỏng Monte Carlo chính sách order-up-to (base stock từ /inventory/policy) cho cả danh mục.
+        Body như /inventory/policy, thêm:
+          "n_paths": 2000, "horizon_weeks": 13, "holding_cost": 1.0 (/đơn vị/tuần),
+          "base_stock": số cố định thay cho S tính từ forecast (tùy chọn), "seed": int (tùy chọn)
+        Trả về fill rate, xác suất stockout, chi phí lưu kho kỳ vọng từng series + thời gian chạy.
+        """
+        body = request.json or {}
+        try:
+            n_paths = int(body.get("n_paths", DEFAULT_SIM_PATHS))
+            horizon = int(body.get("horizon_weeks", DEFAULT_SIM_WEEKS))
+            holding_cost = float(body.get("holding_cost", 1.0))
+            seed = body.get("seed")
+            rng = np.random.default_rng(None if seed is None else int(seed))
+        except (TypeError, ValueError) as e:
+            return jsonify({"ok": False, "message": f"Invalid input: {e}"}), 400
+        if not 1 <= n_paths <= MAX_SIM_PATHS or not 1 <= horizon <= MAX_SIM_WEEKS:
+            return jsonify({
+                "ok": False,
+                "message": f"n_paths must be 1..{MAX_SIM_PATHS}, horizon_weeks 1..{MAX_SIM_WEEKS}",
+            }), 400
+
+        t0 = time.perf_counter()
+        loaded, error = _load_portfolio(body, "api_inventory_simulate", min_weeks=horizon)
+        if error:
+            return error
+        series, p10, p50, p90 = loaded
+        t1 = time.perf_counter()
+
+        if not series:
+            return jsonify({"count": 0, "results": []})
+        if len(series) * n_paths * horizon > MAX_SIM_CELLS:
+            return jsonify({
+                "ok": False,
+                "message": f"Simulation too large ({len(series)} series × {n_paths} paths × {horizon} weeks)",
+            }), 400
+
+        try:
+            inputs = _policy_inputs(body, series)
+            policy = compute_policies(p10, p50, p90, **inputs)
+            base_stock = float(body["base_stock"]) if "base_stock" in body else policy["base_stock"]
+        except (TypeError, ValueError) as e:
+            return jsonify({"ok": False, "message": f"Invalid input: {e}"}), 400
+        t2 = time.perf_counter()
+
+        demand = draw_demand(p10[:, :horizon], p50[:, :horizon], p90[:, :horizon], n_paths, rng)
+        sim = simulate_inventory(
+            demand, base_stock,
+            inputs["on_hand"], inputs["on_order"], inputs["lead_time_days"], inputs["review_days"],
+            inputs["moq"], holding_cost,
+        )
+        t3 = time.perf_counter()
+
+        base = np.broadcast_to(np.asarray(base_stock, dtype=float), (len(series),))
+        results = []
+        for i, s in enumerate(series):
+            item = _policy_item(s, inputs, policy, i)
+            item["base_stock"] = int(base[i])
+            item.update({name: round(float(values[i]), 4) for name, values in sim.items()})
+            results.append(item)
+
+        sim_ms = (t3 - t2) * 1000
+        resp = jsonify({
+            "count": len(series),
+            "n_paths": n_paths,
+            "horizon_weeks": horizon,
+            "results": results,
+            "timing": {
+                "simulate_ms": round(sim_ms, 2),
+                "ms_per_series": round(sim_ms / len(series), 3),
+            },
         })
+        resp.headers["Server-Timing"] = (
+            f"db;dur={(t1 - t0) * 1000:.2f}, policy;dur={(t2 - t1) * 1000:.2f}, simulate;dur={sim_ms:.2f}"
+        )
+        return resp
@@ -3,12 +3,15 @@ from datetime import datetime
 
 from flask import request, jsonify
 
+from ..cache import cached_response, skip_cache
 from ..db import query_all
 from ..core.constants import DENSO_SKUS, REGIONS
+from ..services.market_service import fetch_market_snapshot
 
 
 def register(bp):
     @bp.get("/market/intelligence")
+    @cached_response("market_intelligence")
     def api_market_intelligence():
         """
         Market Intelligence.
@@ -33,17 +36,11 @@ def register(bp):
         }
 
         try:
-            price_rows = query_all("""
-                SELECT region, sku, avg_price, competitor_price, price_trend, market_share
-                FROM mart.market_price_region
-                WHERE as_of_date = (
-                    SELECT MAX(as_of_date) FROM mart.market_price_region AS sub
-                    WHERE sub.region = mart.market_price_region.region
-                );
-            """)
+            # snapshot mới nhất của cả 4 bảng, query song song
+            snapshot = fetch_market_snapshot()
 
             price_data = {}
-            for r in price_rows:
+            for r in snapshot["price"]:
                 region = r["region"]
                 price_data[region] = {
                     "avg_price": float(r["avg_price"]),
@@ -55,17 +52,8 @@ def register(bp):
             if not price_data:
                 raise RuntimeError("No rows in mart.market_price_region")
 
-            weather_rows = query_all("""
-                SELECT region, condition, temperature, humidity, impact_score
-                FROM mart.market_weather_region
-                WHERE as_of_date = (
-                    SELECT MAX(as_of_date) FROM mart.market_weather_region AS sub
-                    WHERE sub.region = mart.market_weather_region.region
-                );
-            """)
-
             weather_data = {}
-            for r in weather_rows:
+            for r in snapshot["weather"]:
                 weather_data[r["region"]] = {
                     "condition": r["condition"],
                     "temperature": float(r["temperature"]),
@@ -73,14 +61,8 @@ def register(bp):
                     "impact_score": float(r["impact_score"])
                 }
 
-            port_rows = query_all("""
-                SELECT name, region, congestion_pct
-                FROM mart.port_congestion
-                WHERE as_of_date = (SELECT MAX(as_of_date) FROM mart.port_congestion);
-            """)
-
             port_data = []
-            for r in port_rows:
+            for r in snapshot["port"]:
                 lat, lng = port_geo.get(r["name"], region_geo.get(r["region"], (0.0, 0.0)))
                 port_data.append({
                     "name": r["name"],
@@ -91,14 +73,8 @@ def register(bp):
                     "delay_days": random.randint(0, 7)
                 })
 
-            wh_rows = query_all("""
-                SELECT region, capacity, current_stock
-                FROM mart.warehouse_status
-                WHERE as_of_date = (SELECT MAX(as_of_date) FROM mart.warehouse_status);
-            """)
-
             warehouse_data = []
-            for r in wh_rows:
+            for r in snapshot["warehouse"]:
                 lat, lng = region_geo.get(r["region"], (0.0, 0.0))
                 warehouse_data.append({
                     "name": f"Denso Warehouse {r['region']}",
@@ -134,6 +110,7 @@ def register(bp):
 
         except Exception as e:
             print(">>> [api_market_intelligence] DB error, fallback random:", repr(e))
+            skip_cache()
 
             price_data = {}
             for region in REGIONS:
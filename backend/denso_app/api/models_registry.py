@@ -2,11 +2,14 @@ from datetime import datetime
 
 from flask import request, jsonify
 
+from ..cache import cached_response, response_cache, skip_cache
 from ..db import query_all, execute_sql
+from ..dimensions import dimension_cache
 
 
 def register(bp):
     @bp.get("/models/registry")
+    @cached_response("models_registry")
     def api_registry():
         """
         Model registry:
@@ -55,6 +58,7 @@ def register(bp):
 
         except Exception as e:
             print(">>> [api_registry] DB error, fallback random:", repr(e))
+            skip_cache()
 
             models = [
                 {"name": "Prophet", "version": "1.3", "trained_at": "2025-10-15", "dataset": "ds2025w42",
@@ -92,19 +96,16 @@ def register(bp):
             return jsonify({"ok": False, "message": "sku and model are required"}), 400
 
         try:
-            prod_row = query_all("""
-                SELECT product_key
-                FROM dim.dim_product
-                WHERE sku = %s;
-            """, (sku_code,))
+            product_key = dimension_cache.get().product_key(sku_code)
 
-            if not prod_row:
+            if product_key is None:
                 return jsonify({"ok": False, "message": f"SKU {sku_code} not found"}), 404
 
             execute_sql("""
                 INSERT INTO mart.model_champion_per_sku (product_key, model_name, version, effective_from)
                 VALUES (%s, %s, %s, %s);
-            """, (prod_row[0]["product_key"], model_name, version, datetime.today().date()))
+            """, (product_key, model_name, version, datetime.today().date()))
+            response_cache.invalidate("models_registry")
 
             return jsonify({"ok": True, "message": f"Champion set: {sku_code} -> {model_name}@{version}"})
 
@@ -1,20 +1,23 @@
 import random
 
-from flask import jsonify
+from flask import request, jsonify
 
+from ..cache import cached_response, response_cache, skip_cache
 from ..db import query_all
+from ..dimensions import dimension_cache
 from ..core.constants import DENSO_SKUS, CHANNELS
 
 
 def register(bp):
     @bp.get("/monitoring")
+    @cached_response("monitoring")
     def api_monitoring():
         """
         Monitoring endpoints.
         """
         try:
             drift_rows = query_all("""
-                SELECT feature_name, ks_stat, psi, status, feature_type, source
+                SELECT feature_name, ks_stat, psi, status, feature_type, source, calc_at
                 FROM mart.data_drift_features
                 ORDER BY feature_name;
             """)
@@ -24,8 +27,10 @@ def register(bp):
                     "feature": r["feature_name"],
                     "type": r["feature_type"],
                     "source": r["source"],
-                    "ks": float(r["ks_stat"]),
-                    "psi": float(r["psi"])
+                    "ks": float(r["ks_stat"]) if r["ks_stat"] is not None else None,
+                    "psi": float(r["psi"]) if r["psi"] is not None else None,
+                    "status": r["status"],
+                    "calc_at": r["calc_at"].isoformat() if r["calc_at"] else None
                 }
                 for r in drift_rows
             ]
@@ -83,6 +88,7 @@ def register(bp):
 
         except Exception as e:
             print(">>> [api_monitoring] DB error, fallback random:", repr(e))
+            skip_cache()
 
             real_features = [
                 {"feature": "pmi", "type": "Economic", "source": "GSO / S&P Global"},
@@ -126,3 +132,24 @@ def register(bp):
                 "coverage": coverage,
                 "error_hz": error_hz
             })
+
+    @bp.get("/monitoring/cache")
+    def api_cache_stats():
+        """Hit/miss/eviction counters của response cache (+ trạng thái dimension cache)."""
+        stats = response_cache.stats()
+        stats["dimensions"] = dimension_cache.stats()
+        return jsonify(stats)
+
+    @bp.post("/monitoring/cache/invalidate")
+    def api_cache_invalidate():
+        """
+        Xóa cache sau khi pipeline ghi lại mart:
+        body: { "namespace": "monitoring" }  (bỏ trống = xóa toàn bộ)
+        namespace "dimensions" (hoặc bỏ trống) → nạp lại dimension cache ở request kế tiếp.
+        """
+        body = request.json or {}
+        namespace = body.get("namespace")
+        if namespace in (None, "dimensions"):
+            dimension_cache.invalidate()
+        removed = response_cache.invalidate(namespace) if namespace != "dimensions" else 0
+        return jsonify({"ok": True, "removed": removed})
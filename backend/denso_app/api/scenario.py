@@ -3,66 +3,160 @@ from datetime import datetime
 
 from flask import request, jsonify
 
-from ..db import query_one
+import numpy as np
+
 from ..core.constants import DENSO_SKUS
+from ..dimensions import dimension_cache
+from ..services.forecast_service import fetch_products
+from ..services.scenario_service import (
+    DEFAULT_BASELINE,
+    DEFAULT_BETAS,
+    LEVERS,
+    MARGIN_RATE,
+    MAX_GRID_POINTS,
+    MAX_SURFACE_POINTS,
+    evaluate_grid,
+    fetch_baselines,
+    fetch_betas,
+    lever_values,
+    summarize_grid,
+)
+
+MAX_GRID_SKUS = 500
 
 
 def register(bp):
     @bp.post("/scenario/whatif")
     def api_whatif():
         """
-        What-if: dùng hệ số beta trong mart.scenario_elasticity (nếu có),
-        default SKU: K20PR-U.
+        What-if 1 điểm lever: cùng công thức demand / margin với /scenario/grid (evaluate_grid),
+        hệ số beta trong mart.scenario_elasticity (nếu có), default SKU: K20PR-U. Body:
+        {
+          "sku": "K20PR-U", "price_delta": 0, "promo_depth": 0, "ad_spend": 0,
+          "country": ..., "channel": ..., "model": ...,   # phạm vi baseline P50 (tùy chọn)
+          "unit_cost_ratio": 0.68, "ad_cost": 0
+        }
+        Baseline = P50 forecast mới nhất cộng theo mọi market khớp filter (không filter = mọi market
+        của SKU); response trả kèm baseline và baseline_scope.
+
+        Thay đổi so với bản cũ (baseline cố định 135, margin = forecast × 0.32):
+          - baseline lấy từ forecast như trên; SKU chưa có forecast / lỗi DB vẫn dùng 135
+            (baseline_scope.source = "default");
+          - margin dùng chung công thức với /scenario/grid (evaluate_grid):
+                margin = fc · ((1 + Δp/100)(1 − promo) − unit_cost_ratio) − ad · ad_cost
+            tại price_delta = promo_depth = 0 và tham số mặc định vẫn đúng bằng forecast × 0.32.
         """
         body = request.json or {}
         sku_code = body.get("sku", "K20PR-U")
+        scope = {k: body.get(k) or None for k in ("country", "channel", "model")}
 
-        baseline = 135.0  # có thể sau này lấy từ forecast P50
-
-        price_delta = body.get("price_delta", 0.0)
-        promo_depth = body.get("promo_depth", 0.0)
-        ad_spend = body.get("ad_spend", 0.0)
+        try:
+            levers = [np.array([float(body.get(name, 0.0))]) for name in LEVERS]
+            unit_cost_ratio = float(body.get("unit_cost_ratio", 1 - MARGIN_RATE))
+            ad_cost = float(body.get("ad_cost", 0.0))
+        except (TypeError, ValueError) as e:
+            return jsonify({"ok": False, "message": f"Invalid lever value: {e}"}), 400
 
+        baseline, betas, source = DEFAULT_BASELINE, DEFAULT_BETAS, "default"
         try:
-            prod_row = query_one("""
-                SELECT product_key
-                FROM dim.dim_product
-                WHERE sku = %s;
-            """, (sku_code,))
+            # SKU → product_key và beta lấy từ dimension cache, không query dim/elasticity
+            product_key = dimension_cache.get().product_key(sku_code)
 
-            if not prod_row:
+            if product_key is None:
                 raise RuntimeError("SKU not found in dim_product")
 
-            el_row = query_one("""
-                SELECT beta_price, beta_promo, beta_ad_spend
-                FROM mart.scenario_elasticity
-                WHERE product_key = %s;
-            """, (prod_row["product_key"],))
-
-            if el_row:
-                beta_price = float(el_row["beta_price"])
-                beta_promo = float(el_row["beta_promo"])
-                beta_ad = float(el_row["beta_ad_spend"])
-            else:
-                beta_price, beta_promo, beta_ad = -0.85, 0.75, 0.18
-
-            price_factor = 1 + (price_delta / 100.0) * beta_price
-            promo_factor = 1 + promo_depth * beta_promo
-            ad_factor = 1 + ad_spend * beta_ad
-
-            fc = round(baseline * price_factor * promo_factor * ad_factor, 2)
-            margin = round(fc * 0.32, 2)
-
-            return jsonify({"forecast": fc, "margin": margin, "sku": sku_code})
+            baselines = fetch_baselines([product_key], **scope)
+            if product_key in baselines:
+                baseline, source = baselines[product_key], "forecast"
+            betas = fetch_betas([product_key]).get(product_key, DEFAULT_BETAS)
 
         except Exception as e:
             print(">>> [api_whatif] DB error, fallback simple elastic:", repr(e))
 
-            price_factor = 1 - (price_delta / 100.0) * 0.85
-            promo_factor = 1 + promo_depth * 0.75
-            ad_factor = 1 + ad_spend * 0.18
+        fc, margin = evaluate_grid([baseline], [betas], *levers,
+                                   unit_cost_ratio=unit_cost_ratio, ad_cost=ad_cost)
+        return jsonify({
+            "forecast": round(float(fc.flat[0]), 2),
+            "margin": round(float(margin.flat[0]), 2),
+            "sku": sku_code,
+            "baseline": round(float(baseline), 2),
+            "baseline_scope": {**scope, "source": source},
+        })
+
+    @bp.post("/scenario/grid")
+    def api_scenario_grid():
+        """
+        What-if theo lưới: mọi tổ hợp (price_delta × promo_depth × ad_spend) cho nhiều SKU
+        trong 1 request, tính vectorized bằng NumPy. Body:
+        {
+          "skus": ["K20PR-U", ...] | "family": "Spark Plug",
+          "price_delta": {"min": -20, "max": 20, "steps": 9},   # hoặc list / số
+          "promo_depth": [0, 0.1, 0.2],
+          "ad_spend": 0.5,
+          "country": ..., "channel": ..., "model": ...,         # filter baseline P50 (tùy chọn,
+                                                                # không filter = cộng mọi market của SKU)
+          "unit_cost_ratio": 0.68, "ad_cost": 0,                # tham số margin (tùy chọn)
+          "include_sku_surfaces": false       # surface từng SKU: tối đa MAX_SURFACE_POINTS (SKU × tổ hợp)
+        }
+        """
+        body = request.json or {}
+        skus = body.get("skus") or []
+        family = body.get("family")
 
-            fc = round(baseline * price_factor * promo_factor * ad_factor, 2)
-            margin = round(fc * 0.32, 2)
+        if not isinstance(skus, list) or not all(isinstance(s, str) for s in skus):
+            return jsonify({"ok": False, "message": "skus must be a list of SKU codes"}), 400
+        if not skus and not family:
+            return jsonify({"ok": False, "message": "skus or family is required"}), 400
+        if len(skus) > MAX_GRID_SKUS:
+            return jsonify({"ok": False, "message": f"At most {MAX_GRID_SKUS} skus per request"}), 400
+
+        try:
+            levers = [lever_values(body.get(name), name) for name in LEVERS]
+            unit_cost_ratio = float(body.get("unit_cost_ratio", 1 - MARGIN_RATE))
+            ad_cost = float(body.get("ad_cost", 0.0))
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"ok": False, "message": f"Invalid lever spec: {e}"}), 400
 
-            return jsonify({"forecast": fc, "margin": margin, "sku": sku_code})
+        try:
+            products = fetch_products(skus=skus, family=family)
+            if not products:
+                return jsonify({"ok": False, "message": "No matching SKU in dim_product"}), 404
+
+            n_points = len(products) * int(np.prod([v.size for v in levers]))
+            if n_points > MAX_GRID_POINTS:
+                return jsonify({
+                    "ok": False,
+                    "message": f"Grid too large ({n_points} points, max {MAX_GRID_POINTS})",
+                }), 400
+            include_sku_surfaces = bool(body.get("include_sku_surfaces"))
+            if include_sku_surfaces and n_points > MAX_SURFACE_POINTS:
+                return jsonify({
+                    "ok": False,
+                    "message": f"include_sku_surfaces allows at most {MAX_SURFACE_POINTS} points "
+                               f"(skus × lever combinations), got {n_points}",
+                }), 400
+
+            keys = [p["product_key"] for p in products]
+            baseline_map = fetch_baselines(
+                keys, country=body.get("country"), channel=body.get("channel"), model=body.get("model")
+            )
+            beta_map = fetch_betas(keys)
+
+            baselines = np.array([baseline_map.get(k, DEFAULT_BASELINE) for k in keys])
+            betas = np.array([beta_map.get(k, DEFAULT_BETAS) for k in keys])
+
+            fc, margin = evaluate_grid(baselines, betas, *levers,
+                                       unit_cost_ratio=unit_cost_ratio, ad_cost=ad_cost)
+            result = summarize_grid(
+                [p["sku"] for p in products], baselines, betas, levers, fc, margin,
+                include_sku_surfaces=include_sku_surfaces,
+            )
+            found = {p["sku"] for p in products}
+            result["missing"] = [s for s in skus if s not in found]
+            result["default_baseline_skus"] = [p["sku"] for p in products if p["product_key"] not in baseline_map]
+            result["baseline_scope"] = {k: body.get(k) or None for k in ("country", "channel", "model")}
+            return jsonify(result)
+
+        except Exception as e:
+            print(">>> [api_scenario_grid] DB error:", repr(e))
+            return jsonify({"ok": False, "message": "DB error when evaluating scenario grid"}), 500
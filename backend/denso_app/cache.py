@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request
+from werkzeug.http import generate_etag
+
+from .config import Config
+
+
+class TTLCache:
+    """
+    LRU cache có TTL cho từng entry, thread-safe.
+    Key là tuple (namespace, ...) để invalidate theo namespace.
+    Bộ nhớ bị chặn bởi cả số entry lẫn tổng số byte khai báo khi set().
+    """
+
+    def __init__(self, max_entries=512, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expires_at, nbytes, value)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, nbytes, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self._bytes -= nbytes
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl, nbytes=0):
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._data[key] = (time.monotonic() + ttl, nbytes, value)
+            self._bytes += nbytes
+
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, evicted_bytes, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    def invalidate(self, namespace=None):
+        """Xóa toàn bộ (namespace=None) hoặc các key thuộc 1 namespace; trả về số entry đã xóa."""
+        with self._lock:
+            if namespace is None:
+                keys = list(self._data)
+            else:
+                keys = [k for k in self._data if k[0] == namespace]
+
+            for k in keys:
+                self._bytes -= self._data.pop(k)[1]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = TTLCache(Config.CACHE_MAX_ENTRIES, Config.CACHE_MAX_BYTES)
+
+
+def skip_cache():
+    """Gọi trong nhánh fallback/mock để response hiện tại không bị cache."""
+    g.skip_response_cache = True
+
+
+def cached_response(namespace):
+    """
+    Decorator cho view GET read-only: cache body theo (namespace, query params),
+    TTL lấy từ Config.CACHE_TTLS[namespace].
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (namespace, tuple(sorted(request.args.items(multi=True))))
+
+            cached = response_cache.get(key)
+            if cached is not None:
+                body, mimetype, etag = cached
+                resp = current_app.response_class(body, mimetype=mimetype)
+                # ETag tính sẵn lúc cache → after_request trả 304 mà không hash lại body
+                resp.set_etag(etag)
+                resp.headers["X-Cache"] = "HIT"
+                return resp
+
+            resp = current_app.make_response(view(*args, **kwargs))
+            if resp.status_code == 200 and not resp.is_streamed and not g.get("skip_response_cache"):
+                ttl = current_app.config["CACHE_TTLS"].get(namespace, current_app.config["CACHE_DEFAULT_TTL"])
+                body = resp.get_data()
+                etag = generate_etag(body)
+                resp.set_etag(etag)
+                response_cache.set(key, (body, resp.mimetype, etag), ttl, nbytes=len(body))
+            resp.headers["X-Cache"] = "MISS"
+            return resp
+
+        return wrapper
+
+    return decorator
@@ -12,3 +12,44 @@ class Config:
     DB_NAME = os.getenv("DB_NAME", "denso_forecast")
     DB_USER = os.getenv("DB_USER", "denso")
     DB_PASSWORD = os.getenv("DB_PASSWORD", "admin")
+
+    # Connection pool (psycopg2 ThreadedConnectionPool, dùng chung cho cả process)
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    # Thời gian chờ tối đa (giây) khi pool đã hết connection rảnh
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    # Connection rảnh lâu hơn ngưỡng này sẽ được ping (SELECT 1) trước khi dùng lại
+    DB_POOL_HEALTHCHECK_SECS = float(os.getenv("DB_POOL_HEALTHCHECK_SECS", "30"))
+    DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+    # Response cache cho các endpoint read-only (xem cache.py)
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+    CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "300"))
+    # TTL (giây) theo namespace của endpoint
+    CACHE_TTLS = {
+        "monitoring": 300,
+        "models_registry": 600,
+        "forecast_backtest": 600,
+        "data_exogenous": 900,
+        "market_intelligence": 120,
+        "campaign_analysis": 3600,
+    }
+
+    # Nén response API (xem wire.py): chỉ nén body >= ngưỡng này (byte)
+    API_COMPRESS_MIN_BYTES = int(os.getenv("API_COMPRESS_MIN_BYTES", "1024"))
+    API_GZIP_LEVEL = int(os.getenv("API_GZIP_LEVEL", "6"))
+    API_BROTLI_QUALITY = int(os.getenv("API_BROTLI_QUALITY", "5"))
+
+    # Export streaming (server-side cursor): số row mỗi lần fetch / mỗi chunk
+    EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+
+    # Dimension cache (dimensions.py): khoảng thời gian tối thiểu (giây) giữa 2 lần check dim.dim_version
+    DIM_CACHE_CHECK_SECS = float(os.getenv("DIM_CACHE_CHECK_SECS", "30"))
+
+    # Drift engine (services/drift_service.py): cửa sổ tham chiếu = N tuần đầu của dữ liệu,
+    # cửa sổ hiện tại = N tuần gần nhất, số bin quantile tối đa cho feature liên tục
+    # (thực dùng tối đa DRIFT_CURRENT_WEEKS // 3 bin, xem drift_service.effective_bins)
+    DRIFT_REFERENCE_WEEKS = int(os.getenv("DRIFT_REFERENCE_WEEKS", "52"))
+    DRIFT_CURRENT_WEEKS = int(os.getenv("DRIFT_CURRENT_WEEKS", "13"))
+    DRIFT_BINS = int(os.getenv("DRIFT_BINS", "10"))
@@ -1,26 +1,185 @@
 import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import pool
+from psycopg2.extras import RealDictCursor, execute_values as _execute_values
+
+from .config import Config
 
 # Simple psycopg2 helper; in future can be replaced by SQLAlchemy.
 DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "port": os.getenv("DB_PORT", "5432"),
-    "dbname": os.getenv("DB_NAME", "denso_forecast"),
-    "user": os.getenv("DB_USER", "denso"),
-    "password": os.getenv("DB_PASSWORD", "admin"),
+    "host": Config.DB_HOST,
+    "port": Config.DB_PORT,
+    "dbname": Config.DB_NAME,
+    "user": Config.DB_USER,
+    "password": Config.DB_PASSWORD,
+    "connect_timeout": Config.DB_CONNECT_TIMEOUT,
 }
 
 
+class ConnectionPool:
+    """
+    Wrapper quanh psycopg2 ThreadedConnectionPool:
+    - Chờ tối đa `timeout` giây khi pool hết connection (thay vì raise ngay).
+    - Ping connection đã rảnh lâu trước khi cho mượn, bỏ connection hỏng.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, healthcheck_secs, **conn_kwargs):
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._timeout = timeout
+        self._healthcheck_secs = healthcheck_secs
+        self._maxconn = maxconn
+        self._last_used = {}  # id(conn) -> time.monotonic() lúc trả về pool
+        self.pid = os.getpid()
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self._healthcheck_secs:
+            # connection mới tạo hoặc vừa dùng xong → coi như còn sống
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self._timeout):
+            raise pool.PoolError(f"No free DB connection after {self._timeout}s")
+
+        try:
+            # Nếu DB vừa restart thì mọi connection rảnh đều hỏng → thử tối đa maxconn lần
+            for _ in range(self._maxconn + 1):
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                print(">>> [db] dropping broken pooled connection")
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+            raise pool.PoolError("Could not obtain a healthy DB connection")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, broken=False):
+        try:
+            if broken or conn.closed:
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+            else:
+                # ThreadedConnectionPool tự rollback nếu còn transaction dở dang
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+        self._last_used.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool dùng chung cho cả process (tạo lại sau khi fork, vd. gunicorn worker)."""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(
+                    Config.DB_POOL_MIN,
+                    Config.DB_POOL_MAX,
+                    Config.DB_POOL_TIMEOUT,
+                    Config.DB_POOL_HEALTHCHECK_SECS,
+                    **DB_CONFIG,
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+@contextmanager
+def get_conn():
+    """
+    Mượn 1 connection từ pool. Commit khi block chạy xong, rollback khi lỗi
+    (giống `with psycopg2.connect(...) as conn`), sau đó trả lại pool.
+    """
+    db_pool = get_pool()
+    conn = db_pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        db_pool.putconn(conn, broken=broken)
+
+
 def query_all(sql, params=None):
     """Run SELECT and return all rows as list[dict]."""
-    with psycopg2.connect(**DB_CONFIG) as conn:
+    with get_conn() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(sql, params or ())
             return cur.fetchall()
 
 
+def query_columns(sql, params=None):
+    """
+    Run SELECT and return columns as dict[name, list] (cursor thường, không tạo dict
+    cho từng row). Ép kiểu trong SQL (::float8, to_char) để giá trị dùng được ngay.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params or ())
+            names = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(col) for name, col in zip(names, zip(*rows))}
+
+
+def stream_query(sql, params=None, batch_size=2000):
+    """
+    Generator cho export lớn: server-side (named) cursor, yield (tên cột, list tuple)
+    mỗi batch_size row → bộ nhớ không tăng theo kích thước bảng.
+    Connection bị giữ cho tới khi generator chạy hết hoặc bị close().
+    """
+    with get_conn() as conn:
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+            cur.itersize = batch_size
+            cur.execute(sql, params or ())
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [d[0] for d in cur.description], rows
+
+
 def query_one(sql, params=None):
     """Run SELECT and return single row (dict) or None."""
     rows = query_all(sql, params)
@@ -29,7 +188,16 @@ def query_one(sql, params=None):
 
 def execute_sql(sql, params=None):
     """Run INSERT/UPDATE/DELETE."""
-    with psycopg2.connect(**DB_CONFIG) as conn:
+    with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params or ())
-        conn.commit()
+
+
+def execute_values(sql, rows, page_size=1000, template=None):
+    """
+    Bulk INSERT / UPDATE ... FROM (VALUES %s): sql chứa 1 placeholder `VALUES %s`, rows là list tuple.
+    template (vd. "(%s, %s::jsonb)") để ép kiểu cột có thể toàn NULL.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            _execute_values(cur, sql, rows, template=template, page_size=page_size)
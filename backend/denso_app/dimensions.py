@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import defaultdict
+
+from .config import Config
+from .db import query_all
+
+PRODUCT_COLUMNS = ("product_key", "sku", "name", "family", "category", "type", "channel")
+MARKET_COLUMNS = ("market_key", "country", "region", "channel")
+
+
+class DimSnapshot:
+    """
+    Ảnh chụp bất biến của các bảng dimension, thay nguyên khối khi refresh
+    (request đang đọc snapshot cũ không bị ảnh hưởng).
+    """
+
+    def __init__(self, version, product_rows, market_rows, beta_rows):
+        self.version = version
+        self.loaded_at = time.time()
+
+        self.product_by_key = {r["product_key"]: r for r in product_rows}
+        self.product_key_by_sku = {r["sku"]: r["product_key"] for r in product_rows}
+        families = defaultdict(list)
+        for r in product_rows:  # product_rows đã ORDER BY sku
+            families[r["family"]].append(r["product_key"])
+        self.product_keys_by_family = dict(families)
+
+        self.market_by_key = {r["market_key"]: r for r in market_rows}
+        self.market_key_by_country_channel = {(r["country"], r["channel"]): r["market_key"] for r in market_rows}
+
+        # product_key -> (beta_price, beta_promo, beta_ad_spend); NULL giữ None
+        self.betas = {r["product_key"]: (r["beta_price"], r["beta_promo"], r["beta_ad_spend"]) for r in beta_rows}
+
+    def products(self, skus=None, family=None):
+        """Giống forecast_service.fetch_products: list row dim_product theo SKU (ORDER BY sku) hoặc family."""
+        if skus:
+            keys = [self.product_key_by_sku[s] for s in sorted(set(skus)) if s in self.product_key_by_sku]
+        elif family:
+            keys = self.product_keys_by_family.get(family, [])
+        else:
+            return []
+        return [self.product_by_key[k] for k in keys]
+
+    def product_key(self, sku):
+        return self.product_key_by_sku.get(sku)
+
+    def market_key(self, country, channel):
+        return self.market_key_by_country_channel.get((country, channel))
+
+
+class DimensionCache:
+    """
+    Cache dimension dùng chung cho cả process.
+    - Lần đầu: nạp toàn bộ (3 query nhỏ).
+    - Sau đó: tối đa mỗi `check_secs` giây đọc dim.dim_version (1 row / bảng, do trigger
+      trong schema.sql mục 9 tăng); chỉ nạp lại khi version đổi.
+    Giữa 2 lần check, lookup không chạm tới Postgres.
+    """
+
+    def __init__(self, check_secs):
+        self.check_secs = check_secs
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.version_checks = 0
+
+    def _read_version(self):
+        rows = query_all("SELECT name, version FROM dim.dim_version ORDER BY name;")
+        return tuple((r["name"], r["version"]) for r in rows)
+
+    def _load(self, version):
+        product_rows = query_all(f"""
+            SELECT {", ".join(PRODUCT_COLUMNS)}
+            FROM dim.dim_product
+            ORDER BY sku;
+        """)
+        market_rows = query_all(f"""
+            SELECT {", ".join(MARKET_COLUMNS)}
+            FROM dim.dim_market
+            ORDER BY market_key;
+        """)
+        beta_rows = query_all("""
+            SELECT DISTINCT ON (product_key)
+                   product_key,
+                   beta_price::float8    AS beta_price,
+                   beta_promo::float8    AS beta_promo,
+                   beta_ad_spend::float8 AS beta_ad_spend
+            FROM mart.scenario_elasticity
+            ORDER BY product_key, id DESC;
+        """)
+        self.reloads += 1
+        return DimSnapshot(version, product_rows, market_rows, beta_rows)
+
+    def get(self):
+        """Snapshot hiện tại; refresh nếu đã quá check_secs và version trong DB đã đổi."""
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._checked_at < self.check_secs:
+            return snap
+
+        with self._lock:
+            snap = self._snapshot
+            if snap is not None and time.monotonic() - self._checked_at < self.check_secs:
+                return snap  # thread khác vừa check xong
+
+            version = self._read_version()
+            self.version_checks += 1
+            if snap is None or snap.version != version:
+                snap = self._load(version)
+                self._snapshot = snap
+            self._checked_at = time.monotonic()
+            return snap
+
+    def invalidate(self):
+        """Bỏ snapshot, lần get() sau nạp lại ngay (vd. sau khi seed lại dim)."""
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+
+    def stats(self):
+        snap = self._snapshot
+        return {
+            "loaded": snap is not None,
+            "version": dict(snap.version) if snap else None,
+            "products": len(snap.product_by_key) if snap else 0,
+            "markets": len(snap.market_by_key) if snap else 0,
+            "betas": len(snap.betas) if snap else 0,
+            "reloads": self.reloads,
+            "version_checks": self.version_checks,
+            "check_secs": self.check_secs,
+        }
+
+
+dimension_cache = DimensionCache(Config.DIM_CACHE_CHECK_SECS)
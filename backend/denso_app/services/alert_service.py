@@ -0,0 +1,104 @@
+import base64
+import re
+from datetime import datetime
+
+from ..db import query_all
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+# Timestamp dạng Postgres / ISO với 0–6 chữ số phần giây và offset "+07", "+0700" hoặc "+07:00"
+# (row_to_json của /api/dashboard). Parse bằng strptime sau khi chuẩn hóa, không dùng
+# datetime.fromisoformat (Python < 3.11 chỉ nhận đúng 3 hoặc 6 chữ số phần giây).
+_TIMESTAMP_RE = re.compile(
+    r"^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:\.(\d{1,6}))?(Z|[+-]\d{2}(?::?\d{2})?)?$"
+)
+
+
+def parse_timestamp(value):
+    """datetime giữ nguyên; chuỗi timestamp → datetime (có tzinfo nếu chuỗi có offset)."""
+    if isinstance(value, datetime):
+        return value
+    m = _TIMESTAMP_RE.match(value)
+    if m is None:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    day, clock, frac, tz = m.groups()
+    text = f"{day}T{clock}.{(frac or '').ljust(6, '0')}"
+    if tz is None:
+        return datetime.strptime(text, "%Y-%m-%dT%H:%M:%S.%f")
+    tz = "+00:00" if tz == "Z" else tz.replace(":", "").ljust(5, "0")
+    return datetime.strptime(text + tz, "%Y-%m-%dT%H:%M:%S.%f%z")
+
+
+def encode_cursor(created_at, alert_id):
+    """Cursor = base64("<created_at ISO, luôn đủ micro giây>|<alert_id>") của dòng cuối trang."""
+    created_at = parse_timestamp(created_at).isoformat(timespec="microseconds")
+    raw = f"{created_at}|{alert_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Trả về (created_at datetime, alert_id); raise ValueError nếu cursor sai format."""
+    try:
+        created_at, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return parse_timestamp(created_at), int(alert_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def shape_alert_page(rows, limit):
+    """
+    rows: tối đa limit + 1 dòng (alert_id, created_at, level, type, message, link),
+    sắp xếp created_at DESC, alert_id DESC. Dòng thừa chỉ để biết còn trang sau.
+    """
+    page = rows[:limit]
+    items = [
+        {
+            "id": r["alert_id"],
+            "level": r["level"],
+            "type": r["type"],
+            "msg": r["message"],
+            "link": r["link"],
+            "created_at": r["created_at"].isoformat() if isinstance(r["created_at"], datetime) else r["created_at"],
+        }
+        for r in page
+    ]
+
+    next_cursor = None
+    if len(rows) > limit and page:
+        next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["alert_id"])
+
+    return items, next_cursor
+
+
+def fetch_alert_page(limit=DEFAULT_PAGE_SIZE, cursor=None, levels=None, types=None):
+    """
+    Keyset pagination trên (created_at, alert_id) - dùng index ix_alerts_log_created,
+    chi phí mỗi trang không phụ thuộc kích thước alerts_log.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    clauses = []
+    params = []
+    if cursor:
+        created_at, alert_id = decode_cursor(cursor)
+        clauses.append("(created_at, alert_id) < (%s::timestamptz, %s)")
+        params.extend([created_at, alert_id])
+    if levels:
+        clauses.append("level = ANY(%s)")
+        params.append(list(levels))
+    if types:
+        clauses.append("type = ANY(%s)")
+        params.append(list(types))
+
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    rows = query_all(f"""
+        SELECT alert_id, created_at, level, type, message, link
+        FROM mart.alerts_log
+        {where}
+        ORDER BY created_at DESC, alert_id DESC
+        LIMIT %s;
+    """, params + [limit + 1])
+
+    return shape_alert_page(rows, limit)
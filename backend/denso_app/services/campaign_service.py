@@ -0,0 +1,324 @@
+import hashlib
+import json
+from datetime import timedelta
+
+import numpy as np
+
+from ..cache import response_cache
+from ..config import Config
+from ..db import execute_values, query_all
+
+DEFAULT_RESAMPLES = 5000
+MAX_RESAMPLES = 50000
+RESAMPLE_CHUNK = 5000  # giới hạn kích thước ma trận index mỗi lần (chunk × n)
+CACHE_NAMESPACE = "campaign_analysis"
+
+CAMPAIGN_COLUMNS = """campaign_id, name, sku, start_date, end_date,
+               abs_lift, rel_lift, p_value, roi,
+               observed_ts, counterfactual_ts, reasons"""
+
+
+def as_list(raw):
+    """JSONB đã được psycopg2 decode; vẫn chấp nhận chuỗi JSON (dữ liệu cũ ghi bằng json.dumps)."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return None
+    return raw
+
+
+def valid_series(observed, counterfactual):
+    return (
+        isinstance(observed, list) and isinstance(counterfactual, list)
+        and len(observed) == len(counterfactual) and len(observed) > 0
+        and all(isinstance(x, (int, float)) for x in observed if x is not None)
+        and all(isinstance(x, (int, float)) for x in counterfactual if x is not None)
+    )
+
+
+def fetch_campaigns(campaign_id=None, limit=None):
+    """
+    Campaign mới nhất trước (limit = chỉ N dòng đầu) hoặc 1 campaign theo id;
+    observed/counterfactual/reasons đã parse.
+    """
+    where, params = ("WHERE campaign_id = %s", [campaign_id]) if campaign_id is not None else ("", [])
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT %s"
+        params.append(limit)
+    rows = query_all(f"""
+        SELECT {CAMPAIGN_COLUMNS}
+        FROM mart.campaign_impact
+        {where}
+        ORDER BY start_date DESC NULLS LAST, campaign_id DESC
+        {limit_sql};
+    """, params)
+
+    for r in rows:
+        r["observed_ts"] = as_list(r["observed_ts"])
+        r["counterfactual_ts"] = as_list(r["counterfactual_ts"])
+        r["reasons"] = as_list(r["reasons"]) or []
+    return rows
+
+
+def default_block_length(n):
+    """Độ dài block ~ n^(1/3) (quy tắc thường dùng cho moving block bootstrap)."""
+    return max(1, int(round(n ** (1 / 3))))
+
+
+def block_bootstrap_lift(observed, counterfactual, n_resamples=DEFAULT_RESAMPLES, block=None, seed=None):
+    """
+    Lift = Σ(observed − counterfactual) trên các điểm có đủ 2 giá trị.
+    CI 95%: moving block bootstrap của chuỗi chênh lệch (giữ tự tương quan trong block),
+    mẫu sinh theo lô bằng ma trận index (RESAMPLE_CHUNK, n) thay vì vòng lặp Python từng mẫu.
+    p-value (2 phía, H0: lift = 0): cùng các block trên chuỗi đã trừ trung bình.
+    """
+    obs = np.array([np.nan if v is None else v for v in observed], dtype=float)
+    cf = np.array([np.nan if v is None else v for v in counterfactual], dtype=float)
+    ok = ~(np.isnan(obs) | np.isnan(cf))
+    diff = obs[ok] - cf[ok]
+    n = diff.size
+    if n == 0:
+        raise ValueError("No overlapping observed / counterfactual points")
+
+    abs_lift = float(diff.sum())
+    cf_total = float(cf[ok].sum())
+    rel_lift = abs_lift / cf_total if cf_total else None
+
+    b = min(block or default_block_length(n), n)
+    n_blocks = -(-n // b)
+    rng = np.random.default_rng(seed)
+    centered_diff = diff - diff.mean()
+    boot = np.empty(n_resamples)
+    centered = np.empty(n_resamples)
+    for lo in range(0, n_resamples, RESAMPLE_CHUNK):
+        size = min(RESAMPLE_CHUNK, n_resamples - lo)
+        starts = rng.integers(0, n - b + 1, size=(size, n_blocks))
+        idx = (starts[:, :, None] + np.arange(b)).reshape(size, -1)[:, :n]
+        boot[lo:lo + size] = diff[idx].sum(axis=1)
+        centered[lo:lo + size] = centered_diff[idx].sum(axis=1)
+
+    ci_low, ci_high = np.percentile(boot, [2.5, 97.5])
+    p_value = (np.count_nonzero(np.abs(centered) >= abs(abs_lift)) + 1) / (n_resamples + 1)
+
+    return {
+        "abs_lift": abs_lift,
+        "rel_lift": rel_lift,
+        "ci_95": [float(ci_low), float(ci_high)],
+        "p_value": float(p_value),
+        "n_points": int(n),
+        "block": int(b),
+        "resamples": int(n_resamples),
+    }
+
+
+def _input_hash(row):
+    payload = json.dumps([row["observed_ts"], row["counterfactual_ts"]], separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def analyze_campaign(row, n_resamples=DEFAULT_RESAMPLES, block=None):
+    """
+    Phân tích 1 campaign (row từ fetch_campaigns), cache theo (campaign_id, hash chuỗi đầu vào,
+    tham số bootstrap) → counterfactual được tính lại thì tự miss. Seed = campaign_id để kết quả ổn định.
+    Trả về None nếu chuỗi không hợp lệ.
+    """
+    observed, counterfactual = row["observed_ts"], row["counterfactual_ts"]
+    if not valid_series(observed, counterfactual):
+        return None
+
+    key = (CACHE_NAMESPACE, row["campaign_id"], _input_hash(row), n_resamples, block)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = block_bootstrap_lift(observed, counterfactual, n_resamples, block, seed=row["campaign_id"])
+    ttl = Config.CACHE_TTLS.get(CACHE_NAMESPACE, Config.CACHE_DEFAULT_TTL)
+    response_cache.set(key, result, ttl, nbytes=512)
+    return result
+
+
+def campaign_summary(row, analysis):
+    """Dòng tóm tắt cho danh sách campaign."""
+    return {
+        "campaign_id": row["campaign_id"],
+        "name": row["name"],
+        "sku": row["sku"],
+        "start_date": row["start_date"].strftime("%Y-%m-%d") if row["start_date"] else None,
+        "end_date": row["end_date"].strftime("%Y-%m-%d") if row["end_date"] else None,
+        "roi": float(row["roi"]) if row["roi"] is not None else None,
+        "analysis": None if analysis is None else {
+            "abs_lift": round(analysis["abs_lift"], 2),
+            "rel_lift": round(analysis["rel_lift"] * 100, 2) if analysis["rel_lift"] is not None else None,
+            "ci_95": [round(v, 2) for v in analysis["ci_95"]],
+            "p_value": round(analysis["p_value"], 4),
+            "n_points": analysis["n_points"],
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# Pipeline stage: counterfactual từ forecast trước campaign của champion model
+# ---------------------------------------------------------------------------
+
+# Tất cả campaign trong 1 query: champion của SKU tại ngày bắt đầu (chưa có thì champion hiện tại),
+# forecast của champion cho các tuần trong cửa sổ campaign với forecast origin
+# (week_start − horizon_days) không sau start_date, horizon ngắn nhất; cộng P50 theo market.
+# Champion lưu (registry name, version), vd. ('xgboost_sparkplug', 'v1'); model_name tương ứng trong
+# demand_forecast_weekly lấy đúng từ mart.model_registry.forecast_model. Mỗi campaign có champion
+# trả về ít nhất 1 dòng (forecast_model / week_start NULL khi chưa map được / chưa có forecast).
+COUNTERFACTUAL_SQL = """
+    WITH c AS (
+        SELECT ci.campaign_id, ci.start_date, p.product_key,
+               ci.start_date + GREATEST(
+                   COALESCE(ci.end_date - ci.start_date + 1, 0),
+                   CASE WHEN jsonb_typeof(ci.observed_ts) = 'array'
+                        THEN jsonb_array_length(ci.observed_ts) ELSE 0 END
+               ) - 1 AS window_end
+        FROM mart.campaign_impact ci
+        JOIN dim.dim_product p ON p.sku = ci.sku
+        WHERE ci.start_date IS NOT NULL
+    ),
+    champ AS (
+        SELECT DISTINCT ON (c.campaign_id)
+               c.campaign_id, ch.model_name || '@' || ch.version AS champion, r.forecast_model
+        FROM c
+        JOIN mart.model_champion_per_sku ch ON ch.product_key = c.product_key
+        LEFT JOIN mart.model_registry r ON r.name = ch.model_name AND r.version = ch.version
+        ORDER BY c.campaign_id, (ch.effective_from <= c.start_date) DESC, ch.effective_from DESC, ch.id DESC,
+                 r.model_id DESC
+    ),
+    fc AS (
+        SELECT DISTINCT ON (c.campaign_id, df.market_key, df.week_start)
+               c.campaign_id, df.week_start, df.p50
+        FROM c
+        JOIN champ USING (campaign_id)
+        JOIN mart.demand_forecast_weekly df
+          ON df.product_key = c.product_key
+         AND df.model_name = champ.forecast_model
+         AND df.week_start BETWEEN date_trunc('week', c.start_date)::date AND c.window_end
+         AND df.week_start - df.horizon_days <= c.start_date
+         AND df.p50 IS NOT NULL
+        ORDER BY c.campaign_id, df.market_key, df.week_start, df.horizon_days, df.forecast_key DESC
+    )
+    SELECT champ.campaign_id, champ.champion, champ.forecast_model AS model_name,
+           fc.week_start, SUM(fc.p50)::float8 AS p50
+    FROM champ
+    LEFT JOIN fc USING (campaign_id)
+    GROUP BY champ.campaign_id, champ.champion, champ.forecast_model, fc.week_start
+    ORDER BY champ.campaign_id, fc.week_start;
+"""
+
+
+def _campaign_window(row):
+    """Số ngày của campaign: max(end − start + 1, độ dài observed_ts)."""
+    n_days = (row["end_date"] - row["start_date"]).days + 1 if row["end_date"] else 0
+    if isinstance(row["observed_ts"], list):
+        n_days = max(n_days, len(row["observed_ts"]))
+    return n_days
+
+
+def daily_counterfactual(start_date, n_days, weekly_p50):
+    """Chuỗi counterfactual theo ngày = P50 của tuần chứa ngày đó / 7 (None nếu tuần thiếu forecast)."""
+    series = []
+    for i in range(n_days):
+        day = start_date + timedelta(days=i)
+        p50 = weekly_p50.get(day - timedelta(days=day.weekday()))
+        series.append(None if p50 is None else round(p50 / 7.0, 2))
+    return series
+
+
+def _counterfactual_hash(row, model_name, weekly_p50, n_days):
+    """Fingerprint toàn bộ đầu vào: cửa sổ, model, P50 từng tuần và observed (lift phụ thuộc cả 2)."""
+    payload = json.dumps([
+        row["start_date"].isoformat(), n_days, model_name,
+        sorted((w.isoformat(), round(v, 6)) for w, v in weekly_p50.items()),
+        row["observed_ts"],
+    ], separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def refresh_counterfactuals(force=False, dry_run=False, n_resamples=DEFAULT_RESAMPLES):
+    """
+    Sinh lại counterfactual_ts cho mọi campaign (set-based: 2 query đọc cho toàn bộ campaign)
+    rồi ghi lại bằng 1 UPDATE ... FROM (VALUES ...) chỉ cho campaign có fingerprint đầu vào đổi
+    (counterfactual_hash). Campaign có observed_ts hợp lệ được tính lại abs_lift / rel_lift / p_value
+    bằng block_bootstrap_lift; không tính được thì để NULL (không giữ lift của counterfactual cũ).
+    Champion chưa có model_registry.forecast_model → bỏ qua, có log lý do.
+    Trả về thống kê {campaigns, updated, unchanged, skipped: {lý do: [campaign_id]}}.
+    """
+    campaigns = query_all(f"""
+        SELECT {CAMPAIGN_COLUMNS}, counterfactual_hash
+        FROM mart.campaign_impact
+        ORDER BY campaign_id;
+    """)
+    weekly = {}
+    models = {}
+    champions = {}
+    for r in query_all(COUNTERFACTUAL_SQL):
+        champions[r["campaign_id"]] = r["champion"]
+        models[r["campaign_id"]] = r["model_name"]
+        if r["week_start"] is not None:
+            weekly.setdefault(r["campaign_id"], {})[r["week_start"]] = r["p50"]
+
+    updates = []
+    skipped = {"no_start_date": [], "no_champion": [], "unmapped_champion": [], "no_forecast": []}
+    unchanged = 0
+    for row in campaigns:
+        row["observed_ts"] = as_list(row["observed_ts"])
+        cid = row["campaign_id"]
+        if row["start_date"] is None:
+            skipped["no_start_date"].append(cid)
+            continue
+        if cid not in champions:
+            skipped["no_champion"].append(cid)
+            continue
+        if models[cid] is None:
+            print(f">>> [refresh_counterfactuals] campaign {cid}: champion {champions[cid]} "
+                  "has no model_registry.forecast_model, skipped")
+            skipped["unmapped_champion"].append(cid)
+            continue
+        if cid not in weekly:
+            skipped["no_forecast"].append(cid)
+            continue
+
+        n_days = _campaign_window(row)
+        digest = _counterfactual_hash(row, models[cid], weekly[cid], n_days)
+        if digest == row["counterfactual_hash"] and not force:
+            unchanged += 1
+            continue
+
+        counterfactual = daily_counterfactual(row["start_date"], n_days, weekly[cid])
+        abs_lift = rel_lift = p_value = None
+        observed = row["observed_ts"]
+        if valid_series(observed, counterfactual):
+            try:
+                lift = block_bootstrap_lift(observed, counterfactual, n_resamples, seed=cid)
+                abs_lift, rel_lift, p_value = lift["abs_lift"], lift["rel_lift"], lift["p_value"]
+            except ValueError:
+                pass  # observed và counterfactual không có điểm chung
+
+        updates.append((cid, json.dumps(counterfactual), models[cid], digest, abs_lift, rel_lift, p_value))
+
+    if updates and not dry_run:
+        execute_values("""
+            UPDATE mart.campaign_impact AS ci
+            SET counterfactual_ts    = v.counterfactual_ts,
+                counterfactual_model = v.model_name,
+                counterfactual_hash  = v.digest,
+                counterfactual_at    = now(),
+                abs_lift = v.abs_lift,
+                rel_lift = v.rel_lift,
+                p_value  = v.p_value
+            FROM (VALUES %s) AS v(campaign_id, counterfactual_ts, model_name, digest, abs_lift, rel_lift, p_value)
+            WHERE ci.campaign_id = v.campaign_id;
+        """, updates, template="(%s, %s::jsonb, %s, %s, %s::numeric, %s::numeric, %s::numeric)")
+
+    return {
+        "campaigns": len(campaigns),
+        "updated": [u[0] for u in updates],
+        "unchanged": unchanged,
+        "skipped": skipped,
+        "dry_run": dry_run,
+    }
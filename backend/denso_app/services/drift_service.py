@@ -0,0 +1,252 @@
+from datetime import timedelta
+
+import numpy as np
+
+from ..config import Config
+from ..db import get_conn, query_all, query_columns
+
+# 14 regressor của feature.ts_features_weekly: (cột, feature_type, source) như seed mart.data_drift_features
+DRIFT_FEATURES = (
+    ("pmi", "economic", "GSO / S&P Global"),
+    ("gdp_growth", "economic", "GSO"),
+    ("cpi", "economic", "GSO"),
+    ("gas_price", "demand", "MOIT"),
+    ("gtrends_score", "demand", "Google Trends"),
+    ("total_new_vehicle_sales", "demand", "VAMA"),
+    ("new_ice_and_hybrid_sales", "fleet", "VAMA/TC Motor"),
+    ("bev_penetration_rate", "fleet", "Industry Report"),
+    ("total_ice_and_hybrid_on_road", "fleet", "Registry"),
+    ("own_price_aftermarket", "commercial", "ERP"),
+    ("comp_price_aftermarket", "commercial", "Market Intel"),
+    ("promo_depth", "commercial", "Marketing"),
+    ("weather_event_flag", "event", "Weather Center"),
+    ("holiday_flag", "event", "Calendar"),
+)
+FEATURE_NAMES = tuple(f[0] for f in DRIFT_FEATURES)
+FLAG_FEATURES = {"weather_event_flag", "holiday_flag"}
+
+PSI_MEDIUM = 0.1
+PSI_HIGH = 0.2
+LAPLACE_ALPHA = 0.5   # cộng vào mọi bin của cả 2 histogram: bin trống không còn đẩy PSI lên ~0.7
+MIN_WEEKS_PER_BIN = 3
+KS_C_ALPHA = 1.358    # KS 2 mẫu, α = 0.05: D_crit = c(α) · sqrt((n + m) / (n · m))
+
+FEATURE_VALUES_SQL = "SELECT week_start, " + ", ".join(
+    f"{name}::int::float8 AS {name}" if name in FLAG_FEATURES else f"{name}::float8 AS {name}"
+    for name in FEATURE_NAMES
+) + " FROM feature.ts_features_weekly"
+
+
+def drift_status(psi, ks=None, ks_crit=None):
+    """
+    Ngưỡng PSI chỉ áp dụng khi KS vượt giá trị tới hạn (α = 0.05) của cỡ 2 cửa sổ:
+    với cửa sổ hiện tại ngắn, PSI dao động mạnh chỉ do nhiễu lấy mẫu.
+    """
+    if ks is not None and ks_crit is not None and ks < ks_crit:
+        return "stable"
+    if psi >= PSI_HIGH:
+        return "high"
+    if psi >= PSI_MEDIUM:
+        return "medium"
+    return "stable"
+
+
+def effective_bins(n_bins, current_weeks):
+    """Số bin thực dùng: tối đa current_weeks // MIN_WEEKS_PER_BIN để bin của cửa sổ hiện tại không trống."""
+    return max(2, min(n_bins, current_weeks // MIN_WEEKS_PER_BIN))
+
+
+def bin_edges(reference, n_bins):
+    """Biên trong (không gồm ±inf) theo quantile của cửa sổ tham chiếu; flag 0/1 → 1 biên 0.5."""
+    values = reference[~np.isnan(reference)]
+    if values.size == 0:
+        return np.zeros(0)
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+    return edges
+
+
+def bin_counts(values, edges):
+    """Số điểm trong từng bin (len(edges) + 1 bin, 2 bin ngoài cùng mở ra ±inf); NaN bị bỏ."""
+    values = values[~np.isnan(values)]
+    return np.bincount(np.searchsorted(edges, values, side="right"), minlength=edges.size + 1)
+
+
+def ks_psi(ref_counts, cur_counts):
+    """
+    KS = max |CDF_ref − CDF_cur| trên lưới biên bin (KS của dữ liệu đã bin, không cần giá trị gốc);
+    PSI = Σ (cur% − ref%) · ln(cur% / ref%) trên histogram đã làm mượt Laplace (+LAPLACE_ALPHA / bin).
+    """
+    ref = np.asarray(ref_counts, dtype=float)
+    cur = np.asarray(cur_counts, dtype=float)
+    if ref.sum() == 0 or cur.sum() == 0:
+        return None, None
+    ks = float(np.max(np.abs(np.cumsum(ref / ref.sum()) - np.cumsum(cur / cur.sum()))))
+    ref_pct = (ref + LAPLACE_ALPHA) / (ref.sum() + LAPLACE_ALPHA * ref.size)
+    cur_pct = (cur + LAPLACE_ALPHA) / (cur.sum() + LAPLACE_ALPHA * cur.size)
+    psi = float(np.sum((cur_pct - ref_pct) * np.log(cur_pct / ref_pct)))
+    return ks, psi
+
+
+def ks_critical(n_ref, n_cur):
+    """Giá trị tới hạn của KS 2 mẫu (α = 0.05); None khi 1 cửa sổ trống."""
+    if n_ref <= 0 or n_cur <= 0:
+        return None
+    return KS_C_ALPHA * float(np.sqrt((n_ref + n_cur) / (n_ref * n_cur)))
+
+
+def _matrix(columns):
+    """query_columns → (R, F) float array theo thứ tự FEATURE_NAMES (NULL → NaN)."""
+    if not columns["week_start"]:
+        return np.empty((0, len(FEATURE_NAMES)))
+    return np.array([columns[name] for name in FEATURE_NAMES], dtype=float).T
+
+
+def _rows_between(after, until):
+    """Các dòng có after < week_start <= until (after None = không chặn dưới)."""
+    if after is None:
+        return _matrix(query_columns(f"{FEATURE_VALUES_SQL} WHERE week_start <= %s;", (until,)))
+    return _matrix(query_columns(f"{FEATURE_VALUES_SQL} WHERE week_start > %s AND week_start <= %s;",
+                                 (after, until)))
+
+
+def _load_state():
+    rows = query_all("""
+        SELECT feature_name, ref_start, ref_end, current_weeks, n_bins,
+               edges, ref_counts, cur_counts, last_week
+        FROM mart.data_drift_state;
+    """)
+    return {r["feature_name"]: r for r in rows}
+
+
+def _build_state(ref_start, ref_end, current_weeks, n_bins, latest):
+    """Rebuild: bin theo quantile tham chiếu, đếm toàn bộ cửa sổ hiện tại (2 range scan)."""
+    reference = _matrix(query_columns(
+        f"{FEATURE_VALUES_SQL} WHERE week_start >= %s AND week_start < %s;", (ref_start, ref_end)))
+    current = _rows_between(latest - timedelta(weeks=current_weeks), latest)
+
+    state = {}
+    for j, name in enumerate(FEATURE_NAMES):
+        edges = (np.array([0.5]) if name in FLAG_FEATURES
+                 else bin_edges(reference[:, j], effective_bins(n_bins, current_weeks)))
+        state[name] = {
+            "feature_name": name,
+            "ref_start": ref_start, "ref_end": ref_end,
+            "current_weeks": current_weeks, "n_bins": n_bins,
+            "edges": edges,
+            "ref_counts": bin_counts(reference[:, j], edges),
+            "cur_counts": bin_counts(current[:, j], edges),
+            "last_week": latest,
+        }
+    return state
+
+
+def _advance_state(state, current_weeks, latest):
+    """
+    Cửa sổ hiện tại trượt từ last_week tới latest: cộng bin của các tuần mới,
+    trừ bin của các tuần rơi khỏi cửa sổ. Chỉ đọc đúng các dòng đó (2 range scan nhỏ).
+    """
+    last_week = min(s["last_week"] for s in state.values())
+    window = timedelta(weeks=current_weeks)
+    added = _rows_between(last_week, latest)
+    expired = _rows_between(last_week - window, latest - window)
+
+    for j, name in enumerate(FEATURE_NAMES):
+        s = state[name]
+        edges = np.asarray(s["edges"], dtype=float)
+        cur = np.asarray(s["cur_counts"], dtype=np.int64)
+        cur = cur + bin_counts(added[:, j], edges) - bin_counts(expired[:, j], edges)
+        s.update(edges=edges, ref_counts=np.asarray(s["ref_counts"], dtype=np.int64),
+                 cur_counts=np.clip(cur, 0, None), last_week=latest)
+    return int(added.shape[0]), int(expired.shape[0])
+
+
+def refresh_drift(ref_start=None, ref_end=None, current_weeks=None, n_bins=None, rebuild=False):
+    """
+    KS / PSI cho 14 regressor giữa cửa sổ tham chiếu cố định [ref_start, ref_end)
+    (mặc định DRIFT_REFERENCE_WEEKS tuần đầu tiên của dữ liệu) và cửa sổ hiện tại
+    current_weeks tuần gần nhất. Feature liên tục chia tối đa current_weeks // 3 bin quantile;
+    status theo ngưỡng PSI 0.1 / 0.2, chỉ khi KS có ý nghĩa thống kê (α = 0.05).
+
+    Histogram (biên bin + count) lưu trong mart.data_drift_state; lần chạy sau chỉ đọc các tuần
+    mới / các tuần rơi khỏi cửa sổ để cập nhật count. Rebuild toàn bộ khi chưa có state,
+    tham số cửa sổ đổi, hoặc rebuild=True (vd. sửa dữ liệu cũ).
+    Kết quả upsert vào mart.data_drift_features (1 dòng / feature, calc_at = now()).
+    """
+    current_weeks = current_weeks or Config.DRIFT_CURRENT_WEEKS
+    n_bins = n_bins or Config.DRIFT_BINS
+
+    bounds = query_all("SELECT MIN(week_start) AS first, MAX(week_start) AS latest FROM feature.ts_features_weekly;")[0]
+    if bounds["latest"] is None:
+        raise RuntimeError("feature.ts_features_weekly is empty")
+    latest = bounds["latest"]
+    ref_start = ref_start or bounds["first"]
+    ref_end = ref_end or ref_start + timedelta(weeks=Config.DRIFT_REFERENCE_WEEKS)
+
+    state = {} if rebuild else _load_state()
+    params_changed = any(
+        name not in state
+        or (state[name]["ref_start"], state[name]["ref_end"], state[name]["current_weeks"], state[name]["n_bins"])
+        != (ref_start, ref_end, current_weeks, n_bins)
+        # state cũ chia nhiều bin hơn mức cho phép hiện tại (trước khi giới hạn theo current_weeks)
+        or (name not in FLAG_FEATURES and len(state[name]["edges"]) > effective_bins(n_bins, current_weeks) - 1)
+        for name in FEATURE_NAMES
+    )
+    stale = not params_changed and min(s["last_week"] for s in state.values()) > latest  # dữ liệu bị xóa bớt
+
+    if params_changed or stale:
+        state = _build_state(ref_start, ref_end, current_weeks, n_bins, latest)
+        mode, added, expired = "rebuild", None, None
+    else:
+        added, expired = _advance_state(state, current_weeks, latest)
+        mode = "incremental"
+
+    results = []
+    for name, feature_type, source in DRIFT_FEATURES:
+        s = state[name]
+        ks, psi = ks_psi(s["ref_counts"], s["cur_counts"])
+        ks_crit = ks_critical(int(np.sum(s["ref_counts"])), int(np.sum(s["cur_counts"])))
+        results.append((name, ks, psi, None if psi is None else drift_status(psi, ks, ks_crit),
+                        feature_type, source))
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.executemany("""
+                INSERT INTO mart.data_drift_state
+                    (feature_name, ref_start, ref_end, current_weeks, n_bins,
+                     edges, ref_counts, cur_counts, last_week, updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, now())
+                ON CONFLICT (feature_name) DO UPDATE
+                    SET ref_start = EXCLUDED.ref_start, ref_end = EXCLUDED.ref_end,
+                        current_weeks = EXCLUDED.current_weeks, n_bins = EXCLUDED.n_bins,
+                        edges = EXCLUDED.edges, ref_counts = EXCLUDED.ref_counts,
+                        cur_counts = EXCLUDED.cur_counts, last_week = EXCLUDED.last_week,
+                        updated_at = now();
+            """, [
+                (name, s["ref_start"], s["ref_end"], s["current_weeks"], s["n_bins"],
+                 [float(v) for v in s["edges"]], [int(v) for v in s["ref_counts"]],
+                 [int(v) for v in s["cur_counts"]], s["last_week"])
+                for name, s in state.items()
+            ])
+            cur.executemany("""
+                INSERT INTO mart.data_drift_features
+                    (feature_name, ks_stat, psi, status, feature_type, source, calc_at)
+                VALUES (%s, %s, %s, %s, %s, %s, now())
+                ON CONFLICT (feature_name) DO UPDATE
+                    SET ks_stat = EXCLUDED.ks_stat, psi = EXCLUDED.psi, status = EXCLUDED.status,
+                        feature_type = COALESCE(mart.data_drift_features.feature_type, EXCLUDED.feature_type),
+                        source = COALESCE(mart.data_drift_features.source, EXCLUDED.source),
+                        calc_at = EXCLUDED.calc_at;
+            """, results)
+
+    return {
+        "mode": mode,
+        "reference": [ref_start, ref_end],
+        "current": [latest - timedelta(weeks=current_weeks), latest],
+        "rows_added": added,
+        "rows_expired": expired,
+        "features": {
+            name: {"ks": None if ks is None else round(ks, 4), "psi": None if psi is None else round(psi, 4),
+                   "status": status}
+            for name, ks, psi, status, _, _ in results
+        },
+    }
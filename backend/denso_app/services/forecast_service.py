@@ -0,0 +1,285 @@
+from collections import defaultdict
+from datetime import datetime
+
+from ..db import query_all, query_columns
+from ..dimensions import dimension_cache
+
+# Không truyền start → chỉ lấy N tuần gần nhất của SKU (response không phình theo lịch sử)
+DEFAULT_FAN_WEEKS = 52
+MAX_FAN_WEEKS = 520
+
+
+def parse_fan_filters(args):
+    """
+    Filter cho fan chart từ query string:
+    country, channel, model, horizon (ngày), start / end (YYYY-MM-DD), weeks.
+    Raise ValueError nếu giá trị sai kiểu.
+    """
+    def _date(name):
+        raw = args.get(name)
+        return datetime.strptime(raw, "%Y-%m-%d").date() if raw else None
+
+    horizon = args.get("horizon")
+    weeks = int(args.get("weeks", DEFAULT_FAN_WEEKS))
+    if not 1 <= weeks <= MAX_FAN_WEEKS:
+        raise ValueError(f"weeks must be between 1 and {MAX_FAN_WEEKS}")
+
+    return {
+        "country": args.get("country") or None,
+        "channel": args.get("channel") or None,
+        "model": args.get("model") or None,
+        "horizon": int(horizon) if horizon else None,
+        "start": _date("start"),
+        "end": _date("end"),
+        "weeks": weeks,
+    }
+
+
+def fetch_products(skus=None, family=None):
+    """dim_product theo danh sách SKU hoặc theo family (vd. 'Spark Plug'), đọc từ dimension cache."""
+    return dimension_cache.get().products(skus=skus, family=family)
+
+
+def sku_object(prod_row):
+    return {
+        "code": prod_row["sku"],
+        "name": prod_row["name"],
+        "family": prod_row["family"],
+        "category": prod_row["category"],
+        "type": prod_row["type"],
+        "channel": prod_row["channel"],
+    }
+
+
+FAN_SELECT = """df.product_key,
+               df.week_start,
+               df.p10,
+               df.p50,
+               df.p90,
+               df.actual,
+               df.model_name,
+               df.horizon_days,
+               m.country,
+               m.channel"""
+
+# Cùng dữ liệu nhưng đặt tên/ép kiểu sẵn theo key của fan chart (cho query_columns)
+FAN_COLUMNS_SELECT = """to_char(df.week_start, 'YYYY-MM-DD') AS labels,
+               df.p10::float8    AS p10,
+               df.p50::float8    AS p50,
+               df.p90::float8    AS p90,
+               df.actual::float8 AS actual,
+               m.country         AS country,
+               m.channel         AS channel,
+               df.model_name     AS model,
+               df.horizon_days   AS horizon"""
+
+
+def _fan_sql(product_keys, filters, select=FAN_SELECT):
+    """
+    SQL + params cho fan chart của nhiều SKU.
+    Thứ tự điều kiện khớp index ix_forecast_product_market_model.
+    Không có start: window `weeks` tuần tính ngược từ end, hoặc (không có end) từ tuần
+    forecast mới nhất của từng SKU trong cùng filter country / channel / model / horizon.
+    """
+    clauses = ["df.product_key = ANY(%s)"]
+    params = [product_keys]
+
+    if filters["country"]:
+        clauses.append("m.country = %s")
+        params.append(filters["country"])
+    if filters["channel"]:
+        clauses.append("m.channel = %s")
+        params.append(filters["channel"])
+    if filters["model"]:
+        clauses.append("df.model_name = %s")
+        params.append(filters["model"])
+    if filters["horizon"] is not None:
+        clauses.append("df.horizon_days = %s")
+        params.append(filters["horizon"])
+
+    latest_cte = ""
+    latest_join = ""
+    if not filters["start"] and not filters["end"]:
+        latest_cte = f"""
+            WITH latest AS (
+                SELECT df.product_key, MAX(df.week_start) AS last_week
+                FROM mart.demand_forecast_weekly df
+                JOIN dim.dim_market m ON m.market_key = df.market_key
+                WHERE {" AND ".join(clauses)}
+                GROUP BY df.product_key
+            )"""
+        latest_join = "JOIN latest l ON l.product_key = df.product_key"
+        params = params + params  # CTE dùng lại đúng các filter ở trên
+
+    if filters["start"]:
+        clauses.append("df.week_start >= %s")
+        params.append(filters["start"])
+    if filters["end"]:
+        clauses.append("df.week_start <= %s")
+        params.append(filters["end"])
+    if not filters["start"]:
+        if filters["end"]:
+            clauses.append("df.week_start > %s::date - %s * 7")
+            params.extend([filters["end"], filters["weeks"]])
+        else:
+            clauses.append("df.week_start > l.last_week - %s * 7")
+            params.append(filters["weeks"])
+
+    # Mỗi lần generate_forecasts ghi 1 origin mới → cùng (SKU, market, model, tuần) có nhiều horizon;
+    # không filter horizon thì chỉ lấy origin mới nhất (horizon ngắn nhất), mỗi tuần 1 điểm / series
+    sql = f"""
+        {latest_cte}
+        SELECT DISTINCT ON (df.product_key, df.week_start, m.country, m.channel, df.model_name)
+               {select}
+        FROM mart.demand_forecast_weekly df
+        JOIN dim.dim_market m ON m.market_key = df.market_key
+        {latest_join}
+        WHERE {" AND ".join(clauses)}
+        ORDER BY df.product_key, df.week_start, m.country, m.channel, df.model_name,
+                 df.horizon_days, df.forecast_key DESC;
+    """
+    return sql, params
+
+
+def _group_by_product(rows):
+    grouped = defaultdict(list)
+    for r in rows:
+        grouped[r["product_key"]].append(r)
+    return grouped
+
+
+def shape_fan(rows):
+    if not rows:
+        return None
+    return {
+        "labels": [row["week_start"].strftime("%Y-%m-%d") for row in rows],
+        "p10": [float(row["p10"]) for row in rows],
+        "p50": [float(row["p50"]) for row in rows],
+        "p90": [float(row["p90"]) for row in rows],
+        "actual": [float(row["actual"]) if row["actual"] is not None else None for row in rows],
+        # cho biết mỗi điểm thuộc series nào khi không filter country/channel/model
+        "country": [row["country"] for row in rows],
+        "channel": [row["channel"] for row in rows],
+        "model": [row["model_name"] for row in rows],
+        "horizon": [row["horizon_days"] for row in rows],
+    }
+
+
+def shape_components(rows):
+    if not rows:
+        return None
+    return {
+        "labels": [r["week_start"].strftime("%Y-%m-%d") for r in rows],
+        "trend": [float(r["trend"]) for r in rows],
+        "weekly": [float(r["weekly"]) for r in rows],
+        "yearly": [float(r["yearly"]) for r in rows],
+        "holidays": [float(r["holidays"]) for r in rows],
+    }
+
+
+def shape_regressors(rows):
+    if not rows:
+        return None
+    return [{"name": r["feature"], "status": r["status"]} for r in rows]
+
+
+def shape_shap_global(rows):
+    if not rows:
+        return None
+    return [{"feature": r["feature"], "importance": float(r["importance"])} for r in rows]
+
+
+def shape_shap_local(rows):
+    """rows sắp xếp explanation_date DESC; chỉ giữ ngày giải thích mới nhất."""
+    if not rows:
+        return None
+    latest = rows[0]["explanation_date"]
+    return {
+        "date": latest.strftime("%Y-%m-%d"),
+        "items": [
+            {"feature": r["feature"], "value": None, "impact": float(r["impact"])}
+            for r in rows if r["explanation_date"] == latest
+        ],
+    }
+
+
+def fetch_forecast_bundles(products, filters, include_series=True):
+    """
+    Forecast bundle (fan, components, shap_global, shap_local) cho nhiều SKU.
+    Mỗi bảng mart chỉ 1 query set-based (product_key = ANY(%s)), nên số query
+    không đổi dù mở 1 SKU hay cả family.
+
+    Trả về (bundles theo product_key, regressors dùng chung); section nào
+    không có dữ liệu thì là None để API tự quyết định fallback.
+    include_series=False bỏ qua fan/components (đã lấy dạng cột qua fetch_forecast_columns).
+    """
+    product_keys = [p["product_key"] for p in products]
+    if not product_keys:
+        return {}, None
+
+    fan_rows, comp_rows = {}, {}
+    if include_series:
+        fan_sql, fan_params = _fan_sql(product_keys, filters)
+        fan_rows = _group_by_product(query_all(fan_sql, fan_params))
+
+        comp_rows = _group_by_product(query_all("""
+            SELECT product_key, week_start, trend, weekly, yearly, holidays
+            FROM mart.prophet_components
+            WHERE product_key = ANY(%s)
+            ORDER BY product_key, week_start;
+        """, (product_keys,)))
+
+    reg_rows = query_all("""
+        SELECT feature, status, last_update
+        FROM mart.regressor_status
+        ORDER BY feature;
+    """)
+
+    shap_g_rows = _group_by_product(query_all("""
+        SELECT product_key, feature, importance
+        FROM mart.shap_global
+        WHERE product_key = ANY(%s)
+        ORDER BY product_key, importance DESC;
+    """, (product_keys,)))
+
+    shap_l_rows = _group_by_product(query_all("""
+        SELECT product_key, explanation_date, feature, impact
+        FROM mart.shap_local
+        WHERE product_key = ANY(%s)
+        ORDER BY product_key, explanation_date DESC;
+    """, (product_keys,)))
+
+    bundles = {}
+    for p in products:
+        pk = p["product_key"]
+        bundles[pk] = {
+            "sku": sku_object(p),
+            "fan": shape_fan(fan_rows.get(pk)),
+            "components": shape_components(comp_rows.get(pk)),
+            "shap_global": shape_shap_global(shap_g_rows.get(pk)),
+            "shap_local": shape_shap_local(shap_l_rows.get(pk)),
+        }
+
+    return bundles, shape_regressors(reg_rows)
+
+
+def fetch_forecast_columns(product, filters):
+    """
+    Fan chart + Prophet components của 1 SKU dạng cột, lấy thẳng từ DB
+    (không qua RealDictCursor / float() từng ô) cho các format columnar/f32/arrow.
+    """
+    pk = product["product_key"]
+    fan_sql, fan_params = _fan_sql([pk], filters, select=FAN_COLUMNS_SELECT)
+
+    components = query_columns("""
+        SELECT to_char(week_start, 'YYYY-MM-DD') AS labels,
+               trend::float8    AS trend,
+               weekly::float8   AS weekly,
+               yearly::float8   AS yearly,
+               holidays::float8 AS holidays
+        FROM mart.prophet_components
+        WHERE product_key = %s
+        ORDER BY week_start;
+    """, (pk,))
+
+    return {"fan": query_columns(fan_sql, fan_params), "components": components}
@@ -0,0 +1,287 @@
+import uuid
+from datetime import date
+from statistics import NormalDist
+
+import numpy as np
+
+from ..db import execute_values, query_all
+
+# z của P90 (P10/P90 là quantile 10% / 90% của phân phối chuẩn) để suy ra σ tuần
+Z_P90 = NormalDist().inv_cdf(0.90)
+
+DEFAULT_SERVICE_LEVEL = 0.95
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_REVIEW_DAYS = 7
+DEFAULT_MOQ = 24
+MAX_PROTECTION_WEEKS = 52
+
+
+def z_scores(service_levels):
+    """Quantile chuẩn chính xác (inverse CDF) cho từng service level; tính 1 lần / giá trị khác nhau."""
+    levels = np.asarray(service_levels, dtype=float)
+    if ((levels <= 0) | (levels >= 1)).any():
+        raise ValueError("service_level must be strictly between 0 and 1")
+    uniq, inverse = np.unique(levels, return_inverse=True)
+    z = np.array([NormalDist().inv_cdf(p) for p in uniq])
+    return z[inverse].reshape(levels.shape)
+
+
+def fetch_demand_matrix(weeks, product_keys=None, country=None, channel=None, model=None, as_of=None):
+    """
+    P10/P50/P90 theo tuần cho mọi (SKU × market), 1 query.
+    Mỗi series lấy `weeks` tuần gần as_of nhất, ưu tiên các tuần từ as_of trở đi
+    (series chỉ có forecast cũ → lấy `weeks` tuần cuối cùng).
+    Mỗi (SKU, market, tuần) chọn horizon ngắn nhất / bản ghi mới nhất.
+
+    Trả về (series, p10, p50, p90): series là list dict (product_key, market_key, sku, country, channel),
+    các ma trận shape (N, weeks) xếp theo thứ tự ưu tiên ở trên: các tuần từ as_of trở đi tăng dần
+    (cột 0 = tuần sắp tới, khoảng bảo vệ của compute_policies tính trên đó), sau đó các tuần cũ bù vào
+    giảm dần; thiếu → NaN.
+    """
+    clauses = ["df.p50 IS NOT NULL"]
+    params = {"as_of": as_of or date.today(), "weeks": weeks}
+    if product_keys is not None:
+        clauses.append("df.product_key = ANY(%(product_keys)s)")
+        params["product_keys"] = list(product_keys)
+    if country:
+        clauses.append("m.country = %(country)s")
+        params["country"] = country
+    if channel:
+        clauses.append("m.channel = %(channel)s")
+        params["channel"] = channel
+    if model:
+        clauses.append("df.model_name = %(model)s")
+        params["model"] = model
+
+    rows = query_all(f"""
+        WITH src AS (
+            SELECT DISTINCT ON (df.product_key, df.market_key, df.week_start)
+                   df.product_key, df.market_key, df.week_start,
+                   df.p10::float8 AS p10, df.p50::float8 AS p50, df.p90::float8 AS p90
+            FROM mart.demand_forecast_weekly df
+            JOIN dim.dim_market m ON m.market_key = df.market_key
+            WHERE {" AND ".join(clauses)}
+            ORDER BY df.product_key, df.market_key, df.week_start, df.horizon_days, df.forecast_key DESC
+        ),
+        ranked AS (
+            SELECT src.*,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY product_key, market_key
+                       ORDER BY (week_start >= %(as_of)s) DESC,
+                                CASE WHEN week_start >= %(as_of)s THEN week_start END ASC,
+                                week_start DESC
+                   ) AS rn
+            FROM src
+        )
+        SELECT r.product_key, r.market_key, r.week_start, r.p10, r.p50, r.p90,
+               p.sku, m.country, m.channel
+        FROM ranked r
+        JOIN dim.dim_product p ON p.product_key = r.product_key
+        JOIN dim.dim_market m ON m.market_key = r.market_key
+        WHERE r.rn <= %(weeks)s
+        ORDER BY p.sku, m.country, m.channel, r.rn;
+    """, params)
+
+    series = []
+    index = {}
+    col = {}
+    for r in rows:
+        key = (r["product_key"], r["market_key"])
+        if key not in index:
+            index[key] = len(series)
+            col[key] = 0
+            series.append({
+                "product_key": r["product_key"],
+                "market_key": r["market_key"],
+                "sku": r["sku"],
+                "country": r["country"],
+                "channel": r["channel"],
+            })
+
+    shape = (len(series), weeks)
+    p10, p50, p90 = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+    for r in rows:
+        key = (r["product_key"], r["market_key"])
+        i, k = index[key], col[key]
+        col[key] = k + 1
+        p10[i, k] = np.nan if r["p10"] is None else r["p10"]
+        p50[i, k] = r["p50"]
+        p90[i, k] = np.nan if r["p90"] is None else r["p90"]
+
+    return series, p10, p50, p90
+
+
+def weekly_sigma(p10, p50, p90):
+    """σ tuần từ khoảng P10–P90 (hoặc P50–P90 nếu thiếu P10), giả định phân phối chuẩn."""
+    sigma = np.where(np.isnan(p10), (p90 - p50) / Z_P90, (p90 - p10) / (2 * Z_P90))
+    return np.clip(np.nan_to_num(sigma, nan=0.0), 0.0, None)
+
+
+def compute_policies(p10, p50, p90, service_level, lead_time_days, review_days, on_hand, on_order, moq):
+    """
+    Chính sách order-up-to (base stock) cho N series trong 1 lần tính vectorized.
+
+    p10 / p50 / p90: (N, H) theo tuần; các tham số còn lại là scalar hoặc (N,).
+    Khoảng bảo vệ T = (lead_time + review) / 7 tuần (có thể lẻ); tuần cuối được tính theo tỉ lệ.
+    Tuần thiếu forecast (H ngắn hơn T hoặc NaN) dùng trung bình các tuần có dữ liệu của series.
+        μ_T = Σ w_k · P50_k          σ_T = sqrt(Σ w_k · σ_k²)   (tuần độc lập)
+        safety = z(service_level) · σ_T,  S = μ_T + safety
+        PO = max(0, S − on_hand − on_order), làm tròn lên bội số MOQ
+    """
+    n, h = p50.shape
+
+    def as_col(v):
+        return np.broadcast_to(np.asarray(v, dtype=float), (n,))
+
+    protection_weeks = (as_col(lead_time_days) + as_col(review_days)) / 7.0
+    weights = np.clip(protection_weeks[:, None] - np.arange(h)[None, :], 0.0, 1.0)  # (N, H)
+
+    missing = np.isnan(p50)
+    mu_week = np.where(missing, np.nanmean(p50, axis=1, keepdims=True), p50)
+    sigma = np.where(missing, np.nan, weekly_sigma(p10, p50, p90))
+    var_week = np.where(missing, np.nanmean(sigma, axis=1, keepdims=True) ** 2, sigma ** 2)
+
+    mu_t = (weights * mu_week).sum(axis=1)
+    sigma_t = np.sqrt((weights * var_week).sum(axis=1))
+
+    z = z_scores(as_col(service_level))
+    safety = np.ceil(np.maximum(z * sigma_t, 0.0))
+    base_stock = np.ceil(mu_t) + safety
+
+    raw_po = np.maximum(base_stock - as_col(on_hand) - as_col(on_order), 0.0)
+    lot = np.maximum(as_col(moq), 1.0)
+    po = np.ceil(raw_po / lot) * lot
+
+    return {
+        "demand_lt_mean": mu_t,
+        "demand_lt_std": sigma_t,
+        "z_score": z,
+        "safety_stock": safety,
+        "base_stock": base_stock,
+        "po_recommend": po,
+    }
+
+
+def protection_weeks_needed(lead_time_days, review_days):
+    weeks = int(np.ceil((np.max(lead_time_days) + np.max(review_days)) / 7.0))
+    if not 1 <= weeks <= MAX_PROTECTION_WEEKS:
+        raise ValueError(f"lead_time + review must be between 1 and {MAX_PROTECTION_WEEKS * 7} days")
+    return weeks
+
+
+def persist_policies(series, inputs, result):
+    """Ghi toàn bộ policy của 1 lần chạy vào mart.inventory_policy_log (1 transaction); trả về run_id."""
+    run_id = str(uuid.uuid4())
+    n = len(series)
+    cols = {name: np.broadcast_to(np.asarray(v, dtype=float), (n,)) for name, v in inputs.items()}
+
+    rows = [
+        (
+            run_id, s["product_key"], s["market_key"],
+            float(cols["service_level"][i]), int(cols["lead_time_days"][i]), int(cols["review_days"][i]),
+            float(result["demand_lt_mean"][i]), float(result["demand_lt_std"][i]), float(result["z_score"][i]),
+            float(result["safety_stock"][i]), float(result["base_stock"][i]),
+            float(cols["on_hand"][i]), float(cols["on_order"][i]), int(cols["moq"][i]),
+            float(result["po_recommend"][i]),
+        )
+        for i, s in enumerate(series)
+    ]
+    execute_values("""
+        INSERT INTO mart.inventory_policy_log
+            (run_id, product_key, market_key, service_level, lead_time_days, review_days,
+             demand_lt_mean, demand_lt_std, z_score, safety_stock, base_stock,
+             on_hand, on_order, moq, po_recommend)
+        VALUES %s;
+    """, rows)
+    return run_id
+
+
+def draw_demand(p10, p50, p90, n_paths, rng):
+    """
+    Sample path nhu cầu (N, paths, W) từ quantile forecast: split-normal khớp đúng
+    P10 / P50 / P90 (σ trái = (P50−P10)/z90, σ phải = (P90−P50)/z90), cắt dưới tại 0.
+    Tuần thiếu forecast dùng trung bình các tuần có dữ liệu của series.
+    """
+    missing = np.isnan(p50)
+    p50 = np.where(missing, np.nanmean(p50, axis=1, keepdims=True), p50)
+    sigma_hi = np.clip(np.nan_to_num((p90 - p50) / Z_P90), 0.0, None)
+    sigma_lo = np.where(np.isnan(p10), sigma_hi, np.clip(np.nan_to_num((p50 - p10) / Z_P90), 0.0, None))
+    sigma_hi = np.where(missing, np.nanmean(np.where(missing, np.nan, sigma_hi), axis=1, keepdims=True), sigma_hi)
+    sigma_lo = np.where(missing, np.nanmean(np.where(missing, np.nan, sigma_lo), axis=1, keepdims=True), sigma_lo)
+
+    z = rng.standard_normal((p50.shape[0], n_paths, p50.shape[1]))
+    sigma = np.where(z < 0, sigma_lo[:, None, :], sigma_hi[:, None, :])
+    return np.maximum(p50[:, None, :] + z * sigma, 0.0)
+
+
+def simulate_inventory(demand, base_stock, on_hand, on_order, lead_time_days, review_days, moq, holding_cost):
+    """
+    Mô phỏng chính sách order-up-to trên mọi sample path cùng lúc.
+
+    demand: (N, paths, W). Các tham số còn lại scalar hoặc (N,).
+    Mỗi tuần: nhận hàng về → tuần review thì đặt max(0, S − tồn − đang về) làm tròn MOQ,
+    về sau L = round(lead_time/7) tuần → bán min(tồn, nhu cầu) (thiếu thì mất doanh số, không backorder).
+    Lượng on_order ban đầu giả định về sau ceil(L/2) tuần.
+
+    Trả về dict các chỉ số (N,): fill_rate, stockout_prob (≥1 tuần thiếu hàng trong horizon),
+    stockout_week_prob, expected_lost_sales, avg_on_hand, expected_holding_cost, expected_orders.
+    """
+    n, paths, weeks = demand.shape
+    rows = np.arange(n)
+
+    def as_vec(v):
+        return np.broadcast_to(np.asarray(v, dtype=float), (n,))
+
+    lead = np.rint(as_vec(lead_time_days) / 7.0).astype(int)
+    review = np.maximum(np.rint(as_vec(review_days) / 7.0).astype(int), 1)
+    s_level = as_vec(base_stock)[:, None]
+    lot = np.maximum(as_vec(moq), 1.0)[:, None]
+    h_cost = as_vec(holding_cost)[:, None]
+
+    # pipeline[:, k, :] = hàng về đầu tuần (t + k), t là tuần đang xét
+    pipeline = np.zeros((n, int(lead.max()) + 1, paths))
+    pipeline[rows, (lead + 1) // 2] += as_vec(on_order)[:, None]
+    arrive_now = lead == 0
+    order_slot = np.maximum(lead - 1, 0)
+
+    stock = np.repeat(as_vec(on_hand)[:, None], paths, axis=1)
+    sold = np.zeros((n, paths))
+    short_weeks = np.zeros((n, paths))
+    holding = np.zeros((n, paths))
+    stock_sum = np.zeros((n, paths))
+    orders = np.zeros((n, paths))
+
+    for t in range(weeks):
+        stock += pipeline[:, 0]
+        pipeline[:, :-1] = pipeline[:, 1:]
+        pipeline[:, -1] = 0.0
+
+        review_now = (t % review == 0)[:, None]
+        position = stock + pipeline.sum(axis=1)
+        qty = np.ceil(np.maximum(s_level - position, 0.0) / lot) * lot
+        qty = np.where(review_now, qty, 0.0)
+        stock += np.where(arrive_now[:, None], qty, 0.0)
+        pipeline[rows, order_slot] += np.where(arrive_now[:, None], 0.0, qty)
+        orders += qty > 0
+
+        d = demand[:, :, t]
+        sales = np.minimum(stock, d)
+        stock -= sales
+        sold += sales
+        short_weeks += d > sales + 1e-9
+
+        holding += stock * h_cost
+        stock_sum += stock
+
+    total_demand = demand.sum(axis=2)
+    demand_all = total_demand.sum(axis=1)
+    fill = np.divide(sold.sum(axis=1), demand_all, out=np.ones(n), where=demand_all > 0)
+    return {
+        "fill_rate": fill,
+        "stockout_prob": (short_weeks > 0).mean(axis=1),
+        "stockout_week_prob": short_weeks.mean(axis=1) / weeks,
+        "expected_lost_sales": (total_demand - sold).mean(axis=1),
+        "avg_on_hand": stock_sum.mean(axis=1) / weeks,
+        "expected_holding_cost": holding.mean(axis=1),
+        "expected_orders": orders.mean(axis=1),
+    }
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from ..db import query_all
+
+# Snapshot mới nhất theo từng region (port: theo từng cảng) bằng DISTINCT ON,
+# đi theo index (region, as_of_date DESC) trong schema.sql mục 7 → 1 lần quét index
+# cho mỗi bảng thay vì subquery MAX(as_of_date) chạy lại cho từng row.
+SNAPSHOT_SQL = {
+    "price": """
+        SELECT DISTINCT ON (region)
+               region, sku, avg_price, competitor_price, price_trend, market_share, as_of_date
+        FROM mart.market_price_region
+        WHERE as_of_date IS NOT NULL
+        ORDER BY region, as_of_date DESC, price_id DESC;
+    """,
+    "weather": """
+        SELECT DISTINCT ON (region)
+               region, condition, temperature, humidity, impact_score, as_of_date
+        FROM mart.market_weather_region
+        WHERE as_of_date IS NOT NULL
+        ORDER BY region, as_of_date DESC, weather_id DESC;
+    """,
+    "port": """
+        SELECT DISTINCT ON (name)
+               name, region, congestion_pct, as_of_date
+        FROM mart.port_congestion
+        WHERE as_of_date IS NOT NULL
+        ORDER BY name, as_of_date DESC, port_id DESC;
+    """,
+    "warehouse": """
+        SELECT DISTINCT ON (region)
+               region, capacity, current_stock, as_of_date
+        FROM mart.warehouse_status
+        WHERE as_of_date IS NOT NULL
+        ORDER BY region, as_of_date DESC, warehouse_id DESC;
+    """,
+}
+
+# 4 query độc lập → chạy song song, mỗi query mượn 1 connection riêng từ pool
+_executor = ThreadPoolExecutor(max_workers=len(SNAPSHOT_SQL), thread_name_prefix="market-snapshot")
+
+
+def fetch_market_snapshot():
+    """Trả về {"price" | "weather" | "port" | "warehouse": list[dict]}; lỗi của query nào thì raise lại."""
+    futures = {name: _executor.submit(query_all, sql) for name, sql in SNAPSHOT_SQL.items()}
+    return {name: fut.result() for name, fut in futures.items()}
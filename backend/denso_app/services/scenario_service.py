@@ -0,0 +1,172 @@
+import numpy as np
+
+from ..db import query_all
+from ..dimensions import dimension_cache
+
+# Hệ số mặc định khi SKU chưa có dòng trong mart.scenario_elasticity
+DEFAULT_BETAS = (-0.85, 0.75, 0.18)  # price, promo, ad_spend
+DEFAULT_BASELINE = 135.0
+MARGIN_RATE = 0.32
+
+LEVERS = ("price_delta", "promo_depth", "ad_spend")
+MAX_LEVER_STEPS = 201
+MAX_GRID_POINTS = 2_000_000  # số SKU × số tổ hợp lever
+MAX_SURFACE_POINTS = 200_000  # trần SKU × số tổ hợp lever khi trả surface từng SKU (JSON)
+
+
+def lever_values(spec, name):
+    """
+    Giá trị của 1 lever từ body request:
+      - số              → 1 điểm
+      - [v1, v2, ...]   → lưới tự chọn
+      - {"min", "max", "steps"} → linspace
+    Raise ValueError nếu sai.
+    """
+    if spec is None:
+        values = np.zeros(1)
+    elif isinstance(spec, (int, float)):
+        values = np.array([spec], dtype=float)
+    elif isinstance(spec, list):
+        values = np.asarray(spec, dtype=float)
+    elif isinstance(spec, dict):
+        steps = int(spec.get("steps", 11))
+        if not 1 <= steps <= MAX_LEVER_STEPS:
+            raise ValueError(f"{name}.steps must be between 1 and {MAX_LEVER_STEPS}")
+        values = np.linspace(float(spec["min"]), float(spec["max"]), steps)
+    else:
+        raise ValueError(f"{name} must be a number, a list or {{min, max, steps}}")
+
+    if values.ndim != 1 or not 1 <= values.size <= MAX_LEVER_STEPS or not np.isfinite(values).all():
+        raise ValueError(f"{name} must have 1..{MAX_LEVER_STEPS} finite values")
+    return values
+
+
+def fetch_baselines(product_keys, country=None, channel=None, model=None):
+    """
+    Baseline = P50 của tuần forecast mới nhất (horizon ngắn nhất) cho từng (SKU, market),
+    cộng theo SKU trên các market khớp country / channel / model (None = mọi market, nên baseline
+    là tổng toàn SKU). Trả về {product_key: baseline}; SKU chưa có forecast thì không có key.
+    """
+    clauses = ["df.product_key = ANY(%s)"]
+    params = [list(product_keys)]
+    if country:
+        clauses.append("m.country = %s")
+        params.append(country)
+    if channel:
+        clauses.append("m.channel = %s")
+        params.append(channel)
+    if model:
+        clauses.append("df.model_name = %s")
+        params.append(model)
+
+    rows = query_all(f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (df.product_key, df.market_key)
+                   df.product_key, df.p50
+            FROM mart.demand_forecast_weekly df
+            JOIN dim.dim_market m ON m.market_key = df.market_key
+            WHERE {" AND ".join(clauses)}
+              AND df.p50 IS NOT NULL
+            ORDER BY df.product_key, df.market_key, df.week_start DESC, df.horizon_days, df.forecast_key DESC
+        )
+        SELECT product_key, SUM(p50)::float8 AS baseline
+        FROM latest
+        GROUP BY product_key;
+    """, params)
+    return {r["product_key"]: r["baseline"] for r in rows}
+
+
+def fetch_betas(product_keys):
+    """
+    {product_key: (beta_price, beta_promo, beta_ad_spend)} từ mart.scenario_elasticity
+    (qua dimension cache); beta NULL → DEFAULT_BETAS, SKU chưa có dòng thì không có key.
+    """
+    betas = dimension_cache.get().betas
+    return {
+        k: tuple(d if v is None else v for v, d in zip(betas[k], DEFAULT_BETAS))
+        for k in product_keys
+        if k in betas
+    }
+
+
+def evaluate_grid(baselines, betas, price_delta, promo_depth, ad_spend,
+                  unit_cost_ratio=1 - MARGIN_RATE, ad_cost=0.0):
+    """
+    Đánh giá mọi tổ hợp lever cho mọi SKU trong 1 lần broadcast NumPy.
+
+    baselines: (S,)   betas: (S, 3)   price_delta / promo_depth / ad_spend: (P,), (R,), (A,)
+    Trả về (forecast, margin), shape (S, P, R, A).
+
+    /scenario/whatif gọi hàm này với 1 điểm lever nên 2 endpoint luôn cho cùng kết quả:
+        fc = baseline · (1 + Δp/100 · β_price) · (1 + promo · β_promo) · (1 + ad · β_ad)
+    Margin tính trên giá chuẩn hóa (giá hiện tại = 1, giá vốn = unit_cost_ratio):
+        margin = fc · ((1 + Δp/100)(1 − promo) − unit_cost_ratio) − ad · ad_cost
+    Tại điểm gốc (0, 0, 0) margin = fc · (1 − unit_cost_ratio) = fc · 0.32 với tham số mặc định.
+    """
+    base = np.asarray(baselines, dtype=float)[:, None, None, None]
+    b = np.asarray(betas, dtype=float)
+    b_price = b[:, 0, None, None, None]
+    b_promo = b[:, 1, None, None, None]
+    b_ad = b[:, 2, None, None, None]
+
+    price = np.asarray(price_delta, dtype=float)[None, :, None, None]
+    promo = np.asarray(promo_depth, dtype=float)[None, None, :, None]
+    ad = np.asarray(ad_spend, dtype=float)[None, None, None, :]
+
+    fc = base * (1 + price / 100.0 * b_price) * (1 + promo * b_promo) * (1 + ad * b_ad)
+    fc = np.maximum(fc, 0.0)
+
+    unit_margin = (1 + price / 100.0) * (1 - promo) - unit_cost_ratio
+    margin = fc * unit_margin - ad * ad_cost
+    return fc, margin
+
+
+def _point(levers, idx, fc, margin):
+    p, r, a = idx
+    return {
+        "price_delta": round(float(levers[0][p]), 4),
+        "promo_depth": round(float(levers[1][r]), 4),
+        "ad_spend": round(float(levers[2][a]), 4),
+        "forecast": round(float(fc[idx]), 2),
+        "margin": round(float(margin[idx]), 2),
+    }
+
+
+def summarize_grid(skus, baselines, betas, levers, fc, margin, include_sku_surfaces=False):
+    """
+    Response surface tổng (cộng theo SKU, cùng mức lever cho cả danh mục),
+    điểm tối ưu margin của danh mục và của từng SKU.
+    """
+    total_fc = fc.sum(axis=0)
+    total_margin = margin.sum(axis=0)
+    best = np.unravel_index(np.argmax(total_margin), total_margin.shape)
+
+    # argmax từng SKU trên lưới đã làm phẳng, vẫn vectorized
+    flat_best = margin.reshape(len(skus), -1).argmax(axis=1)
+    per_sku = []
+    for s, sku in enumerate(skus):
+        idx = np.unravel_index(flat_best[s], margin.shape[1:])
+        item = {
+            "sku": sku,
+            "baseline": round(float(baselines[s]), 2),
+            "betas": dict(zip(LEVERS, (round(float(v), 4) for v in betas[s]))),
+            "optimal": _point(levers, idx, fc[s], margin[s]),
+        }
+        if include_sku_surfaces:
+            item["surface"] = {
+                "forecast": np.round(fc[s], 2).tolist(),
+                "margin": np.round(margin[s], 2).tolist(),
+            }
+        per_sku.append(item)
+
+    return {
+        "levers": {name: values.tolist() for name, values in zip(LEVERS, levers)},
+        # surface[i][j][k] ứng với (price_delta[i], promo_depth[j], ad_spend[k])
+        "surface": {
+            "forecast": np.round(total_fc, 2).tolist(),
+            "margin": np.round(total_margin, 2).tolist(),
+        },
+        "optimal": _point(levers, best, total_fc, total_margin),
+        "per_sku": per_sku,
+        "points": int(fc.size),
+    }
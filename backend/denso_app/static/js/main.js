@@ -171,13 +171,53 @@ function lockPageIfNoPerm(navKey) {
 }
 
 // ========== API HELPER ==========
+// Body của GET được giữ lại theo ETag; lần gọi sau gửi If-None-Match,
+// server trả 304 thì dùng lại body cũ (không tải / parse lại JSON).
+// LRU theo thứ tự chèn của Map: path mới dùng được đưa về cuối, vượt
+// API_CACHE_MAX_ENTRIES thì bỏ path đầu (lâu chưa dùng nhất) — tránh phình
+// khi lọc / phân trang sinh ra nhiều query string khác nhau.
+const API_CACHE_MAX_ENTRIES = 50;
+const apiCache = new Map();
+
+function apiCacheGet(path) {
+    const entry = apiCache.get(path);
+    if (entry) {
+        apiCache.delete(path);
+        apiCache.set(path, entry);
+    }
+    return entry;
+}
+
+function apiCacheSet(path, entry) {
+    apiCache.delete(path);
+    apiCache.set(path, entry);
+    while (apiCache.size > API_CACHE_MAX_ENTRIES) {
+        apiCache.delete(apiCache.keys().next().value);
+    }
+}
+
 async function api(path, options = {}) {
+    const method = (options.method || "GET").toUpperCase();
+    const cached = method === "GET" ? apiCacheGet(path) : null;
     try {
         const res = await fetch(path, {
             ...options,
-            headers: { "Content-Type": "application/json", ...options.headers }
+            cache: "no-store",
+            headers: {
+                "Content-Type": "application/json",
+                ...(cached ? { "If-None-Match": cached.etag } : {}),
+                ...options.headers
+            }
         });
-        return await res.json();
+        if (res.status === 304 && cached) {
+            return structuredClone(cached.body);
+        }
+        const body = await res.json();
+        const etag = res.headers.get("ETag");
+        if (method === "GET" && res.ok && etag) {
+            apiCacheSet(path, { etag, body: structuredClone(body) });
+        }
+        return body;
     } catch (err) {
         console.error("API Error:", err);
         return null;
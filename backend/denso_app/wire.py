@@ -0,0 +1,159 @@
+import gzip
+import json
+import struct
+import sys
+from array import array
+
+from flask import current_app, jsonify
+
+try:  # optional: chỉ cần khi client xin format=arrow
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:  # optional: không có thì nén bằng gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# json     : payload cũ (list/dict lồng nhau), mặc định
+# columnar : JSON nhưng mỗi bảng là {cột: [giá trị...]}
+# f32      : binary, cột số đóng gói float32 little-endian (xem pack_f32)
+# arrow    : Arrow IPC stream của 1 bảng (cần pyarrow)
+FORMATS = ("json", "columnar", "f32", "arrow")
+
+F32_MAGIC = b"DNF1"
+F32_MIMETYPE = "application/x-denso-f32"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+COMPRESSIBLE_MIMETYPES = {"application/json", F32_MIMETYPE, ARROW_MIMETYPE}
+
+
+def parse_format(args):
+    """Đọc ?format=...; raise ValueError nếu không hỗ trợ."""
+    fmt = (args.get("format") or "json").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt == "arrow" and pa is None:
+        raise ValueError("format=arrow requires pyarrow on the server")
+    return fmt
+
+
+def _dtype(values):
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return "f32"
+    if kinds == {bool}:
+        return "bool"
+    if kinds <= {int, float}:
+        return "f32"
+    return "str"
+
+
+def _le_bytes(arr):
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def pack_f32(tables, meta=None):
+    """
+    Layout binary:
+        b"DNF1" | uint32 LE độ dài header | header JSON (utf-8, pad tới bội số 4) | các block cột
+    Header: {"meta": ..., "tables": {tên: {"length": n, "columns": {cột: spec}}}}
+      - spec {"dtype": "f32", "offset": o}  → n float32 LE tại byte o của phần block (None = NaN)
+      - spec {"dtype": "bool", "offset": o} → n uint8
+      - spec {"dtype": "str", "values": [...]} → giá trị nằm luôn trong header (labels, country...)
+    Client đọc bằng new Float32Array(buf, dataStart + offset, n).
+    """
+    nan = float("nan")
+    header_tables = {}
+    blocks = []
+    offset = 0
+
+    for name, columns in tables.items():
+        length = len(next(iter(columns.values()), []))
+        specs = {}
+        for col, values in columns.items():
+            dtype = _dtype(values)
+            if dtype == "str":
+                specs[col] = {"dtype": "str", "values": list(values)}
+                continue
+
+            if dtype == "bool":
+                block = _le_bytes(array("B", (1 if v else 0 for v in values)))
+            else:
+                block = _le_bytes(array("f", (nan if v is None else v for v in values)))
+            block += b"\0" * (-len(block) % 4)
+
+            specs[col] = {"dtype": dtype, "offset": offset}
+            blocks.append(block)
+            offset += len(block)
+
+        header_tables[name] = {"length": length, "columns": specs}
+
+    header = json.dumps({"meta": meta, "tables": header_tables}, default=str).encode("utf-8")
+    header += b" " * (-len(header) % 4)
+    return F32_MAGIC + struct.pack("<I", len(header)) + header + b"".join(blocks)
+
+
+def pack_arrow(columns, meta=None):
+    """1 bảng → Arrow IPC stream; meta (JSON) nằm trong schema metadata key 'meta'."""
+    table = pa.table({col: list(values) for col, values in columns.items()})
+    if meta is not None:
+        table = table.replace_schema_metadata({"meta": json.dumps(meta, default=str)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def columnar_response(fmt, tables, meta=None, table=None):
+    """
+    Response cho format != json.
+    `tables` là {tên bảng: {cột: list giá trị}}, thường lấy thẳng từ db.query_columns().
+    Với arrow chỉ trả về 1 bảng (`table`, mặc định bảng đầu tiên) vì 1 IPC stream chỉ có 1 schema.
+    """
+    if fmt == "columnar":
+        return jsonify({"meta": meta, "tables": tables})
+
+    if fmt == "f32":
+        return current_app.response_class(pack_f32(tables, meta), mimetype=F32_MIMETYPE)
+
+    if fmt == "arrow":
+        name = table or next(iter(tables))
+        if name not in tables:
+            resp = jsonify({"ok": False, "message": f"Unknown table '{name}', expected one of {list(tables)}"})
+            resp.status_code = 400
+            return resp
+        resp = current_app.response_class(pack_arrow(tables[name], meta), mimetype=ARROW_MIMETYPE)
+        resp.headers["X-Arrow-Table"] = name
+        return resp
+
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def negotiate_encoding(request, response):
+    """Chọn br / gzip theo Accept-Encoding; None nếu không nên nén response này."""
+    if (
+        "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or response.content_length is None
+        or response.content_length < current_app.config["API_COMPRESS_MIN_BYTES"]
+    ):
+        return None
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=current_app.config["API_BROTLI_QUALITY"])
+    return gzip.compress(body, compresslevel=current_app.config["API_GZIP_LEVEL"])
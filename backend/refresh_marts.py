@@ -0,0 +1,111 @@
+"""
+Các bước pipeline cập nhật bảng mart.* từ dữ liệu đã có trong DB (chạy bằng cron / sau generate_forecasts).
+
+    cd backend
+    python refresh_marts.py counterfactual            # chỉ campaign có đầu vào thay đổi
+    python refresh_marts.py counterfactual --force    # tính lại toàn bộ
+    python refresh_marts.py counterfactual --dry-run  # chỉ in ra, không ghi
+    python refresh_marts.py drift                     # KS / PSI 14 regressor (tăng dần theo tuần mới)
+    python refresh_marts.py drift --rebuild --reference 2023-01-02:2024-01-01
+    python refresh_marts.py actuals                   # fact_sales_weekly.units_sold → demand_forecast_weekly.actual
+    python refresh_marts.py actuals --since 2025-01-06
+    python refresh_marts.py metrics                   # trạng thái accuracy mart (cập nhật bằng trigger)
+    python refresh_marts.py metrics --rebuild         # tính lại tổng chạy từ toàn bộ forecast có actual
+
+Mỗi bước in ra thống kê dạng JSON.
+"""
+import argparse
+import json
+import time
+from datetime import date
+
+from denso_app.db import execute_sql, query_one
+from denso_app.services.campaign_service import refresh_counterfactuals
+from denso_app.services.drift_service import refresh_drift
+
+
+def run_counterfactual(args):
+    return refresh_counterfactuals(force=args.force, dry_run=args.dry_run)
+
+
+def run_drift(args):
+    ref_start = ref_end = None
+    if args.reference:
+        start, end = args.reference.split(":")
+        ref_start, ref_end = date.fromisoformat(start), date.fromisoformat(end)
+    return refresh_drift(ref_start, ref_end, args.current_weeks, args.bins, rebuild=args.rebuild)
+
+
+def run_actuals(args):
+    # 1 câu UPDATE → trigger statement của demand_forecast_weekly (schema.sql mục 10) cộng dồn
+    # đúng các dòng có actual thay đổi vào accuracy mart / kpi_summary
+    stats = query_one("""
+        WITH updated AS (
+            UPDATE mart.demand_forecast_weekly df
+            SET actual = s.units_sold
+            FROM fact.fact_sales_weekly s
+            WHERE s.product_key = df.product_key
+              AND s.market_key = df.market_key
+              AND s.week_start = df.week_start
+              AND (%(since)s::date IS NULL OR df.week_start >= %(since)s::date)
+              AND df.actual IS DISTINCT FROM s.units_sold
+            RETURNING df.week_start
+        )
+        SELECT COUNT(*)         AS rows_updated,
+               MIN(week_start)  AS first_week,
+               MAX(week_start)  AS last_week
+        FROM updated;
+    """, {"since": args.since})
+    stats["since"] = args.since
+    return stats
+
+
+def run_metrics(args):
+    # Cập nhật tăng dần đã chạy trong trigger của demand_forecast_weekly (schema.sql mục 10);
+    # bước này chỉ rebuild khi cần (vd. sau khi đổi dim_market.channel / dim_product.family)
+    if args.rebuild:
+        execute_sql("SELECT mart.rebuild_accuracy_mart();")
+    stats = query_one("""
+        SELECT COUNT(*)                 AS accuracy_keys,
+               COALESCE(SUM(n_obs), 0)  AS observations,
+               MAX(week_start)          AS latest_week,
+               MAX(refreshed_at)        AS refreshed_at
+        FROM mart.forecast_accuracy_weekly;
+    """)
+    stats["rebuild"] = args.rebuild
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="stage", required=True)
+
+    cf = sub.add_parser("counterfactual", help="counterfactual_ts của campaign từ forecast trước campaign (champion)")
+    cf.add_argument("--force", action="store_true", help="bỏ qua fingerprint, tính lại mọi campaign")
+    cf.add_argument("--dry-run", action="store_true")
+    cf.set_defaults(run=run_counterfactual)
+
+    drift = sub.add_parser("drift", help="KS / PSI giữa cửa sổ tham chiếu và cửa sổ hiện tại → mart.data_drift_features")
+    drift.add_argument("--reference", help="START:END (ISO date, END không tính); mặc định DRIFT_REFERENCE_WEEKS tuần đầu")
+    drift.add_argument("--current-weeks", type=int)
+    drift.add_argument("--bins", type=int)
+    drift.add_argument("--rebuild", action="store_true", help="tính lại histogram từ đầu")
+    drift.set_defaults(run=run_drift)
+
+    actuals = sub.add_parser("actuals", help="ghi actual từ fact.fact_sales_weekly vào mart.demand_forecast_weekly")
+    actuals.add_argument("--since", type=date.fromisoformat, help="chỉ các tuần từ ngày này (ISO date)")
+    actuals.set_defaults(run=run_actuals)
+
+    metrics = sub.add_parser("metrics", help="sMAPE / MAE / pinball / coverage từ forecast vs actual")
+    metrics.add_argument("--rebuild", action="store_true", help="SELECT mart.rebuild_accuracy_mart()")
+    metrics.set_defaults(run=run_metrics)
+
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    stats = args.run(args)
+    stats["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    print(json.dumps(stats, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
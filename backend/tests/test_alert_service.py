@@ -0,0 +1,44 @@
+"""
+Cursor phân trang alert: encode / decode không phụ thuộc datetime.fromisoformat (Python < 3.11).
+
+    cd backend
+    python -m pytest -q tests
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from denso_app.services.alert_service import decode_cursor, encode_cursor, parse_timestamp, shape_alert_page
+
+
+def test_cursor_round_trip():
+    ts = datetime(2025, 1, 6, 10, 0, 0, 120000, tzinfo=timezone(timedelta(hours=7)))
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2025-01-06T10:00:00.1234+00:00", datetime(2025, 1, 6, 10, 0, 0, 123400, tzinfo=timezone.utc)),
+    ("2025-01-06 10:00:00+07", datetime(2025, 1, 6, 10, tzinfo=timezone(timedelta(hours=7)))),
+    ("2025-01-06T10:00:00.5Z", datetime(2025, 1, 6, 10, 0, 0, 500000, tzinfo=timezone.utc)),
+    ("2025-01-06T10:00:00", datetime(2025, 1, 6, 10)),
+])
+def test_parse_postgres_timestamps(text, expected):
+    assert parse_timestamp(text) == expected
+
+
+def test_page_from_json_rows_gets_fixed_format_cursor():
+    # /api/dashboard: created_at là chuỗi từ row_to_json, phần giây 4 chữ số
+    rows = [
+        {"alert_id": i, "created_at": f"2025-01-06T10:00:0{i}.1234+00:00", "level": "high",
+         "type": "stockout_risk", "message": "m", "link": None}
+        for i in (3, 2, 1)
+    ]
+    items, cursor = shape_alert_page(rows, 2)
+    assert [it["id"] for it in items] == [3, 2]
+    assert decode_cursor(cursor) == (datetime(2025, 1, 6, 10, 0, 2, 123400, tzinfo=timezone.utc), 2)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm8tcGlwZQ==", "MjAyNS0xMy0wMXwx"])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,57 @@
+"""
+TTLCache của response cache: LRU theo số entry, chặn theo byte, TTL, invalidate theo namespace.
+
+    cd backend
+    python -m pytest -q tests
+"""
+from denso_app import cache as cache_module
+from denso_app.cache import TTLCache
+
+
+def test_lru_evicts_least_recently_used():
+    c = TTLCache(max_entries=2)
+    c.set(("a", 1), "A", ttl=60)
+    c.set(("a", 2), "B", ttl=60)
+    assert c.get(("a", 1)) == "A"  # ("a", 1) thành mới dùng nhất
+    c.set(("a", 3), "C", ttl=60)
+
+    assert c.get(("a", 2)) is None
+    assert c.get(("a", 1)) == "A" and c.get(("a", 3)) == "C"
+    assert c.stats()["evictions"] == 1
+
+
+def test_byte_budget():
+    c = TTLCache(max_entries=100, max_bytes=10)
+    c.set(("a", 1), "x", ttl=60, nbytes=4)
+    c.set(("a", 2), "y", ttl=60, nbytes=4)
+    c.set(("a", 3), "z", ttl=60, nbytes=4)  # 12 > 10 → bỏ entry cũ nhất
+    assert c.get(("a", 1)) is None
+    assert c.stats()["bytes"] == 8
+
+    c.set(("a", 4), "big", ttl=60, nbytes=11)  # lớn hơn cả ngân sách → không cache, không đẩy entry khác
+    assert c.get(("a", 4)) is None and c.stats()["entries"] == 2
+
+    c.set(("a", 2), "y2", ttl=60, nbytes=1)  # ghi đè trừ byte của bản cũ
+    assert c.stats()["bytes"] == 5
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    c = TTLCache()
+    c.set(("a", 1), "A", ttl=30, nbytes=3)
+    now[0] += 29
+    assert c.get(("a", 1)) == "A"
+    now[0] += 2
+    assert c.get(("a", 1)) is None
+    assert c.stats()["bytes"] == 0 and c.stats()["hits"] == 1 and c.stats()["misses"] == 1
+
+
+def test_invalidate_namespace():
+    c = TTLCache()
+    c.set(("dashboard", 1), "d", ttl=60, nbytes=2)
+    c.set(("forecast", 1), "f", ttl=60, nbytes=3)
+    assert c.invalidate("dashboard") == 1
+    assert c.get(("dashboard", 1)) is None and c.get(("forecast", 1)) == "f"
+    assert c.stats()["bytes"] == 3
+    assert c.invalidate() == 1 and c.stats()["entries"] == 0
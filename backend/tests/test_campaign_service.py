@@ -0,0 +1,65 @@
+"""
+Lift campaign bằng moving block bootstrap: lift điểm, CI 95%, p-value, chuỗi counterfactual theo ngày.
+
+    cd backend
+    python -m pytest -q tests
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from denso_app.services.campaign_service import (
+    block_bootstrap_lift, daily_counterfactual, default_block_length, valid_series,
+)
+
+
+def _series(lift, n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    counterfactual = 100 + 10 * np.sin(np.arange(n) / 5)
+    observed = counterfactual + lift + rng.normal(scale=5, size=n)
+    return observed.tolist(), counterfactual.tolist()
+
+
+def test_point_estimate_skips_missing_points():
+    result = block_bootstrap_lift([12, None, 15, 20], [10, 11, None, 18], n_resamples=200, seed=1)
+    assert result["abs_lift"] == 4.0 and result["n_points"] == 2
+    assert result["rel_lift"] == pytest.approx(4 / 28)
+
+
+def test_clear_lift_is_significant_and_inside_ci():
+    observed, counterfactual = _series(lift=8.0)
+    result = block_bootstrap_lift(observed, counterfactual, n_resamples=4000, seed=7)
+    low, high = result["ci_95"]
+    assert low < result["abs_lift"] < high and low > 0
+    assert result["p_value"] < 0.01
+    assert result["block"] == default_block_length(60) == 4
+
+
+def test_no_lift_is_not_significant():
+    p_values = [block_bootstrap_lift(*_series(lift=0.0, seed=s), n_resamples=1000, seed=s)["p_value"]
+                for s in range(40)]
+    assert np.mean(np.array(p_values) < 0.05) <= 0.15
+
+
+def test_seed_and_chunking_are_deterministic():
+    observed, counterfactual = _series(lift=3.0)
+    a = block_bootstrap_lift(observed, counterfactual, n_resamples=12_000, seed=3)  # > RESAMPLE_CHUNK
+    b = block_bootstrap_lift(observed, counterfactual, n_resamples=12_000, seed=3)
+    assert a == b
+
+
+def test_no_overlap_raises():
+    with pytest.raises(ValueError):
+        block_bootstrap_lift([1, None], [None, 2])
+
+
+def test_valid_series_and_daily_counterfactual():
+    assert valid_series([1, 2], [1.5, None])
+    assert not valid_series([1, 2], [1])
+    assert not valid_series([], [])
+    assert not valid_series("[1]", [1])
+
+    # 2025-01-20 là thứ Hai; tuần 27/01 thiếu forecast → None
+    series = daily_counterfactual(date(2025, 1, 24), 4, {date(2025, 1, 20): 70.0})
+    assert series == [10.0, 10.0, 10.0, None]
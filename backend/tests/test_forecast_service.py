@@ -0,0 +1,37 @@
+"""
+SQL của fan chart (_fan_sql): số placeholder khớp params và window mặc định neo đúng chỗ.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import itertools
+from datetime import date
+
+from denso_app.services.forecast_service import _fan_sql
+
+
+def _filters(**overrides):
+    filters = {"country": None, "channel": None, "model": None, "horizon": None,
+               "start": None, "end": None, "weeks": 52}
+    filters.update(overrides)
+    return filters
+
+
+def test_placeholders_match_params():
+    for start, end, country, horizon in itertools.product(
+            (None, date(2024, 1, 1)), (None, date(2025, 1, 1)), (None, "Vietnam"), (None, 28)):
+        sql, params = _fan_sql([1, 2], _filters(start=start, end=end, country=country, horizon=horizon))
+        assert sql.count("%s") == len(params)
+
+
+def test_window_anchored_on_end():
+    sql, params = _fan_sql([1], _filters(end=date(2020, 1, 6), weeks=8))
+    assert "latest" not in sql
+    assert params[-2:] == [date(2020, 1, 6), 8]
+
+
+def test_latest_week_uses_same_filters():
+    sql, params = _fan_sql([1], _filters(country="Vietnam", channel="Dealer", model="prophet_v1"))
+    cte = sql.split("SELECT DISTINCT ON")[0]
+    assert "m.country = %s" in cte and "m.channel = %s" in cte and "df.model_name = %s" in cte
+    assert params == [[1], "Vietnam", "Dealer", "prophet_v1"] * 2 + [52]
@@ -0,0 +1,65 @@
+"""
+Chính sách order-up-to vectorized: z theo service level, khoảng bảo vệ lẻ tuần, tuần thiếu forecast, MOQ.
+
+    cd backend
+    python -m pytest -q tests
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from denso_app.services.inventory_service import (
+    Z_P90, compute_policies, protection_weeks_needed, weekly_sigma, z_scores,
+)
+
+
+def test_z_scores_exact_inverse_cdf():
+    z = z_scores([0.95, 0.5, 0.95, 0.99])
+    assert z.tolist() == pytest.approx([NormalDist().inv_cdf(p) for p in (0.95, 0.5, 0.95, 0.99)])
+    for bad in ([0.0], [1.0], [1.2]):
+        with pytest.raises(ValueError):
+            z_scores(bad)
+
+
+def test_weekly_sigma_from_interval():
+    p10, p50, p90 = np.array([80.0, np.nan]), np.array([100.0, 100.0]), np.array([120.0, 110.0])
+    assert weekly_sigma(p10, p50, p90).tolist() == pytest.approx([20 / Z_P90, 10 / Z_P90])
+
+
+def _policy(p50, sigma=10.0, **kwargs):
+    p50 = np.atleast_2d(np.asarray(p50, dtype=float))
+    args = dict(service_level=0.95, lead_time_days=7, review_days=7, on_hand=0, on_order=0, moq=1)
+    args.update(kwargs)
+    return compute_policies(p50 - sigma * Z_P90, p50, p50 + sigma * Z_P90, **args)
+
+
+def test_base_stock_and_safety():
+    result = _policy([[100.0, 100.0, 100.0]])  # 2 tuần bảo vệ, σ tuần = 10
+    z = NormalDist().inv_cdf(0.95)
+    assert result["demand_lt_mean"][0] == pytest.approx(200.0)
+    assert result["demand_lt_std"][0] == pytest.approx(10 * np.sqrt(2))
+    assert result["z_score"][0] == pytest.approx(z)
+    assert result["safety_stock"][0] == np.ceil(z * 10 * np.sqrt(2))
+    assert result["base_stock"][0] == 200 + result["safety_stock"][0]
+
+
+def test_fractional_protection_window_and_missing_weeks():
+    # 10 ngày = 1.43 tuần: tuần 2 tính 3/7; tuần thiếu forecast dùng trung bình các tuần có dữ liệu
+    result = _policy([[100.0, np.nan]], lead_time_days=3, review_days=7)
+    assert result["demand_lt_mean"][0] == pytest.approx(100 + 100 * 3 / 7)
+
+
+def test_po_rounded_up_to_moq_per_series():
+    result = _policy([[100.0, 100.0], [100.0, 100.0], [100.0, 100.0]], sigma=0.0,
+                     on_hand=[0, 150, 500], on_order=[0, 10, 0], moq=[24, 24, 0])
+    assert result["base_stock"].tolist() == [200.0, 200.0, 200.0]
+    assert result["po_recommend"].tolist() == [216.0, 48.0, 0.0]  # 200→9×24, 40→2×24, tồn dư → 0
+
+
+def test_protection_weeks_needed():
+    assert protection_weeks_needed([7, 14], [7]) == 3
+    with pytest.raises(ValueError):
+        protection_weeks_needed([0], [0])
+    with pytest.raises(ValueError):
+        protection_weeks_needed([365], [7])
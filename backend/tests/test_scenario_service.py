@@ -0,0 +1,69 @@
+"""
+What-if grid: broadcast của evaluate_grid, đặc tả lever, điểm tối ưu của summarize_grid.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import numpy as np
+import pytest
+
+from denso_app.services.scenario_service import (
+    DEFAULT_BETAS, MARGIN_RATE, MAX_LEVER_STEPS, evaluate_grid, lever_values, summarize_grid,
+)
+
+
+def _scalar(baseline, betas, dp, promo, ad, unit_cost_ratio=1 - MARGIN_RATE, ad_cost=0.0):
+    fc = max(baseline * (1 + dp / 100 * betas[0]) * (1 + promo * betas[1]) * (1 + ad * betas[2]), 0.0)
+    return fc, fc * ((1 + dp / 100) * (1 - promo) - unit_cost_ratio) - ad * ad_cost
+
+
+def test_evaluate_grid_broadcasts_every_combination():
+    baselines = [100.0, 250.0]
+    betas = [DEFAULT_BETAS, (-1.2, 0.8, 0.3)]
+    price, promo, ad = np.array([-10.0, 0.0, 15.0]), np.array([0.0, 0.2]), np.array([0.0, 0.5, 1.0, 2.0])
+
+    fc, margin = evaluate_grid(baselines, betas, price, promo, ad, unit_cost_ratio=0.6, ad_cost=5.0)
+
+    assert fc.shape == margin.shape == (2, 3, 2, 4)
+    for s in range(2):
+        for i, j, k in np.ndindex(3, 2, 4):
+            exp_fc, exp_margin = _scalar(baselines[s], betas[s], price[i], promo[j], ad[k], 0.6, 5.0)
+            assert fc[s, i, j, k] == pytest.approx(exp_fc)
+            assert margin[s, i, j, k] == pytest.approx(exp_margin)
+
+
+def test_origin_margin_matches_legacy_rate():
+    fc, margin = evaluate_grid([135.0], [DEFAULT_BETAS], [0.0], [0.0], [0.0])
+    assert fc.item() == pytest.approx(135.0)
+    assert margin.item() == pytest.approx(135.0 * MARGIN_RATE)
+
+
+def test_forecast_is_clipped_at_zero():
+    fc, _ = evaluate_grid([100.0], [(-2.0, 0.0, 0.0)], [80.0], [0.0], [0.0])
+    assert fc.item() == 0.0
+
+
+def test_lever_values():
+    assert lever_values(None, "ad_spend").tolist() == [0.0]
+    assert lever_values(5, "price_delta").tolist() == [5.0]
+    assert lever_values([0, 0.1], "promo_depth").tolist() == [0.0, 0.1]
+    assert lever_values({"min": -20, "max": 20, "steps": 5}, "price_delta").tolist() == [-20, -10, 0, 10, 20]
+    for bad in ({"min": 0, "max": 1, "steps": MAX_LEVER_STEPS + 1}, [], [float("nan")], "5", {"max": 1}):
+        with pytest.raises((ValueError, KeyError)):
+            lever_values(bad, "price_delta")
+
+
+def test_summarize_grid_optimum():
+    levers = [np.array([-10.0, 0.0, 10.0]), np.array([0.0, 0.2]), np.array([0.0, 1.0])]
+    baselines = np.array([100.0, 50.0])
+    betas = np.array([DEFAULT_BETAS, DEFAULT_BETAS])
+    fc, margin = evaluate_grid(baselines, betas, *levers)
+
+    result = summarize_grid(["A", "B"], baselines, betas, levers, fc, margin, include_sku_surfaces=True)
+
+    total = margin.sum(axis=0)
+    i, j, k = np.unravel_index(total.argmax(), total.shape)
+    assert result["optimal"]["margin"] == round(float(total[i, j, k]), 2)
+    assert result["optimal"]["price_delta"] == levers[0][i]
+    assert result["points"] == 2 * 3 * 2 * 2
+    assert np.array(result["per_sku"][0]["surface"]["margin"]).shape == (3, 2, 2)
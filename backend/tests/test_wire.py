@@ -0,0 +1,69 @@
+"""
+Wire format f32 (layout header + block cột) và chọn Content-Encoding.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import json
+import math
+import struct
+from array import array
+
+from flask import Flask, request
+
+from denso_app import wire
+
+
+def _unpack(payload):
+    assert payload[:4] == wire.F32_MAGIC
+    (header_len,) = struct.unpack("<I", payload[4:8])
+    assert header_len % 4 == 0
+    header = json.loads(payload[8:8 + header_len].decode("utf-8"))
+    return header, payload[8 + header_len:]
+
+
+def test_pack_f32_layout():
+    tables = {
+        "fan": {"p50": [1.5, None, 3.0], "label": ["W1", "W2", "W3"], "flag": [True, False, True]},
+        "kpi": {"mape": [7.25]},
+    }
+    header, data = _unpack(wire.pack_f32(tables, meta={"sku": "K20PR-U"}))
+
+    assert header["meta"] == {"sku": "K20PR-U"}
+    fan = header["tables"]["fan"]
+    assert fan["length"] == 3
+    assert fan["columns"]["label"] == {"dtype": "str", "values": ["W1", "W2", "W3"]}
+
+    p50 = fan["columns"]["p50"]
+    assert p50["dtype"] == "f32" and p50["offset"] % 4 == 0
+    values = array("f", data[p50["offset"]:p50["offset"] + 12]).tolist()
+    assert values[0] == 1.5 and math.isnan(values[1]) and values[2] == 3.0
+
+    flag = fan["columns"]["flag"]
+    assert flag["dtype"] == "bool" and list(data[flag["offset"]:flag["offset"] + 3]) == [1, 0, 1]
+
+    mape = header["tables"]["kpi"]["columns"]["mape"]
+    assert mape["offset"] % 4 == 0  # block bool 3 byte được pad tới bội số 4
+    assert array("f", data[mape["offset"]:mape["offset"] + 4])[0] == 7.25
+    assert len(data) == mape["offset"] + 4
+
+
+def _negotiate(accept, body=b"x" * 2048, mimetype="application/json"):
+    app = Flask(__name__)
+    app.config["API_COMPRESS_MIN_BYTES"] = 1024
+    with app.test_request_context(headers={"Accept-Encoding": accept}):
+        resp = app.response_class(body, mimetype=mimetype)
+        return wire.negotiate_encoding(request, resp)
+
+
+def test_negotiate_encoding(monkeypatch):
+    monkeypatch.setattr(wire, "brotli", None)
+    assert _negotiate("gzip, br") == "gzip"
+    assert _negotiate("identity") is None
+    assert _negotiate("gzip", body=b"x" * 100) is None                  # nhỏ hơn ngưỡng
+    assert _negotiate("gzip", mimetype="text/csv") is None              # mimetype không nén
+    assert _negotiate("gzip", mimetype=wire.F32_MIMETYPE) == "gzip"
+
+    monkeypatch.setattr(wire, "brotli", object())
+    assert _negotiate("gzip, br") == "br"
+    assert _negotiate("gzip") == "gzip"
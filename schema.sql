@@ -67,6 +67,10 @@ CREATE TABLE IF NOT EXISTS feature.ts_features_weekly (
     total_new_vehicle_sales      NUMERIC
 );
 
+-- Export /api/data/exogenous/export: range since/until + ORDER BY week_start (server-side cursor)
+CREATE INDEX IF NOT EXISTS ix_ts_features_weekly_week
+    ON feature.ts_features_weekly (week_start, feature_key);
+
 -- ============================================
 -- 3. MART: DASHBOARD (A tab)
 -- ============================================
@@ -98,6 +102,10 @@ CREATE TABLE IF NOT EXISTS mart.demand_forecast_weekly (
     CONSTRAINT uq_forecast UNIQUE (product_key, market_key, week_start, horizon_days, model_name)
 );
 
+-- Fan chart /api/forecast/sku: filter product → market → model → horizon, range theo week_start
+CREATE INDEX IF NOT EXISTS ix_forecast_product_market_model
+    ON mart.demand_forecast_weekly (product_key, market_key, model_name, horizon_days, week_start);
+
 -- 3.3 Alerts Log (Dashboard Overview + Alert Center)
 CREATE TABLE IF NOT EXISTS mart.alerts_log (
     alert_id   SERIAL PRIMARY KEY,
@@ -105,9 +113,17 @@ CREATE TABLE IF NOT EXISTS mart.alerts_log (
     type       TEXT NOT NULL,      -- 'demand_spike' / 'stockout_risk' / ...
     message    TEXT NOT NULL,
     link       TEXT,
-    created_at TIMESTAMPTZ DEFAULT now()
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
 
+-- Keyset pagination cho /api/alerts: ORDER BY created_at DESC, alert_id DESC
+CREATE INDEX IF NOT EXISTS ix_alerts_log_created
+    ON mart.alerts_log (created_at, alert_id);
+CREATE INDEX IF NOT EXISTS ix_alerts_log_level_created
+    ON mart.alerts_log (level, created_at, alert_id);
+CREATE INDEX IF NOT EXISTS ix_alerts_log_type_created
+    ON mart.alerts_log (type, created_at, alert_id);
+
 -- 3.4 Error by Horizon (MAPE vs Horizon)
 CREATE TABLE IF NOT EXISTS mart.error_horizon (
     id           SERIAL PRIMARY KEY,
@@ -187,7 +203,8 @@ CREATE TABLE IF NOT EXISTS mart.model_registry (
     trained_at  TIMESTAMPTZ,
     dataset     TEXT,
     params      JSONB,
-    is_champion BOOLEAN DEFAULT FALSE
+    is_champion BOOLEAN DEFAULT FALSE,
+    forecast_model TEXT                  -- model_name của version này trong demand_forecast_weekly ('xgboost_v1')
 );
 
 -- 4.7 Model Metrics Over Time (for registry metrics chart)
@@ -235,11 +252,39 @@ CREATE TABLE IF NOT EXISTS mart.campaign_impact (
     roi              NUMERIC,
     observed_ts      JSONB,
     counterfactual_ts JSONB,
-    reasons          JSONB
+    reasons          JSONB,
+    -- ghi bởi refresh_marts.py counterfactual (services/campaign_service.py)
+    counterfactual_model TEXT,
+    counterfactual_hash  TEXT,         -- fingerprint đầu vào; không đổi → bỏ qua campaign
+    counterfactual_at    TIMESTAMPTZ
 );
 
--- (Inventory recommendations trong UI tính on-the-fly từ forecast,
---  nên không bắt buộc có bảng riêng; nếu sau này muốn log thì tạo thêm mart.inventory_policy_log)
+-- 5.3 Inventory Policy Log (/api/inventory/policy)
+-- Mỗi lần chạy optimizer ghi 1 row / (SKU × market), cùng run_id
+CREATE TABLE IF NOT EXISTS mart.inventory_policy_log (
+    policy_id      BIGSERIAL PRIMARY KEY,
+    run_id         UUID NOT NULL,
+    product_key    INTEGER NOT NULL REFERENCES dim.dim_product(product_key),
+    market_key     INTEGER NOT NULL REFERENCES dim.dim_market(market_key),
+    computed_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    service_level  NUMERIC NOT NULL,
+    lead_time_days INTEGER NOT NULL,
+    review_days    INTEGER NOT NULL,
+    demand_lt_mean NUMERIC,             -- μ nhu cầu trong lead time + review
+    demand_lt_std  NUMERIC,             -- σ tương ứng
+    z_score        NUMERIC,
+    safety_stock   NUMERIC,
+    base_stock     NUMERIC,             -- order-up-to level S
+    on_hand        NUMERIC,
+    on_order       NUMERIC,
+    moq            INTEGER,
+    po_recommend   NUMERIC
+);
+
+CREATE INDEX IF NOT EXISTS ix_inventory_policy_log_latest
+    ON mart.inventory_policy_log (product_key, market_key, computed_at DESC);
+CREATE INDEX IF NOT EXISTS ix_inventory_policy_log_run
+    ON mart.inventory_policy_log (run_id);
 
 -- ============================================
 -- 6. MART: DATA & MONITORING (D_exogenous, D_monitoring)
@@ -257,6 +302,25 @@ CREATE TABLE IF NOT EXISTS mart.data_drift_features (
     calc_at      TIMESTAMPTZ
 );
 
+-- refresh_marts.py drift upsert theo feature (services/drift_service.py)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_data_drift_features_feature
+    ON mart.data_drift_features (feature_name);
+
+-- 6.1b Histogram đã bin cho drift engine: biên bin theo quantile cửa sổ tham chiếu,
+-- count của cửa sổ tham chiếu và cửa sổ hiện tại (cập nhật tăng dần theo tuần)
+CREATE TABLE IF NOT EXISTS mart.data_drift_state (
+    feature_name  TEXT PRIMARY KEY,
+    ref_start     DATE NOT NULL,
+    ref_end       DATE NOT NULL,       -- [ref_start, ref_end)
+    current_weeks INTEGER NOT NULL,
+    n_bins        INTEGER NOT NULL,
+    edges         FLOAT8[] NOT NULL,   -- biên trong, len(edges) + 1 bin
+    ref_counts    BIGINT[] NOT NULL,
+    cur_counts    BIGINT[] NOT NULL,
+    last_week     DATE NOT NULL,       -- tuần mới nhất đã cộng vào cur_counts
+    updated_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
 -- 6.2 Rolling Model Metrics (Monitoring line chart)
 CREATE TABLE IF NOT EXISTS mart.model_metrics_rolling (
     id        SERIAL PRIMARY KEY,
@@ -283,6 +347,11 @@ CREATE TABLE IF NOT EXISTS mart.market_price_region (
     as_of_date       DATE
 );
 
+-- Snapshot mới nhất theo region: SELECT DISTINCT ON (region) ... ORDER BY region, as_of_date DESC
+-- (services/market_service.py); 3 bảng dưới có index tương tự
+CREATE INDEX IF NOT EXISTS ix_market_price_region_latest
+    ON mart.market_price_region (region, as_of_date DESC, price_id DESC);
+
 -- 7.2 Weather by Region
 CREATE TABLE IF NOT EXISTS mart.market_weather_region (
     weather_id   SERIAL PRIMARY KEY,
@@ -294,6 +363,9 @@ CREATE TABLE IF NOT EXISTS mart.market_weather_region (
     as_of_date   DATE
 );
 
+CREATE INDEX IF NOT EXISTS ix_market_weather_region_latest
+    ON mart.market_weather_region (region, as_of_date DESC, weather_id DESC);
+
 -- 7.3 Port Congestion
 CREATE TABLE IF NOT EXISTS mart.port_congestion (
     port_id        SERIAL PRIMARY KEY,
@@ -303,6 +375,9 @@ CREATE TABLE IF NOT EXISTS mart.port_congestion (
     as_of_date     DATE
 );
 
+CREATE INDEX IF NOT EXISTS ix_port_congestion_latest
+    ON mart.port_congestion (name, as_of_date DESC, port_id DESC);
+
 -- 7.4 Warehouse Status
 CREATE TABLE IF NOT EXISTS mart.warehouse_status (
     warehouse_id SERIAL PRIMARY KEY,
@@ -311,3 +386,779 @@ CREATE TABLE IF NOT EXISTS mart.warehouse_status (
     current_stock NUMERIC,
     as_of_date   DATE
 );
+
+CREATE INDEX IF NOT EXISTS ix_warehouse_status_latest
+    ON mart.warehouse_status (region, as_of_date DESC, warehouse_id DESC);
+
+-- ============================================
+-- 8. MART: DASHBOARD AGGREGATES (/api/dashboard)
+-- Bảng tổng hợp sẵn cho dashboard, refresh tăng dần bằng statement trigger:
+-- writer chỉ cần INSERT/UPDATE/DELETE vào bảng nguồn, mart tự cập nhật
+-- đúng các key bị ảnh hưởng (không quét lại toàn bộ forecast).
+-- Writer song song được tuần tự hóa theo key bằng pg_advisory_xact_lock; đổi family / country /
+-- channel trong dim tự rebuild. Rebuild toàn bộ: SELECT mart.rebuild_dashboard_mart();
+-- ============================================
+
+-- 8.1 Tổng P50 theo tuần × family cho từng country/channel (fan.by_category);
+--     mỗi (SKU, market, tuần) chỉ tính forecast của origin mới nhất (horizon ngắn nhất)
+CREATE TABLE IF NOT EXISTS mart.dash_category_weekly (
+    country      TEXT NOT NULL,
+    channel      TEXT NOT NULL,
+    week_start   DATE NOT NULL,
+    family       TEXT NOT NULL,
+    p50          NUMERIC,
+    refreshed_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (country, channel, week_start, family)
+);
+
+-- 8.2 Coverage heatmap: channel × period (trung bình các SKU)
+CREATE TABLE IF NOT EXISTS mart.dash_coverage_grid (
+    channel      TEXT NOT NULL,
+    period       TEXT NOT NULL,
+    coverage_pct NUMERIC,
+    refreshed_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (channel, period)
+);
+
+-- 8.3 Top-N SKU có coverage thấp nhất (kpi.risky_skus)
+CREATE TABLE IF NOT EXISTS mart.dash_risky_sku (
+    rank         INTEGER PRIMARY KEY,
+    sku          TEXT NOT NULL,
+    channel      TEXT,
+    period       TEXT,
+    coverage_pct NUMERIC,
+    refreshed_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_coverage_by_sku_pct
+    ON mart.coverage_by_sku (coverage_pct);
+
+-- Refresh các key (country, channel, week_start, family) bị ảnh hưởng bởi
+-- các dòng forecast (product_key, market_key, week_start); NULL = rebuild toàn bộ.
+CREATE OR REPLACE FUNCTION mart.refresh_dash_category(
+    p_product_keys INTEGER[] DEFAULT NULL,
+    p_market_keys  INTEGER[] DEFAULT NULL,
+    p_weeks        DATE[]    DEFAULT NULL
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    IF p_product_keys IS NULL THEN
+        PERFORM pg_advisory_xact_lock(hashtextextended('mart.dash_category', 0));
+        DELETE FROM mart.dash_category_weekly;
+
+        INSERT INTO mart.dash_category_weekly (country, channel, week_start, family, p50)
+        SELECT m.country, m.channel, df.week_start, p.family, SUM(df.p50)
+        FROM (
+            -- mỗi (SKU, market, tuần): forecast origin mới nhất (horizon ngắn nhất)
+            SELECT DISTINCT ON (product_key, market_key, week_start)
+                   product_key, market_key, week_start, p50
+            FROM mart.demand_forecast_weekly
+            ORDER BY product_key, market_key, week_start, horizon_days, forecast_key DESC
+        ) df
+        JOIN dim.dim_product p ON p.product_key = df.product_key
+        JOIN dim.dim_market m ON m.market_key = df.market_key
+        WHERE p.family IS NOT NULL
+          AND m.channel IS NOT NULL
+        GROUP BY m.country, m.channel, df.week_start, p.family;
+        RETURN;
+    END IF;
+
+    -- Writer song song cùng key: khóa từng key (theo thứ tự hash → không deadlock) trước khi tính SUM.
+    -- Khóa giữ tới hết transaction; câu lệnh sau lấy snapshot mới (READ COMMITTED) nên thấy
+    -- dữ liệu của writer trước đã commit → không còn tổng cũ ghi đè tổng mới.
+    PERFORM pg_advisory_xact_lock_shared(hashtextextended('mart.dash_category', 0));
+    PERFORM pg_advisory_xact_lock(l.lock_key)
+    FROM (
+        SELECT DISTINCT hashtextextended(
+                   concat_ws('|', 'mart.dash_category', m.country, m.channel, k.week_start, p.family), 0) AS lock_key
+        FROM unnest(p_product_keys, p_market_keys, p_weeks) AS k(product_key, market_key, week_start)
+        JOIN dim.dim_product p ON p.product_key = k.product_key
+        JOIN dim.dim_market m ON m.market_key = k.market_key
+        ORDER BY 1
+    ) l;
+
+    WITH changed AS (
+        SELECT DISTINCT m.country, m.channel, k.week_start, p.family
+        FROM unnest(p_product_keys, p_market_keys, p_weeks) AS k(product_key, market_key, week_start)
+        JOIN dim.dim_product p ON p.product_key = k.product_key
+        JOIN dim.dim_market m ON m.market_key = k.market_key
+        WHERE p.family IS NOT NULL
+          AND m.channel IS NOT NULL
+    ),
+    agg AS (
+        SELECT ch.country, ch.channel, ch.week_start, ch.family, SUM(df.p50) AS p50
+        FROM changed ch
+        JOIN dim.dim_market m ON m.country = ch.country AND m.channel = ch.channel
+        JOIN dim.dim_product p ON p.family = ch.family
+        CROSS JOIN LATERAL (
+            -- forecast origin mới nhất của (SKU, market, tuần), đọc qua index uq_forecast
+            SELECT f.p50
+            FROM mart.demand_forecast_weekly f
+            WHERE f.product_key = p.product_key
+              AND f.market_key = m.market_key
+              AND f.week_start = ch.week_start
+            ORDER BY f.horizon_days, f.forecast_key DESC
+            LIMIT 1
+        ) df
+        GROUP BY ch.country, ch.channel, ch.week_start, ch.family
+    ),
+    removed AS (
+        -- key không còn dòng forecast nào (vd. sau DELETE)
+        DELETE FROM mart.dash_category_weekly d
+        USING changed ch
+        WHERE d.country = ch.country
+          AND d.channel = ch.channel
+          AND d.week_start = ch.week_start
+          AND d.family = ch.family
+          AND NOT EXISTS (
+              SELECT 1 FROM agg a
+              WHERE a.country = ch.country
+                AND a.channel = ch.channel
+                AND a.week_start = ch.week_start
+                AND a.family = ch.family
+          )
+    )
+    INSERT INTO mart.dash_category_weekly (country, channel, week_start, family, p50, refreshed_at)
+    SELECT country, channel, week_start, family, p50, now()
+    FROM agg
+    ON CONFLICT (country, channel, week_start, family)
+    DO UPDATE SET p50 = EXCLUDED.p50,
+                  refreshed_at = EXCLUDED.refreshed_at;
+END;
+$$;
+
+-- Refresh các ô (channel, period) của heatmap; NULL = rebuild toàn bộ.
+CREATE OR REPLACE FUNCTION mart.refresh_dash_coverage(
+    p_channels TEXT[] DEFAULT NULL,
+    p_periods  TEXT[] DEFAULT NULL
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    IF p_channels IS NULL THEN
+        PERFORM pg_advisory_xact_lock(hashtextextended('mart.dash_coverage', 0));
+        DELETE FROM mart.dash_coverage_grid;
+
+        INSERT INTO mart.dash_coverage_grid (channel, period, coverage_pct)
+        SELECT c.channel, c.period, AVG(c.coverage_pct)
+        FROM mart.coverage_by_sku c
+        GROUP BY c.channel, c.period;
+        RETURN;
+    END IF;
+
+    -- Cùng cách khóa theo key như refresh_dash_category
+    PERFORM pg_advisory_xact_lock_shared(hashtextextended('mart.dash_coverage', 0));
+    PERFORM pg_advisory_xact_lock(l.lock_key)
+    FROM (
+        SELECT DISTINCT hashtextextended(concat_ws('|', 'mart.dash_coverage', k.channel, k.period), 0) AS lock_key
+        FROM unnest(p_channels, p_periods) AS k(channel, period)
+        ORDER BY 1
+    ) l;
+
+    WITH changed AS (
+        SELECT DISTINCT k.channel, k.period
+        FROM unnest(p_channels, p_periods) AS k(channel, period)
+    ),
+    agg AS (
+        SELECT ch.channel, ch.period, AVG(c.coverage_pct) AS coverage_pct
+        FROM changed ch
+        JOIN mart.coverage_by_sku c ON c.channel = ch.channel AND c.period = ch.period
+        GROUP BY ch.channel, ch.period
+    ),
+    removed AS (
+        DELETE FROM mart.dash_coverage_grid g
+        USING changed ch
+        WHERE g.channel = ch.channel
+          AND g.period = ch.period
+          AND NOT EXISTS (
+              SELECT 1 FROM agg a WHERE a.channel = ch.channel AND a.period = ch.period
+          )
+    )
+    INSERT INTO mart.dash_coverage_grid (channel, period, coverage_pct, refreshed_at)
+    SELECT channel, period, coverage_pct, now()
+    FROM agg
+    ON CONFLICT (channel, period)
+    DO UPDATE SET coverage_pct = EXCLUDED.coverage_pct,
+                  refreshed_at = EXCLUDED.refreshed_at;
+END;
+$$;
+
+-- Top-N luôn tính lại toàn bộ: chỉ đọc N dòng đầu qua ix_coverage_by_sku_pct.
+CREATE OR REPLACE FUNCTION mart.refresh_dash_risky(p_top_n INTEGER DEFAULT 10)
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    -- DELETE + INSERT theo rank: 2 writer song song sẽ đụng PK rank → tuần tự hóa
+    PERFORM pg_advisory_xact_lock(hashtextextended('mart.dash_risky', 0));
+    DELETE FROM mart.dash_risky_sku;
+
+    INSERT INTO mart.dash_risky_sku (rank, sku, channel, period, coverage_pct)
+    SELECT row_number() OVER (ORDER BY r.coverage_pct ASC, r.coverage_id),
+           r.sku, r.channel, r.period, r.coverage_pct
+    FROM (
+        SELECT c.coverage_id, p.sku, c.channel, c.period, c.coverage_pct
+        FROM mart.coverage_by_sku c
+        JOIN dim.dim_product p ON p.product_key = c.product_key
+        ORDER BY c.coverage_pct ASC, c.coverage_id
+        LIMIT p_top_n
+    ) r;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION mart.rebuild_dashboard_mart() RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM mart.refresh_dash_category();
+    PERFORM mart.refresh_dash_coverage();
+    PERFORM mart.refresh_dash_risky();
+END;
+$$;
+
+-- Trigger function: gom các key bị ảnh hưởng trong transition table rồi refresh 1 lần / statement.
+CREATE OR REPLACE FUNCTION mart.trg_dash_category_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v_products INTEGER[];
+    v_markets  INTEGER[];
+    v_weeks    DATE[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(product_key), array_agg(market_key), array_agg(week_start)
+        INTO v_products, v_markets, v_weeks
+        FROM (SELECT DISTINCT product_key, market_key, week_start FROM new_rows) k;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(product_key), array_agg(market_key), array_agg(week_start)
+        INTO v_products, v_markets, v_weeks
+        FROM (
+            SELECT product_key, market_key, week_start FROM new_rows
+            UNION
+            SELECT product_key, market_key, week_start FROM old_rows
+        ) k;
+    ELSE
+        SELECT array_agg(product_key), array_agg(market_key), array_agg(week_start)
+        INTO v_products, v_markets, v_weeks
+        FROM (SELECT DISTINCT product_key, market_key, week_start FROM old_rows) k;
+    END IF;
+
+    IF v_products IS NOT NULL THEN
+        PERFORM mart.refresh_dash_category(v_products, v_markets, v_weeks);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION mart.trg_dash_coverage_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v_channels TEXT[];
+    v_periods  TEXT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(channel), array_agg(period)
+        INTO v_channels, v_periods
+        FROM (SELECT DISTINCT channel, period FROM new_rows) k;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(channel), array_agg(period)
+        INTO v_channels, v_periods
+        FROM (
+            SELECT channel, period FROM new_rows
+            UNION
+            SELECT channel, period FROM old_rows
+        ) k;
+    ELSE
+        SELECT array_agg(channel), array_agg(period)
+        INTO v_channels, v_periods
+        FROM (SELECT DISTINCT channel, period FROM old_rows) k;
+    END IF;
+
+    IF v_channels IS NOT NULL THEN
+        PERFORM mart.refresh_dash_coverage(v_channels, v_periods);
+        PERFORM mart.refresh_dash_risky();
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER trg_forecast_dash_ins
+    AFTER INSERT ON mart.demand_forecast_weekly
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_dash_category_refresh();
+
+CREATE OR REPLACE TRIGGER trg_forecast_dash_upd
+    AFTER UPDATE ON mart.demand_forecast_weekly
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_dash_category_refresh();
+
+CREATE OR REPLACE TRIGGER trg_forecast_dash_del
+    AFTER DELETE ON mart.demand_forecast_weekly
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_dash_category_refresh();
+
+CREATE OR REPLACE TRIGGER trg_coverage_dash_ins
+    AFTER INSERT ON mart.coverage_by_sku
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_dash_coverage_refresh();
+
+CREATE OR REPLACE TRIGGER trg_coverage_dash_upd
+    AFTER UPDATE ON mart.coverage_by_sku
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_dash_coverage_refresh();
+
+CREATE OR REPLACE TRIGGER trg_coverage_dash_del
+    AFTER DELETE ON mart.coverage_by_sku
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_dash_coverage_refresh();
+
+-- Đổi family / country / channel làm đổi key của mọi dòng liên quan → rebuild (hiếm, dữ liệu dim nhỏ)
+CREATE OR REPLACE FUNCTION mart.trg_dash_dim_rebuild() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM mart.rebuild_dashboard_mart();
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER trg_dim_product_dash
+    AFTER UPDATE OF family ON dim.dim_product
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_dash_dim_rebuild();
+
+CREATE OR REPLACE TRIGGER trg_dim_market_dash
+    AFTER UPDATE OF country, channel ON dim.dim_market
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_dash_dim_rebuild();
+
+-- Backfill cho DB đã có dữ liệu trước khi thêm mart (DB mới: no-op)
+SELECT mart.rebuild_dashboard_mart();
+
+-- ============================================
+-- 9. DIMENSION VERSIONS (denso_app/dimensions.py)
+-- Backend giữ dim_product / dim_market / scenario_elasticity trong RAM;
+-- mỗi statement ghi vào các bảng này tăng version, backend chỉ cần
+-- đọc dim.dim_version định kỳ để biết khi nào phải nạp lại.
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS dim.dim_version (
+    name       TEXT PRIMARY KEY,          -- tên bảng nguồn
+    version    BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO dim.dim_version (name)
+VALUES ('dim_product'), ('dim_market'), ('scenario_elasticity')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION dim.bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO dim.dim_version (name, version)
+    VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (name) DO UPDATE
+        SET version = dim.dim_version.version + 1,
+            updated_at = now();
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER trg_dim_product_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON dim.dim_product
+    FOR EACH STATEMENT EXECUTE FUNCTION dim.bump_version();
+
+CREATE OR REPLACE TRIGGER trg_dim_market_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON dim.dim_market
+    FOR EACH STATEMENT EXECUTE FUNCTION dim.bump_version();
+
+CREATE OR REPLACE TRIGGER trg_scenario_elasticity_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON mart.scenario_elasticity
+    FOR EACH STATEMENT EXECUTE FUNCTION dim.bump_version();
+
+-- ============================================
+-- 10. FORECAST ACCURACY (sMAPE / MAE / MAPE / pinball / coverage P10–P90)
+-- Tổng chạy (running sums) theo model × SKU × channel × horizon × tuần, cập nhật bằng
+-- statement trigger trên demand_forecast_weekly: mỗi statement chỉ cộng phần đóng góp
+-- của new_rows và trừ phần của old_rows (chỉ dòng có actual) → chi phí O(dòng thay đổi).
+-- MAPE theo horizon / theo tuần (mọi model) có tổng chạy riêng (accuracy_horizon_totals,
+-- accuracy_week_totals) nên không phải cộng lại cả lịch sử của horizon / tuần đó.
+-- Từ bảng tổng chạy, các key bị ảnh hưởng được tính lại trong:
+--   mart.model_metrics_rolling (model × sku_group × tuần), mart.error_horizon (horizon),
+--   mart.coverage_by_sku (SKU × channel × tuần), mart.kpi_summary.mape_last_week.
+-- Writer song song được tuần tự hóa theo key output bằng pg_advisory_xact_lock (như mục 8).
+-- actual được ghi từ fact.fact_sales_weekly bằng `python refresh_marts.py actuals` (1 UPDATE).
+-- Rebuild toàn bộ: SELECT mart.rebuild_accuracy_mart();
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS mart.forecast_accuracy_weekly (
+    model_name      TEXT NOT NULL,
+    product_key     INTEGER NOT NULL,
+    channel         TEXT NOT NULL,
+    horizon_days    INTEGER NOT NULL,
+    week_start      DATE NOT NULL,
+    n_obs           BIGINT NOT NULL DEFAULT 0,   -- số dòng có actual và p50
+    sum_abs_err     NUMERIC NOT NULL DEFAULT 0,  -- Σ |actual − p50|
+    sum_smape       NUMERIC NOT NULL DEFAULT 0,  -- Σ 200·|a − f| / (|a| + |f|)
+    n_ape           BIGINT NOT NULL DEFAULT 0,   -- số dòng actual ≠ 0
+    sum_ape         NUMERIC NOT NULL DEFAULT 0,  -- Σ 100·|a − f| / |a|
+    n_interval      BIGINT NOT NULL DEFAULT 0,   -- số dòng có đủ p10 và p90
+    n_covered       BIGINT NOT NULL DEFAULT 0,   -- p10 <= actual <= p90
+    sum_pinball_p10 NUMERIC NOT NULL DEFAULT 0,
+    sum_pinball_p50 NUMERIC NOT NULL DEFAULT 0,
+    sum_pinball_p90 NUMERIC NOT NULL DEFAULT 0,
+    refreshed_at    TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (model_name, product_key, channel, horizon_days, week_start)
+);
+
+CREATE INDEX IF NOT EXISTS ix_forecast_accuracy_horizon
+    ON mart.forecast_accuracy_weekly (horizon_days);
+CREATE INDEX IF NOT EXISTS ix_forecast_accuracy_product_week
+    ON mart.forecast_accuracy_weekly (product_key, channel, week_start);
+CREATE INDEX IF NOT EXISTS ix_forecast_accuracy_week
+    ON mart.forecast_accuracy_weekly (week_start);
+
+-- Tổng chạy của APE (dòng actual ≠ 0) theo horizon → mart.error_horizon
+CREATE TABLE IF NOT EXISTS mart.accuracy_horizon_totals (
+    horizon_days INTEGER PRIMARY KEY,
+    n_ape        BIGINT NOT NULL DEFAULT 0,
+    sum_ape      NUMERIC NOT NULL DEFAULT 0
+);
+
+-- Tổng chạy của APE theo tuần → mart.kpi_summary.mape_last_week
+CREATE TABLE IF NOT EXISTS mart.accuracy_week_totals (
+    week_start DATE PRIMARY KEY,
+    n_ape      BIGINT NOT NULL DEFAULT 0,
+    sum_ape    NUMERIC NOT NULL DEFAULT 0
+);
+
+-- Upsert theo key cho các bảng output
+ALTER TABLE mart.model_metrics_rolling
+    ADD COLUMN IF NOT EXISTS pinball_p90  NUMERIC,
+    ADD COLUMN IF NOT EXISTS coverage     NUMERIC,
+    ADD COLUMN IF NOT EXISTS n_obs        BIGINT,
+    ADD COLUMN IF NOT EXISTS refreshed_at TIMESTAMPTZ;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_model_metrics_rolling
+    ON mart.model_metrics_rolling (week, model_name, sku_group);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_error_horizon
+    ON mart.error_horizon (horizon_days);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_coverage_by_sku
+    ON mart.coverage_by_sku (product_key, channel, period);
+
+CREATE OR REPLACE FUNCTION mart.pinball_loss(p_actual NUMERIC, p_quantile NUMERIC, p_tau NUMERIC)
+RETURNS NUMERIC LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE WHEN p_actual >= p_quantile
+                THEN p_tau * (p_actual - p_quantile)
+                ELSE (1 - p_tau) * (p_quantile - p_actual) END;
+$$;
+
+-- Cộng (p_sign = 1) hoặc trừ (p_sign = -1) phần đóng góp của các dòng forecast vào tổng chạy.
+CREATE OR REPLACE FUNCTION mart.accumulate_accuracy(
+    p_rows mart.demand_forecast_weekly[],
+    p_sign INTEGER
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO mart.forecast_accuracy_weekly AS a
+        (model_name, product_key, channel, horizon_days, week_start,
+         n_obs, sum_abs_err, sum_smape, n_ape, sum_ape, n_interval, n_covered,
+         sum_pinball_p10, sum_pinball_p50, sum_pinball_p90, refreshed_at)
+    SELECT r.model_name, r.product_key, COALESCE(m.channel, 'Unknown'), r.horizon_days, r.week_start,
+           p_sign * COUNT(*),
+           p_sign * SUM(abs(r.actual - r.p50)),
+           p_sign * SUM(CASE WHEN abs(r.actual) + abs(r.p50) > 0
+                             THEN 200 * abs(r.actual - r.p50) / (abs(r.actual) + abs(r.p50))
+                             ELSE 0 END),
+           p_sign * COUNT(*) FILTER (WHERE r.actual <> 0),
+           p_sign * COALESCE(SUM(100 * abs(r.actual - r.p50) / abs(r.actual)) FILTER (WHERE r.actual <> 0), 0),
+           p_sign * COUNT(*) FILTER (WHERE r.p10 IS NOT NULL AND r.p90 IS NOT NULL),
+           p_sign * COUNT(*) FILTER (WHERE r.actual BETWEEN r.p10 AND r.p90),
+           p_sign * COALESCE(SUM(mart.pinball_loss(r.actual, r.p10, 0.1)) FILTER (WHERE r.p10 IS NOT NULL), 0),
+           p_sign * SUM(mart.pinball_loss(r.actual, r.p50, 0.5)),
+           p_sign * COALESCE(SUM(mart.pinball_loss(r.actual, r.p90, 0.9)) FILTER (WHERE r.p90 IS NOT NULL), 0),
+           now()
+    FROM unnest(p_rows) AS r
+    JOIN dim.dim_market m ON m.market_key = r.market_key
+    WHERE r.actual IS NOT NULL
+      AND r.p50 IS NOT NULL
+    GROUP BY r.model_name, r.product_key, COALESCE(m.channel, 'Unknown'), r.horizon_days, r.week_start
+    ON CONFLICT (model_name, product_key, channel, horizon_days, week_start)
+    DO UPDATE SET n_obs           = a.n_obs + EXCLUDED.n_obs,
+                  sum_abs_err     = a.sum_abs_err + EXCLUDED.sum_abs_err,
+                  sum_smape       = a.sum_smape + EXCLUDED.sum_smape,
+                  n_ape           = a.n_ape + EXCLUDED.n_ape,
+                  sum_ape         = a.sum_ape + EXCLUDED.sum_ape,
+                  n_interval      = a.n_interval + EXCLUDED.n_interval,
+                  n_covered       = a.n_covered + EXCLUDED.n_covered,
+                  sum_pinball_p10 = a.sum_pinball_p10 + EXCLUDED.sum_pinball_p10,
+                  sum_pinball_p50 = a.sum_pinball_p50 + EXCLUDED.sum_pinball_p50,
+                  sum_pinball_p90 = a.sum_pinball_p90 + EXCLUDED.sum_pinball_p90,
+                  refreshed_at    = EXCLUDED.refreshed_at;
+
+    -- Tổng chạy theo horizon / tuần (ORDER BY: mọi writer khóa dòng theo cùng thứ tự)
+    INSERT INTO mart.accuracy_horizon_totals AS t (horizon_days, n_ape, sum_ape)
+    SELECT r.horizon_days, p_sign * COUNT(*), p_sign * SUM(100 * abs(r.actual - r.p50) / abs(r.actual))
+    FROM unnest(p_rows) AS r
+    WHERE r.actual IS NOT NULL AND r.actual <> 0
+      AND r.p50 IS NOT NULL
+    GROUP BY r.horizon_days
+    ORDER BY r.horizon_days
+    ON CONFLICT (horizon_days)
+    DO UPDATE SET n_ape   = t.n_ape + EXCLUDED.n_ape,
+                  sum_ape = t.sum_ape + EXCLUDED.sum_ape;
+
+    INSERT INTO mart.accuracy_week_totals AS t (week_start, n_ape, sum_ape)
+    SELECT r.week_start, p_sign * COUNT(*), p_sign * SUM(100 * abs(r.actual - r.p50) / abs(r.actual))
+    FROM unnest(p_rows) AS r
+    WHERE r.actual IS NOT NULL AND r.actual <> 0
+      AND r.p50 IS NOT NULL
+    GROUP BY r.week_start
+    ORDER BY r.week_start
+    ON CONFLICT (week_start)
+    DO UPDATE SET n_ape   = t.n_ape + EXCLUDED.n_ape,
+                  sum_ape = t.sum_ape + EXCLUDED.sum_ape;
+END;
+$$;
+
+-- Tính lại output cho các key bị ảnh hưởng bởi các dòng forecast
+-- (model_name, product_key, market_key, week_start, horizon_days); NULL = mọi key trong tổng chạy.
+CREATE OR REPLACE FUNCTION mart.refresh_accuracy_outputs(
+    p_models   TEXT[]    DEFAULT NULL,
+    p_products INTEGER[] DEFAULT NULL,
+    p_markets  INTEGER[] DEFAULT NULL,
+    p_weeks    DATE[]    DEFAULT NULL,
+    p_horizons INTEGER[] DEFAULT NULL
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    -- Khóa mọi key output bị ảnh hưởng trong 1 câu lệnh, theo thứ tự hash (không deadlock) và trước
+    -- khi đọc tổng chạy: writer sau chờ writer trước commit rồi đọc lại (READ COMMITTED) nên không
+    -- ghi đè kết quả của nhau khi cùng family / tuần / horizon. Rebuild khóa độc quyền cả mart.
+    IF p_models IS NULL THEN
+        PERFORM pg_advisory_xact_lock(hashtextextended('mart.accuracy', 0));
+    ELSE
+        PERFORM pg_advisory_xact_lock_shared(hashtextextended('mart.accuracy', 0));
+        PERFORM pg_advisory_xact_lock(l.lock_key)
+        FROM (
+            SELECT DISTINCT hashtextextended(k.lock_name, 0) AS lock_key
+            FROM (
+                SELECT concat_ws('|', 'mart.model_metrics_rolling', k.model_name, p.family, k.week_start)
+                FROM unnest(p_models, p_products, p_weeks) AS k(model_name, product_key, week_start)
+                JOIN dim.dim_product p ON p.product_key = k.product_key
+                UNION ALL
+                SELECT concat_ws('|', 'mart.error_horizon', h) FROM unnest(p_horizons) AS h
+                UNION ALL
+                SELECT concat_ws('|', 'mart.coverage_by_sku', k.product_key, COALESCE(m.channel, 'Unknown'),
+                                 k.week_start)
+                FROM unnest(p_products, p_markets, p_weeks) AS k(product_key, market_key, week_start)
+                JOIN dim.dim_market m ON m.market_key = k.market_key
+                UNION ALL
+                SELECT concat_ws('|', 'mart.kpi_summary', w) FROM unnest(p_weeks) AS w
+            ) AS k(lock_name)
+            ORDER BY 1
+        ) l;
+    END IF;
+
+    -- key đã bị trừ hết (vd. actual bị xóa / forecast bị DELETE)
+    DELETE FROM mart.forecast_accuracy_weekly a
+    WHERE a.n_obs <= 0
+      AND (p_models IS NULL OR (a.model_name, a.product_key, a.horizon_days, a.week_start) IN (
+              SELECT * FROM unnest(p_models, p_products, p_horizons, p_weeks)));
+
+    -- 1) model × sku_group (family) × tuần
+    WITH changed AS (
+        SELECT DISTINCT k.model_name, p.family AS sku_group, k.week_start
+        FROM unnest(p_models, p_products, p_weeks) AS k(model_name, product_key, week_start)
+        JOIN dim.dim_product p ON p.product_key = k.product_key
+        WHERE p_models IS NOT NULL AND p.family IS NOT NULL
+        UNION
+        SELECT DISTINCT a.model_name, p.family, a.week_start
+        FROM mart.forecast_accuracy_weekly a
+        JOIN dim.dim_product p ON p.product_key = a.product_key
+        WHERE p_models IS NULL AND p.family IS NOT NULL
+    ),
+    agg AS (
+        SELECT ch.model_name, ch.sku_group, to_char(ch.week_start, 'IYYY-"W"IW') AS week,
+               SUM(a.sum_smape) / SUM(a.n_obs)                       AS smape,
+               SUM(a.sum_abs_err) / SUM(a.n_obs)                     AS mae,
+               SUM(a.sum_pinball_p90) / NULLIF(SUM(a.n_interval), 0) AS pinball_p90,
+               100.0 * SUM(a.n_covered) / NULLIF(SUM(a.n_interval), 0) AS coverage,
+               SUM(a.n_obs)                                          AS n_obs
+        FROM changed ch
+        JOIN dim.dim_product p ON p.family = ch.sku_group
+        JOIN mart.forecast_accuracy_weekly a
+          ON a.model_name = ch.model_name
+         AND a.product_key = p.product_key
+         AND a.week_start = ch.week_start
+        GROUP BY ch.model_name, ch.sku_group, ch.week_start
+        HAVING SUM(a.n_obs) > 0
+    ),
+    removed AS (
+        DELETE FROM mart.model_metrics_rolling r
+        USING changed ch
+        WHERE r.model_name = ch.model_name
+          AND r.sku_group = ch.sku_group
+          AND r.week = to_char(ch.week_start, 'IYYY-"W"IW')
+          AND NOT EXISTS (
+              SELECT 1 FROM agg g
+              WHERE g.model_name = r.model_name AND g.sku_group = r.sku_group AND g.week = r.week
+          )
+    )
+    INSERT INTO mart.model_metrics_rolling
+        (week, smape, mae, pinball_p90, coverage, n_obs, model_name, sku_group, refreshed_at)
+    SELECT week, smape, mae, pinball_p90, coverage, n_obs, model_name, sku_group, now()
+    FROM agg
+    ON CONFLICT (week, model_name, sku_group)
+    DO UPDATE SET smape = EXCLUDED.smape,
+                  mae = EXCLUDED.mae,
+                  pinball_p90 = EXCLUDED.pinball_p90,
+                  coverage = EXCLUDED.coverage,
+                  n_obs = EXCLUDED.n_obs,
+                  refreshed_at = EXCLUDED.refreshed_at;
+
+    -- 2) MAPE theo horizon (toàn bộ lịch sử, mọi model): 1 dòng tổng chạy / horizon
+    WITH changed AS (
+        SELECT DISTINCT h AS horizon_days FROM unnest(p_horizons) AS h WHERE p_models IS NOT NULL
+        UNION
+        SELECT t.horizon_days FROM mart.accuracy_horizon_totals t WHERE p_models IS NULL
+    ),
+    agg AS (
+        SELECT t.horizon_days, t.sum_ape / t.n_ape AS mape
+        FROM changed ch
+        JOIN mart.accuracy_horizon_totals t ON t.horizon_days = ch.horizon_days
+        WHERE t.n_ape > 0
+    ),
+    removed AS (
+        DELETE FROM mart.error_horizon e
+        USING changed ch
+        WHERE e.horizon_days = ch.horizon_days
+          AND NOT EXISTS (SELECT 1 FROM agg g WHERE g.horizon_days = e.horizon_days)
+    )
+    INSERT INTO mart.error_horizon (horizon_days, mape, created_at)
+    SELECT horizon_days, mape, now()
+    FROM agg
+    ON CONFLICT (horizon_days)
+    DO UPDATE SET mape = EXCLUDED.mape,
+                  created_at = EXCLUDED.created_at;
+
+    -- 3) Coverage P10–P90 theo SKU × channel × tuần (mọi model / horizon);
+    --    trigger 8.x trên coverage_by_sku tự cập nhật heatmap + risky SKU
+    WITH changed AS (
+        SELECT DISTINCT k.product_key, COALESCE(m.channel, 'Unknown') AS channel, k.week_start
+        FROM unnest(p_products, p_markets, p_weeks) AS k(product_key, market_key, week_start)
+        JOIN dim.dim_market m ON m.market_key = k.market_key
+        WHERE p_models IS NOT NULL
+        UNION
+        SELECT DISTINCT a.product_key, a.channel, a.week_start
+        FROM mart.forecast_accuracy_weekly a
+        WHERE p_models IS NULL
+    ),
+    agg AS (
+        SELECT ch.product_key, ch.channel, to_char(ch.week_start, 'IYYY-"W"IW') AS period,
+               100.0 * SUM(a.n_covered) / SUM(a.n_interval) AS coverage_pct
+        FROM changed ch
+        JOIN mart.forecast_accuracy_weekly a
+          ON a.product_key = ch.product_key
+         AND a.channel = ch.channel
+         AND a.week_start = ch.week_start
+        GROUP BY ch.product_key, ch.channel, ch.week_start
+        HAVING SUM(a.n_interval) > 0
+    ),
+    removed AS (
+        DELETE FROM mart.coverage_by_sku c
+        USING changed ch
+        WHERE c.product_key = ch.product_key
+          AND c.channel = ch.channel
+          AND c.period = to_char(ch.week_start, 'IYYY-"W"IW')
+          AND NOT EXISTS (
+              SELECT 1 FROM agg g
+              WHERE g.product_key = c.product_key AND g.channel = c.channel AND g.period = c.period
+          )
+    )
+    INSERT INTO mart.coverage_by_sku (product_key, channel, period, coverage_pct)
+    SELECT product_key, channel, period, coverage_pct
+    FROM agg
+    ON CONFLICT (product_key, channel, period)
+    DO UPDATE SET coverage_pct = EXCLUDED.coverage_pct
+    WHERE mart.coverage_by_sku.coverage_pct IS DISTINCT FROM EXCLUDED.coverage_pct;
+
+    -- 4) KPI: MAPE của tuần liền trước tuần chứa kpi_date (1 dòng tổng chạy / tuần)
+    WITH changed AS (
+        SELECT DISTINCT w AS week_start FROM unnest(p_weeks) AS w WHERE p_models IS NOT NULL
+        UNION
+        SELECT t.week_start FROM mart.accuracy_week_totals t WHERE p_models IS NULL
+    ),
+    agg AS (
+        SELECT ch.week_start, t.sum_ape / NULLIF(t.n_ape, 0) AS mape
+        FROM changed ch
+        LEFT JOIN mart.accuracy_week_totals t ON t.week_start = ch.week_start
+    )
+    UPDATE mart.kpi_summary k
+    SET mape_last_week = ROUND(g.mape, 2)
+    FROM agg g
+    WHERE date_trunc('week', k.kpi_date)::date - 7 = g.week_start
+      AND k.mape_last_week IS DISTINCT FROM ROUND(g.mape, 2);
+END;
+$$;
+
+-- Rebuild: xóa tổng chạy, cộng lại toàn bộ dòng có actual, tính lại mọi output (upsert, không xóa
+-- dòng output không sinh từ forecast, vd. dữ liệu seed).
+CREATE OR REPLACE FUNCTION mart.rebuild_accuracy_mart() RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended('mart.accuracy', 0));
+    DELETE FROM mart.forecast_accuracy_weekly;
+    DELETE FROM mart.accuracy_horizon_totals;
+    DELETE FROM mart.accuracy_week_totals;
+    PERFORM mart.accumulate_accuracy(
+        ARRAY(SELECT f FROM mart.demand_forecast_weekly f WHERE f.actual IS NOT NULL),
+        1
+    );
+    PERFORM mart.refresh_accuracy_outputs();
+END;
+$$;
+
+-- Trigger function: trừ old_rows, cộng new_rows, refresh output của các key bị ảnh hưởng 1 lần / statement.
+CREATE OR REPLACE FUNCTION mart.trg_accuracy_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v_old      mart.demand_forecast_weekly[];
+    v_new      mart.demand_forecast_weekly[];
+    v_models   TEXT[];
+    v_products INTEGER[];
+    v_markets  INTEGER[];
+    v_weeks    DATE[];
+    v_horizons INTEGER[];
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT array_agg(o) INTO v_old FROM old_rows o WHERE o.actual IS NOT NULL;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT array_agg(n) INTO v_new FROM new_rows n WHERE n.actual IS NOT NULL;
+    END IF;
+
+    IF v_old IS NULL AND v_new IS NULL THEN
+        RETURN NULL;  -- vd. ghi forecast tương lai chưa có actual
+    END IF;
+
+    -- Không cộng / trừ tổng chạy trong lúc rebuild_accuracy_mart đang chạy
+    PERFORM pg_advisory_xact_lock_shared(hashtextextended('mart.accuracy', 0));
+
+    IF v_old IS NOT NULL THEN
+        PERFORM mart.accumulate_accuracy(v_old, -1);
+    END IF;
+    IF v_new IS NOT NULL THEN
+        PERFORM mart.accumulate_accuracy(v_new, 1);
+    END IF;
+
+    SELECT array_agg(model_name), array_agg(product_key), array_agg(market_key),
+           array_agg(week_start), array_agg(horizon_days)
+    INTO v_models, v_products, v_markets, v_weeks, v_horizons
+    FROM (
+        SELECT DISTINCT r.model_name, r.product_key, r.market_key, r.week_start, r.horizon_days
+        FROM unnest(COALESCE(v_old, '{}') || COALESCE(v_new, '{}')) AS r
+    ) k;
+
+    PERFORM mart.refresh_accuracy_outputs(v_models, v_products, v_markets, v_weeks, v_horizons);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER trg_forecast_accuracy_ins
+    AFTER INSERT ON mart.demand_forecast_weekly
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_accuracy_refresh();
+
+CREATE OR REPLACE TRIGGER trg_forecast_accuracy_upd
+    AFTER UPDATE ON mart.demand_forecast_weekly
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_accuracy_refresh();
+
+CREATE OR REPLACE TRIGGER trg_forecast_accuracy_del
+    AFTER DELETE ON mart.demand_forecast_weekly
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mart.trg_accuracy_refresh();
+
+-- Backfill cho DB đã có forecast kèm actual (DB mới: no-op)
+SELECT mart.rebuild_accuracy_mart();
@@ -50,3 +50,58 @@ ALTER TABLE mart.port_congestion
 -- 9) Warehouse status: thêm as_of_date
 ALTER TABLE mart.warehouse_status
     ADD COLUMN IF NOT EXISTS as_of_date DATE;
+
+-- 10) Alerts log: created_at bắt buộc (khóa phân trang của /api/alerts)
+UPDATE mart.alerts_log SET created_at = now() WHERE created_at IS NULL;
+ALTER TABLE mart.alerts_log
+    ALTER COLUMN created_at SET NOT NULL;
+
+-- 11) Campaign impact: metadata của counterfactual sinh từ forecast (refresh_marts.py counterfactual)
+ALTER TABLE mart.campaign_impact
+    ADD COLUMN IF NOT EXISTS counterfactual_model TEXT,
+    ADD COLUMN IF NOT EXISTS counterfactual_hash  TEXT,
+    ADD COLUMN IF NOT EXISTS counterfactual_at    TIMESTAMPTZ;
+-- champion (registry name + version) → model_name trong demand_forecast_weekly; model khác cần tự điền
+ALTER TABLE mart.model_registry
+    ADD COLUMN IF NOT EXISTS forecast_model TEXT;
+UPDATE mart.model_registry r
+SET forecast_model = v.forecast_model
+FROM (VALUES ('prophet_sparkplug', 'v1', 'prophet_v1'),
+             ('xgboost_sparkplug', 'v1', 'xgboost_v1'),
+             ('tft_sparkplug',     'v1', 'tft_v1')) AS v(name, version, forecast_model)
+WHERE r.name = v.name AND r.version = v.version
+  AND r.forecast_model IS NULL;
+
+-- 12) Data drift features: 1 dòng / feature để drift engine upsert (giữ dòng mới nhất)
+DELETE FROM mart.data_drift_features d
+USING mart.data_drift_features newer
+WHERE newer.feature_name = d.feature_name
+  AND newer.drift_id > d.drift_id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_data_drift_features_feature
+    ON mart.data_drift_features (feature_name);
+
+-- 13) Accuracy mart (schema.sql mục 10): output upsert theo key → bỏ dòng trùng rồi tạo unique index
+DELETE FROM mart.model_metrics_rolling r
+USING mart.model_metrics_rolling newer
+WHERE newer.week = r.week
+  AND newer.model_name IS NOT DISTINCT FROM r.model_name
+  AND newer.sku_group IS NOT DISTINCT FROM r.sku_group
+  AND newer.id > r.id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_model_metrics_rolling
+    ON mart.model_metrics_rolling (week, model_name, sku_group);
+
+DELETE FROM mart.error_horizon e
+USING mart.error_horizon newer
+WHERE newer.horizon_days = e.horizon_days
+  AND newer.id > e.id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_error_horizon
+    ON mart.error_horizon (horizon_days);
+
+DELETE FROM mart.coverage_by_sku c
+USING mart.coverage_by_sku newer
+WHERE newer.product_key = c.product_key
+  AND newer.channel = c.channel
+  AND newer.period = c.period
+  AND newer.coverage_id > c.coverage_id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_coverage_by_sku
+    ON mart.coverage_by_sku (product_key, channel, period);
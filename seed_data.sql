@@ -216,14 +216,14 @@ VALUES
 
 -- 14. Model Registry
 INSERT INTO mart.model_registry
-(name, version, trained_at, dataset, params, is_champion)
+(name, version, trained_at, dataset, params, is_champion, forecast_model)
 VALUES
 ('prophet_sparkplug', 'v1', '2025-10-01', '10_sparkplug_dataset_final.csv',
- '{"seasonality":"weekly","changepoint_prior_scale":0.05}'::jsonb, FALSE),
+ '{"seasonality":"weekly","changepoint_prior_scale":0.05}'::jsonb, FALSE, 'prophet_v1'),
 ('xgboost_sparkplug', 'v1', '2025-10-02', '10_sparkplug_dataset_final.csv',
- '{"max_depth":6,"eta":0.1,"n_estimators":300}'::jsonb, TRUE),
+ '{"max_depth":6,"eta":0.1,"n_estimators":300}'::jsonb, TRUE, 'xgboost_v1'),
 ('tft_sparkplug',     'v1', '2025-10-03', '10_sparkplug_dataset_final.csv',
- '{"hidden_size":64,"num_heads":4}'::jsonb, FALSE);
+ '{"hidden_size":64,"num_heads":4}'::jsonb, FALSE, 'tft_v1');
 
 -- 15. Model Metrics Over Time
 INSERT INTO mart.model_metrics_over_time